@@ -12,9 +12,10 @@ from app.config import settings
 # Import all models so Alembic can detect them
 # Импортируем все модели для автогенерации миграций
 from app.models import (
-    User, UserProfile, Channel, Feed, ApiKey, RequestLog,
+    User, UserProfile, Channel, Feed, ApiKey, RequestLog, RequestLogHourly,
     CustomWidget, AutomationRule, StressTestRun, AIService,
-    AIServicePromptOverride, WidgetVersion, ArchiveSettings
+    AIServicePromptOverride, WidgetVersion, ArchiveSettings, ServiceLease,
+    AutomationReplayJob
 )
 
 # this is the Alembic Config object, which provides
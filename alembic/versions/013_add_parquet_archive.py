@@ -0,0 +1,38 @@
+"""Add Parquet archive backend settings
+
+Revision ID: 013
+Revises: 012
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '013'
+down_revision = '012'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    from sqlalchemy import inspect
+    conn = op.get_bind()
+    inspector = inspect(conn)
+
+    # В PostgreSQL тип enum нужно расширить явно, в SQLite это обычный VARCHAR
+    if conn.dialect.name == 'postgresql':
+        op.execute("ALTER TYPE archivebackendtype ADD VALUE IF NOT EXISTS 'parquet'")
+
+    if 'archive_settings' in inspector.get_table_names():
+        existing_columns = [col['name'] for col in inspector.get_columns('archive_settings')]
+        if 'parquet_dir' not in existing_columns:
+            op.add_column('archive_settings', sa.Column('parquet_dir', sa.String(length=500), nullable=True))
+
+
+def downgrade() -> None:
+    # Значение enum в PostgreSQL не удаляется (не поддерживается ALTER TYPE)
+    try:
+        op.drop_column('archive_settings', 'parquet_dir')
+    except Exception:
+        pass
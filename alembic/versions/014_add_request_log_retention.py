@@ -0,0 +1,67 @@
+"""Add request log retention settings and hourly request aggregates
+
+Revision ID: 014
+Revises: 013
+Create Date: 2026-10-19 12:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '014'
+down_revision = '013'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    from sqlalchemy import inspect
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    existing_tables = inspector.get_table_names()
+
+    if 'archive_settings' in existing_tables:
+        existing_columns = [col['name'] for col in inspector.get_columns('archive_settings')]
+        if 'request_log_retention_days' not in existing_columns:
+            op.add_column('archive_settings', sa.Column('request_log_retention_days', sa.Integer(), nullable=True))
+        if 'last_request_logs_archived' not in existing_columns:
+            op.add_column('archive_settings', sa.Column('last_request_logs_archived', sa.Integer(), nullable=True))
+
+    if 'request_log_hourly' not in existing_tables:
+        op.create_table(
+            'request_log_hourly',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('hour', sa.DateTime(timezone=True), nullable=False),
+            sa.Column('endpoint', sa.String(length=500), nullable=False),
+            sa.Column('method', sa.String(length=10), nullable=False),
+            sa.Column('request_count', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('status_2xx', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('status_3xx', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('status_4xx', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('status_5xx', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('latency_sum', sa.Float(), nullable=False, server_default='0'),
+            sa.Column('latency_max', sa.Float(), nullable=True),
+            sa.Column('latency_p50', sa.Float(), nullable=True),
+            sa.Column('latency_p95', sa.Float(), nullable=True),
+            sa.Column('latency_p99', sa.Float(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_request_log_hourly_id'), 'request_log_hourly', ['id'], unique=False)
+        op.create_index(
+            'ix_request_log_hourly_hour_endpoint',
+            'request_log_hourly',
+            ['hour', 'endpoint', 'method'],
+            unique=True,
+        )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_request_log_hourly_hour_endpoint', table_name='request_log_hourly')
+    op.drop_index(op.f('ix_request_log_hourly_id'), table_name='request_log_hourly')
+    op.drop_table('request_log_hourly')
+    for col_name in ('request_log_retention_days', 'last_request_logs_archived'):
+        try:
+            op.drop_column('archive_settings', col_name)
+        except Exception:
+            pass
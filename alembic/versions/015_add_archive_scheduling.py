@@ -0,0 +1,53 @@
+"""Add archive maintenance window, throttling settings and service leases
+
+Revision ID: 015
+Revises: 014
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '015'
+down_revision = '014'
+branch_labels = None
+depends_on = None
+
+NEW_COLUMNS = [
+    ('maintenance_window_start', sa.String(length=5)),
+    ('maintenance_window_end', sa.String(length=5)),
+    ('max_rows_per_second', sa.Integer()),
+    ('max_lock_ms', sa.Integer()),
+]
+
+
+def upgrade() -> None:
+    from sqlalchemy import inspect
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    existing_tables = inspector.get_table_names()
+
+    if 'archive_settings' in existing_tables:
+        existing_columns = [col['name'] for col in inspector.get_columns('archive_settings')]
+        for col_name, col_type in NEW_COLUMNS:
+            if col_name not in existing_columns:
+                op.add_column('archive_settings', sa.Column(col_name, col_type, nullable=True))
+
+    if 'service_leases' not in existing_tables:
+        op.create_table(
+            'service_leases',
+            sa.Column('name', sa.String(length=100), nullable=False),
+            sa.Column('holder', sa.String(length=255), nullable=False),
+            sa.Column('expires_at', sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint('name')
+        )
+
+
+def downgrade() -> None:
+    op.drop_table('service_leases')
+    for col_name, _ in NEW_COLUMNS:
+        try:
+            op.drop_column('archive_settings', col_name)
+        except Exception:
+            pass
@@ -0,0 +1,36 @@
+"""Add archive downsampling settings
+
+Revision ID: 016
+Revises: 015
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '016'
+down_revision = '015'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    from sqlalchemy import inspect
+    conn = op.get_bind()
+    inspector = inspect(conn)
+
+    if 'archive_settings' in inspector.get_table_names():
+        existing_columns = [col['name'] for col in inspector.get_columns('archive_settings')]
+        if 'downsample_bucket_seconds' not in existing_columns:
+            op.add_column('archive_settings', sa.Column('downsample_bucket_seconds', sa.Integer(), nullable=True))
+        if 'aggregate_only_after_days' not in existing_columns:
+            op.add_column('archive_settings', sa.Column('aggregate_only_after_days', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    for col_name in ('downsample_bucket_seconds', 'aggregate_only_after_days'):
+        try:
+            op.drop_column('archive_settings', col_name)
+        except Exception:
+            pass
@@ -0,0 +1,33 @@
+"""Add pid_last_ts to automation_rules for dt-aware PID
+
+Revision ID: 017
+Revises: 016
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '017'
+down_revision = '016'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    from sqlalchemy import inspect
+    conn = op.get_bind()
+    inspector = inspect(conn)
+
+    if 'automation_rules' in inspector.get_table_names():
+        existing_columns = [col['name'] for col in inspector.get_columns('automation_rules')]
+        if 'pid_last_ts' not in existing_columns:
+            op.add_column('automation_rules', sa.Column('pid_last_ts', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    try:
+        op.drop_column('automation_rules', 'pid_last_ts')
+    except Exception:
+        pass
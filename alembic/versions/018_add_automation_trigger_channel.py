@@ -0,0 +1,37 @@
+"""Add trigger_channel_id to automation_rules for cross-channel triggers
+
+Revision ID: 018
+Revises: 017
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '018'
+down_revision = '017'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    from sqlalchemy import inspect
+    conn = op.get_bind()
+    inspector = inspect(conn)
+
+    if 'automation_rules' in inspector.get_table_names():
+        existing_columns = [col['name'] for col in inspector.get_columns('automation_rules')]
+        if 'trigger_channel_id' not in existing_columns:
+            # No FK constraint here (SQLite cannot add one); rules of a deleted
+            # source channel are removed by channel_service.delete_channel
+            op.add_column('automation_rules', sa.Column('trigger_channel_id', sa.Integer(), nullable=True))
+            op.create_index('ix_automation_rules_trigger_channel_id', 'automation_rules', ['trigger_channel_id'])
+
+
+def downgrade() -> None:
+    try:
+        op.drop_index('ix_automation_rules_trigger_channel_id', table_name='automation_rules')
+        op.drop_column('automation_rules', 'trigger_channel_id')
+    except Exception:
+        pass
@@ -0,0 +1,38 @@
+"""Add windowed rule parameters to automation_rules
+
+Revision ID: 019
+Revises: 018
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '019'
+down_revision = '018'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    from sqlalchemy import inspect
+    conn = op.get_bind()
+    inspector = inspect(conn)
+
+    if 'automation_rules' in inspector.get_table_names():
+        existing_columns = [col['name'] for col in inspector.get_columns('automation_rules')]
+        if 'window_seconds' not in existing_columns:
+            op.add_column('automation_rules', sa.Column('window_seconds', sa.Integer(), nullable=True))
+        if 'ewma_alpha' not in existing_columns:
+            op.add_column('automation_rules', sa.Column('ewma_alpha', sa.Float(), nullable=True))
+        if 'threshold_low' not in existing_columns:
+            op.add_column('automation_rules', sa.Column('threshold_low', sa.Float(), nullable=True))
+
+
+def downgrade() -> None:
+    for column in ('threshold_low', 'ewma_alpha', 'window_seconds'):
+        try:
+            op.drop_column('automation_rules', column)
+        except Exception:
+            pass
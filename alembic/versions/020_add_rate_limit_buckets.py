@@ -0,0 +1,39 @@
+"""Add shared rate limit buckets
+
+Revision ID: 020
+Revises: 019
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '020'
+down_revision = '019'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    from sqlalchemy import inspect
+    conn = op.get_bind()
+    inspector = inspect(conn)
+
+    if 'rate_limit_buckets' not in inspector.get_table_names():
+        op.create_table(
+            'rate_limit_buckets',
+            sa.Column('key', sa.String(length=300), nullable=False),
+            sa.Column('tokens', sa.Float(), nullable=False),
+            sa.Column('updated', sa.Float(), nullable=False),
+            sa.PrimaryKeyConstraint('key')
+        )
+        op.create_index('ix_rate_limit_buckets_updated', 'rate_limit_buckets', ['updated'])
+
+
+def downgrade() -> None:
+    try:
+        op.drop_index('ix_rate_limit_buckets_updated', table_name='rate_limit_buckets')
+    except Exception:
+        pass
+    op.drop_table('rate_limit_buckets')
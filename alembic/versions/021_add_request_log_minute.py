@@ -0,0 +1,52 @@
+"""Add per-minute request aggregates
+
+Revision ID: 021
+Revises: 020
+Create Date: 2026-10-19 23:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '021'
+down_revision = '020'
+branch_labels = None
+depends_on = None
+
+BUCKET_COLUMNS = (
+    'latency_le_1', 'latency_le_2_5', 'latency_le_5', 'latency_le_10', 'latency_le_25', 'latency_le_50',
+    'latency_le_100', 'latency_le_250', 'latency_le_500', 'latency_le_1000', 'latency_le_2500', 'latency_le_inf',
+)
+
+
+def upgrade() -> None:
+    from sqlalchemy import inspect
+    conn = op.get_bind()
+    inspector = inspect(conn)
+
+    if 'request_log_minute' not in inspector.get_table_names():
+        op.create_table(
+            'request_log_minute',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('minute', sa.DateTime(timezone=True), nullable=False),
+            sa.Column('endpoint', sa.String(length=500), nullable=False),
+            sa.Column('method', sa.String(length=10), nullable=False),
+            sa.Column('status_class', sa.Integer(), nullable=False),
+            sa.Column('request_count', sa.Integer(), nullable=False),
+            sa.Column('latency_sum', sa.Float(), nullable=False),
+            sa.Column('latency_max', sa.Float(), nullable=True),
+            *[sa.Column(name, sa.Integer(), nullable=False) for name in BUCKET_COLUMNS],
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_request_log_minute_id', 'request_log_minute', ['id'])
+        op.create_index('ix_request_log_minute_minute_endpoint', 'request_log_minute', ['minute', 'endpoint'])
+
+
+def downgrade() -> None:
+    try:
+        op.drop_index('ix_request_log_minute_minute_endpoint', table_name='request_log_minute')
+        op.drop_index('ix_request_log_minute_id', table_name='request_log_minute')
+    except Exception:
+        pass
+    op.drop_table('request_log_minute')
@@ -0,0 +1,49 @@
+"""Add automation replay jobs
+
+Revision ID: 022
+Revises: 021
+Create Date: 2026-10-20 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '022'
+down_revision = '021'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    from sqlalchemy import inspect
+    conn = op.get_bind()
+    inspector = inspect(conn)
+
+    if 'automation_replay_jobs' not in inspector.get_table_names():
+        op.create_table(
+            'automation_replay_jobs',
+            sa.Column('id', sa.String(length=32), nullable=False),
+            sa.Column('channel_id', sa.Integer(), nullable=False),
+            sa.Column('dry_run', sa.Boolean(), nullable=False),
+            sa.Column('status', sa.String(length=20), nullable=False),
+            sa.Column('total', sa.Integer(), nullable=False),
+            sa.Column('processed', sa.Integer(), nullable=False),
+            sa.Column('changed_rows', sa.Integer(), nullable=False),
+            sa.Column('changed_values', sa.Text(), nullable=True),
+            sa.Column('skipped_rules', sa.Text(), nullable=True),
+            sa.Column('vectorized', sa.Boolean(), nullable=False),
+            sa.Column('error', sa.Text(), nullable=True),
+            sa.Column('started_at', sa.DateTime(), nullable=False),
+            sa.Column('finished_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_automation_replay_jobs_channel_id', 'automation_replay_jobs', ['channel_id'])
+
+
+def downgrade() -> None:
+    try:
+        op.drop_index('ix_automation_replay_jobs_channel_id', table_name='automation_replay_jobs')
+    except Exception:
+        pass
+    op.drop_table('automation_replay_jobs')
@@ -0,0 +1,33 @@
+"""Add sample_weight to request_logs for weighted hourly roll-ups
+
+Revision ID: 023
+Revises: 022
+Create Date: 2026-10-20 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '023'
+down_revision = '022'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    from sqlalchemy import inspect
+    conn = op.get_bind()
+    inspector = inspect(conn)
+
+    if 'request_logs' in inspector.get_table_names():
+        existing_columns = [col['name'] for col in inspector.get_columns('request_logs')]
+        if 'sample_weight' not in existing_columns:
+            op.add_column('request_logs', sa.Column('sample_weight', sa.Float(), nullable=False, server_default='1'))
+
+
+def downgrade() -> None:
+    try:
+        op.drop_column('request_logs', 'sample_weight')
+    except Exception:
+        pass
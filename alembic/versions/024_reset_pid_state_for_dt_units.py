@@ -0,0 +1,36 @@
+"""Reset PID integral/last error after the switch to per-second units
+
+Revision ID: 024
+Revises: 023
+Create Date: 2026-10-21 12:00:00.000000
+
+Since 017 the integral accumulates error * dt (seconds) and the derivative is
+per second. Integrals stored before that are sums of per-sample errors and
+would be misread, so PID rules start again from a fresh baseline.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '024'
+down_revision = '023'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    from sqlalchemy import inspect
+    conn = op.get_bind()
+    inspector = inspect(conn)
+
+    if 'automation_rules' in inspector.get_table_names():
+        existing_columns = [col['name'] for col in inspector.get_columns('automation_rules')]
+        values = "pid_integral = 0, pid_last_error = NULL"
+        if 'pid_last_ts' in existing_columns:
+            values += ", pid_last_ts = NULL"
+        conn.execute(sa.text(f"UPDATE automation_rules SET {values} WHERE rule_type = 'pid'"))
+
+
+def downgrade() -> None:
+    # The old per-sample state is gone; the reset is not reversible
+    pass
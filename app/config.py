@@ -43,6 +43,32 @@ class Settings(BaseSettings):
     MEMBUFFER_MAX_LATENCY_MS: int = 500
     MEMBUFFER_ON_OVERFLOW: str = "fallback"  # drop|block|fallback
     
+    # Request logs (buffered, written in batches)
+    REQUEST_LOG_BUFFER_SIZE: int = 10000  # oldest rows are dropped beyond this
+    REQUEST_LOG_BATCH_SIZE: int = 500
+    REQUEST_LOG_FLUSH_INTERVAL_MS: int = 1000
+    REQUEST_LOG_SAMPLE_UPDATE: float = 0.01  # share of successful /update calls logged (errors: all)
+    REQUEST_LOG_SAMPLE_READ: float = 1.0  # feeds/fields reads
+    REQUEST_LOG_SAMPLE_DEFAULT: float = 1.0
+    REQUEST_LOG_MINUTE_RETENTION_DAYS: int = 30  # per-minute request counts for the dashboard (0 = keep)
+    
+    # Prometheus metrics (/metrics)
+    METRICS_ENABLED: bool = False  # off by default: route, SQL and automation internals
+    METRICS_TOKEN: str = ""  # if set, scrapers must send "Authorization: Bearer <token>"
+    METRICS_MULTIPROC_DIR: str = ""  # shared directory to sum the metrics of all uvicorn workers ("" = per worker)
+    METRICS_WRITE_INTERVAL_MS: int = 5000  # how often each worker writes its snapshot there
+    
+    # Request phase timing
+    SERVER_TIMING_ENABLED: bool = False  # phase durations in the Server-Timing header (debugging only: timing side channel)
+    SLOW_REQUEST_MS: float = 1000  # keep a phase/SQL breakdown of slower requests (0 = off)
+    SLOW_REQUEST_RING_SIZE: int = 100  # slow requests kept per worker
+    SLOW_REQUEST_MAX_QUERIES: int = 50  # SQL statements kept per request
+    SQL_STATS_MAX_FINGERPRINTS: int = 1000  # distinct statements tracked per worker, the rest are summed
+    SQL_N_PLUS_ONE_THRESHOLD: int = 10  # flag a request running one statement more often (0 = off)
+    
+    # Admin profiling (/api/admin/process/profile)
+    PROFILER_MAX_SECONDS: int = 60  # longest sampling window
+    
     # SQLite tuning
     SQLITE_TUNING_WAL: bool = True
 
@@ -51,8 +77,28 @@ class Settings(BaseSettings):
     DB_MAX_OVERFLOW: int = 100
     DB_POOL_TIMEOUT: int = 60
 
+    # Archive backend pool (archiving is a single background writer)
+    ARCHIVE_DB_POOL_SIZE: int = 2
+    ARCHIVE_DB_MAX_OVERFLOW: int = 3
+
     # Caching
     API_KEY_CACHE_TTL: int = 60  # seconds
+    AUTOMATION_PLAN_CACHE_TTL: int = 5  # seconds; compiled rules of other workers refresh after this
+    AUTOMATION_PID_CHECKPOINT_SECONDS: int = 10  # PID state is written to the DB this often
+    AUTOMATION_LAST_VALUE_TTL: int = 30  # seconds; cross-channel trigger values written by other workers
+    AUTOMATION_WINDOW_MAX_SAMPLES: int = 2000  # ring buffer size of windowed rules (moving average etc.)
+    AUTOMATION_SLOW_RULE_MS: float = 0  # log rule executions slower than this (0 = off)
+    AUTOMATION_POST_COMMIT_QUEUE_SIZE: int = 1000  # queued post-commit tasks before producers wait (up to 1 s)
+    AUTOMATION_POST_COMMIT_WORKERS: int = 2
+    AUTOMATION_POST_COMMIT_RETRIES: int = 3
+    AUTOMATION_SIMULATION_MAX_POINTS: int = 100000  # samples per simulation request
+    
+    # Rate limiting
+    RATE_LIMIT_MAX_KEYS: int = 100000  # buckets kept in memory, least recently used are evicted
+    RATE_LIMIT_API_KEY_REQUESTS: int = 0  # per API key per RATE_LIMIT_API_KEY_WINDOW, on top of per-IP limits (0 = off)
+    RATE_LIMIT_API_KEY_WINDOW: int = 60  # seconds
+    RATE_LIMIT_BACKEND: str = "memory"  # memory (per worker) | database (shared by all workers)
+    RATE_LIMIT_LEASE_FRACTION: float = 0.05  # share of a limit a worker takes from the shared store at once
     
     # Reverse proxy settings
     ROOT_PATH: str = ""  # Префикс пути для работы за реверс-прокси (например, "/cloud2")
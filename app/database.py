@@ -1,14 +1,34 @@
 """Database configuration and session management"""
+import time
 from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 from app.config import settings
+from app.services import request_timing
+from app.services.metrics import db_pool_checkout_seconds
+from app.services.sql_stats import sql_stats
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that reports the checkout wait to /metrics and the request timing"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            elapsed = time.perf_counter() - start
+            db_pool_checkout_seconds.observe(elapsed)
+            request_timing.add("pool", elapsed)
+
 
 # Create database engine based on configuration
 if settings.DATABASE_TYPE == "sqlite":
     engine = create_engine(
         settings.DATABASE_URL,
         connect_args={"check_same_thread": False},
+        poolclass=TimedQueuePool,
         pool_pre_ping=True,
         pool_size=settings.DB_POOL_SIZE,
         max_overflow=settings.DB_MAX_OVERFLOW,
@@ -28,12 +48,29 @@ if settings.DATABASE_TYPE == "sqlite":
 else:
     engine = create_engine(
         settings.DATABASE_URL,
+        poolclass=TimedQueuePool,
         pool_pre_ping=True,
         pool_size=settings.DB_POOL_SIZE,
         max_overflow=settings.DB_MAX_OVERFLOW,
         pool_timeout=settings.DB_POOL_TIMEOUT,
     )
 
+@event.listens_for(engine, "before_cursor_execute")
+def _statement_start(conn, cursor, statement, parameters, context, executemany):
+    context._timing_start = time.perf_counter()
+
+
+@event.listens_for(engine, "after_cursor_execute")
+def _statement_end(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_timing_start", None)
+    if start is not None:
+        seconds = time.perf_counter() - start
+        fingerprint = sql_stats.record(statement, seconds)
+        timing = request_timing.current()
+        if timing is not None:
+            timing.add_query(statement, seconds, fingerprint)
+
+
 # Session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
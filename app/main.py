@@ -1,5 +1,9 @@
 """Main FastAPI application"""
-from fastapi import FastAPI
+import secrets
+from typing import Optional
+
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
@@ -10,8 +14,13 @@ from app.models import User, Channel, Feed, ApiKey  # Import models before creat
 from app.routers import auth, channels, feeds, web, admin, admin_archive
 from app.services.auth_service import get_or_create_admin
 from app.services.mem_buffer import mem_buffer
+from app.services.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, metrics
+from app.services.request_log_writer import request_log_writer
 from app.services.archive.scheduler import archive_scheduler
 from app.services.archive import service as archive_service
+from app.services.automation.pid_state import pid_state_store
+from app.services.automation.post_commit import post_commit_queue
+from app.services.automation.windows import window_state_store
 
 
 @asynccontextmanager
@@ -40,6 +49,27 @@ async def lifespan(app: FastAPI):
         asyncio.create_task(mem_buffer.start())
         print("[OK] In-memory write buffer started")
 
+    # Batched request log writer
+    await request_log_writer.start()
+
+    # Metrics snapshots of this worker (METRICS_MULTIPROC_DIR)
+    await metrics.start()
+
+    # PID state checkpoints (state stays in memory between them)
+    await pid_state_store.start()
+
+    # Post-commit automation workers (dependent channels)
+    await post_commit_queue.start()
+
+    # Ring buffers of windowed automation rules
+    db_windows = SessionLocal()
+    try:
+        window_state_store.warm_up(db_windows)
+    except Exception as e:
+        print(f"[WARN] Automation window warm-up failed: {e}")
+    finally:
+        db_windows.close()
+
     # Start archive scheduler if enabled
     db_archive = SessionLocal()
     try:
@@ -59,8 +89,16 @@ async def lifespan(app: FastAPI):
         import asyncio
         await mem_buffer.drain_and_stop()
 
+    await post_commit_queue.stop()
+
+    await pid_state_store.stop()
+
     await archive_scheduler.stop()
 
+    await request_log_writer.stop()
+
+    await metrics.stop()
+
 
 # Create FastAPI app
 app = FastAPI(
@@ -138,6 +176,18 @@ def health_check():
     }
 
 
+@app.get("/metrics", include_in_schema=False)
+def metrics_endpoint(authorization: Optional[str] = Header(None)):
+    """Prometheus metrics (of all workers when METRICS_MULTIPROC_DIR is set)"""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if settings.METRICS_TOKEN and not secrets.compare_digest(
+        authorization or "", f"Bearer {settings.METRICS_TOKEN}"
+    ):
+        raise HTTPException(status_code=401, detail="Invalid metrics token", headers={"WWW-Authenticate": "Bearer"})
+    return Response(content=metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
@@ -1,66 +1,65 @@
 """Request logging middleware"""
 import time
-from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
-from app.database import SessionLocal
-from app.models.request_log import RequestLog
-
-
-class RequestLoggingMiddleware(BaseHTTPMiddleware):
-    """Middleware to log all HTTP requests"""
-    
-    async def dispatch(self, request: Request, call_next):
-        # Start timer
-        start_time = time.time()
-        
-        # Get request info
-        method = request.method
-        endpoint = str(request.url.path)
-        ip_address = request.client.host if request.client else None
-        user_agent = request.headers.get("user-agent")
-        
-        # Skip logging for static files and health checks
-        if endpoint.startswith("/static") or endpoint == "/health":
-            return await call_next(request)
-        
-        # Process request
-        response = await call_next(request)
-        
-        # Calculate response time
-        response_time = (time.time() - start_time) * 1000  # milliseconds
-        
-        # Log to database (non-blocking)
-        try:
-            db = SessionLocal()
-            log_entry = RequestLog(
-                endpoint=endpoint,
-                method=method,
-                ip_address=ip_address,
-                user_agent=user_agent,
-                response_status=response.status_code,
-                response_time=round(response_time, 2)
-            )
-            db.add(log_entry)
-            db.commit()
-            db.close()
-        except Exception:
-            # Silently fail if logging fails (don't break the request)
-            pass
-        
-        return response
-
-
-
-
-
-
-
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.config import settings
+from app.services import request_timing
+from app.services.metrics import http_request_seconds, http_requests_total
+from app.services.request_timing import slow_requests
+from app.services.request_log_writer import request_log_writer
+from app.services.sql_stats import sql_stats
 
 
+class RequestLoggingMiddleware:
+    """Middleware to log all HTTP requests (pure ASGI: status is taken from ``send``)"""
 
+    def __init__(self, app: ASGIApp):
+        self.app = app
 
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
 
+        endpoint = scope.get("root_path", "") + scope["path"]
 
+        # Skip logging for static files, health checks and metrics scrapes
+        if endpoint.startswith("/static") or endpoint in ("/health", "/metrics"):
+            return await self.app(scope, receive, send)
 
+        # Phase timers of this request (routers and services add to it)
+        timing, token = request_timing.begin()
+        start_time = timing.start
+        status_code = 500  # if the app fails before starting a response
 
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if settings.SERVER_TIMING_ENABLED:
+                    value = timing.server_timing(time.perf_counter() - start_time)
+                    message["headers"] = list(message.get("headers", [])) + [(b"server-timing", value.encode())]
+            await send(message)
 
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_timing.end(token)
+            elapsed = time.perf_counter() - start_time
+            response_time = elapsed * 1000  # milliseconds
+            # Route template (/channels/{channel_id}) keeps the number of series bounded
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            http_request_seconds.observe(elapsed, scope["method"], route_path)
+            slow_requests.record(scope["method"], endpoint, getattr(route, "path", None), status_code, timing, elapsed)
+            sql_stats.check_request(timing.repeats, scope["method"], route_path)
+            http_requests_total.inc(scope["method"], route_path, str(status_code))
+            client = scope.get("client")
+            user_agent = None
+            for key, value in scope.get("headers", ()):
+                if key == b"user-agent":
+                    user_agent = value.decode("latin-1")
+                    break
+            # Counted per minute, buffered and sampled, written to the database in batches
+            request_log_writer.record(
+                scope["method"], endpoint, status_code, response_time,
+                client[0] if client else None, user_agent, route_path
+            )
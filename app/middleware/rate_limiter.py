@@ -1,69 +1,234 @@
 """Simple rate limiting middleware"""
-from collections import defaultdict
-from datetime import datetime, timedelta
-from fastapi import Request, HTTPException, status
-from starlette.middleware.base import BaseHTTPMiddleware
+import asyncio
+import logging
+import math
 import time
+from collections import OrderedDict
+from typing import Optional
+from urllib.parse import parse_qs
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.config import settings
+from app.database import SessionLocal
+from app.services import rate_limit_store
+from app.services.metrics import rate_limit_rejections_total
+
+logger = logging.getLogger(__name__)
+
+# Shared buckets idle for this long are full again and deleted
+PURGE_IDLE_SECONDS = 3600
+PURGE_INTERVAL_SECONDS = 600
+
+
+class TokenBucket:
+    """Bucket of ``capacity`` tokens refilled at ``capacity / window`` per second"""
+
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, capacity: float, now: float):
+        self.tokens = capacity
+        self.updated = now
+
+    def take(self, capacity: float, rate: float, now: float) -> float:
+        """Take one token. Returns 0 if allowed, else seconds until a token is available"""
+        self.tokens = min(capacity, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / rate
 
 
 class InMemoryRateLimiter:
-    """In-memory rate limiter (simple implementation)"""
-    
-    def __init__(self):
-        self.requests = defaultdict(list)
+    """In-memory token-bucket rate limiter
+
+    Constant memory per key; at most RATE_LIMIT_MAX_KEYS buckets are kept,
+    the least recently used ones are evicted (an evicted key starts again
+    with a full bucket).
+    """
+
+    def __init__(self, max_keys: Optional[int] = None):
+        self.buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.max_keys = max_keys or settings.RATE_LIMIT_MAX_KEYS
+        self.evicted = 0
+        self.clock = time.monotonic
         self.limits = {
             '/update': (1000000, 60),  # 100000 requests per minute for data write (load testing)
             '/api/channels': (50, 60),  # 50 requests per minute for channel operations
         }
-    
+
+    def limit(self, endpoint: str) -> tuple:
+        """(max_requests, window seconds) for an endpoint class or API key"""
+        if endpoint == 'api_key':
+            return settings.RATE_LIMIT_API_KEY_REQUESTS, settings.RATE_LIMIT_API_KEY_WINDOW
+        # Default: 1000 requests per hour
+        return self.limits.get(endpoint, (1000, 3600))
+
+    def check(self, key: str, endpoint: str) -> float:
+        """Count a request. Returns 0 if allowed, else seconds to wait"""
+        max_requests, window = self.limit(endpoint)
+        now = self.clock()
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(max_requests, now)
+            self.buckets[key] = bucket
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+                self.evicted += 1
+        else:
+            self.buckets.move_to_end(key)
+        return bucket.take(max_requests, max_requests / window, now)
+
     def is_allowed(self, key: str, endpoint: str) -> bool:
         """Check if request is allowed"""
-        now = time.time()
-        
-        # Get limit for endpoint (default: 1000 requests per hour)
-        max_requests, window = self.limits.get(endpoint, (1000, 3600))
-        
-        # Clean old requests
-        self.requests[key] = [req_time for req_time in self.requests[key] 
-                              if now - req_time < window]
-        
-        # Check limit
-        if len(self.requests[key]) >= max_requests:
-            return False
-        
-        # Add current request
-        self.requests[key].append(now)
-        return True
-    
+        return self.check(key, endpoint) == 0
+
+    async def acquire(self, key: str, endpoint: str) -> float:
+        """``check()`` for the middleware"""
+        return self.check(key, endpoint)
+
     def cleanup(self):
-        """Cleanup old requests (call periodically)"""
-        now = time.time()
-        for key in list(self.requests.keys()):
-            self.requests[key] = [req_time for req_time in self.requests[key] 
-                                  if now - req_time < 3600]  # Keep last hour
-            if not self.requests[key]:
-                del self.requests[key]
+        """Drop buckets that are full again (same as a new key)"""
+        now = self.clock()
+        for key, bucket in list(self.buckets.items()):
+            max_requests, window = self.limit(key.rsplit(':', 1)[-1])
+            if bucket.tokens + (now - bucket.updated) * max_requests / window >= max_requests:
+                del self.buckets[key]
+
+
+class LeasedTokens:
+    """Tokens a worker took from the shared bucket and spends locally"""
+
+    __slots__ = ("tokens", "denied_until")
+
+    def __init__(self):
+        self.tokens = 0
+        self.denied_until = 0.0
+
+
+class SharedRateLimiter(InMemoryRateLimiter):
+    """Token buckets shared by all workers in the database (``rate_limit_store``)
 
+    A worker leases RATE_LIMIT_LEASE_FRACTION of a limit at a time and spends
+    it without a round trip, so the limit holds for all workers together up
+    to the tokens leased but not yet spent (at most one batch per worker).
+    After a refusal the key is refused locally until a token is due. If the
+    store fails, requests are allowed.
+    """
 
-# Global rate limiter instance
-rate_limiter = InMemoryRateLimiter()
+    def __init__(self, max_keys: Optional[int] = None):
+        super().__init__(max_keys)
+        self.round_trips = 0
+        self.last_purge = 0.0
 
+    def _local(self, key: str) -> Optional[float]:
+        """Wait from the local lease, or None if the store must be asked"""
+        lease = self.buckets.get(key)
+        if lease is None:
+            return None
+        self.buckets.move_to_end(key)
+        if lease.tokens >= 1:
+            lease.tokens -= 1
+            return 0.0
+        wait = lease.denied_until - self.clock()
+        return wait if wait > 0 else None
+
+    def _take(self, key: str, max_requests: int, window: int) -> tuple:
+        wanted = max(1, int(max_requests * settings.RATE_LIMIT_LEASE_FRACTION))
+        db = SessionLocal()
+        try:
+            now = time.time()
+            result = rate_limit_store.take(db, key, max_requests, window, wanted, now)
+            if now - self.last_purge > PURGE_INTERVAL_SECONDS:
+                self.last_purge = now
+                rate_limit_store.purge(db, PURGE_IDLE_SECONDS, now)
+            return result
+        except Exception as e:
+            db.rollback()
+            logger.warning("Rate limit store unavailable, request allowed: %s", e)
+            return 1, 0.0
+        finally:
+            db.close()
+
+    def _apply(self, key: str, max_requests: int, window: int, granted: int, left: float) -> float:
+        self.round_trips += 1
+        lease = self.buckets.get(key)
+        if lease is None:
+            lease = self.buckets[key] = LeasedTokens()
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+                self.evicted += 1
+        if granted:
+            lease.tokens += granted - 1
+            return 0.0
+        wait = (1 - left) * window / max_requests
+        lease.denied_until = self.clock() + wait
+        return wait
+
+    def check(self, key: str, endpoint: str) -> float:
+        wait = self._local(key)
+        if wait is not None:
+            return wait
+        max_requests, window = self.limit(endpoint)
+        return self._apply(key, max_requests, window, *self._take(key, max_requests, window))
+
+    async def acquire(self, key: str, endpoint: str) -> float:
+        """Like ``check()``, the store is asked in the default executor"""
+        wait = self._local(key)
+        if wait is not None:
+            return wait
+        max_requests, window = self.limit(endpoint)
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(None, self._take, key, max_requests, window)
+        return self._apply(key, max_requests, window, *result)
+
+    def cleanup(self):
+        """Drop local leases that were refused (the rest holds spendable tokens)"""
+        for key, lease in list(self.buckets.items()):
+            if lease.tokens < 1 and lease.denied_until <= self.clock():
+                del self.buckets[key]
+
+
+# Global rate limiter instance (RATE_LIMIT_BACKEND: memory — per worker, database — shared)
+rate_limiter = SharedRateLimiter() if settings.RATE_LIMIT_BACKEND == "database" else InMemoryRateLimiter()
+
+# Paths that are never limited
+SKIP_PATHS = ('/static/', '/docs', '/redoc', '/openapi.json', '/health', '/metrics', '/admin')
+
+
+def _api_key(query_string: bytes) -> Optional[str]:
+    if b"api_key=" not in query_string:
+        return None
+    values = parse_qs(query_string.decode("latin-1")).get("api_key")
+    return values[0] if values else None
+
+
+class RateLimitMiddleware:
+    """Rate limiting middleware (pure ASGI, answers 429 without calling the app)
+
+    Requests are limited per client IP and endpoint class and, when
+    RATE_LIMIT_API_KEY_REQUESTS is set, additionally per ``api_key``.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        endpoint = scope.get("root_path", "") + scope["path"]
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    """Rate limiting middleware"""
-    
-    async def dispatch(self, request: Request, call_next):
         # Skip rate limiting for certain paths
-        skip_paths = ['/static/', '/docs', '/redoc', '/openapi.json', '/health', '/admin']
-        if any(request.url.path.startswith(path) for path in skip_paths):
-            return await call_next(request)
-        
+        if endpoint.startswith(SKIP_PATHS):
+            return await self.app(scope, receive, send)
+
         # Get client identifier (IP address)
-        client_id = request.client.host if request.client else "unknown"
-        
-        # Check rate limit for specific endpoint patterns
-        endpoint = request.url.path
-        
+        client = scope.get("client")
+        client_id = client[0] if client else "unknown"
+
         # Simplify endpoint for rate limiting
         if endpoint.startswith('/update'):
             rate_key = '/update'
@@ -71,20 +236,22 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
             rate_key = '/api/channels'
         else:
             rate_key = 'default'
-        
+
         # Check if allowed
-        key = f"{client_id}:{rate_key}"
-        if not rate_limiter.is_allowed(key, rate_key):
-            raise HTTPException(
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                detail="Rate limit exceeded. Please try again later.",
-                headers={"Retry-After": "60"}
+        wait = await rate_limiter.acquire(f"{client_id}:{rate_key}", rate_key)
+        if not wait and settings.RATE_LIMIT_API_KEY_REQUESTS > 0:
+            api_key = _api_key(scope.get("query_string", b""))
+            if api_key:
+                wait = await rate_limiter.acquire(f"{api_key}:api_key", 'api_key')
+                if wait:
+                    rate_key = 'api_key'
+        if wait:
+            rate_limit_rejections_total.inc(rate_key)
+            response = JSONResponse(
+                {"detail": "Rate limit exceeded. Please try again later."},
+                status_code=429,
+                headers={"Retry-After": str(max(1, math.ceil(wait)))}
             )
-        
-        response = await call_next(request)
-        return response
-
-
-
-
+            return await response(scope, receive, send)
 
+        await self.app(scope, receive, send)
@@ -4,13 +4,16 @@ from app.models.user_profile import UserProfile
 from app.models.channel import Channel
 from app.models.feed import Feed
 from app.models.api_key import ApiKey
-from app.models.request_log import RequestLog
+from app.models.request_log import RequestLog, RequestLogHourly, RequestLogMinute
 from app.models.custom_widget import CustomWidget
 from app.models.ai_service import AIService, AIServicePromptOverride
 from app.models.widget_version import WidgetVersion
 from app.models.archive_config import ArchiveSettings, ArchiveBackendType
 from app.models.automation_rule import AutomationRule
+from app.models.automation_replay_job import AutomationReplayJob
 from app.models.stress_test import StressTestRun
+from app.models.service_lease import ServiceLease
+from app.models.rate_limit_bucket import RateLimitBucket
 
 __all__ = [
     'User',
@@ -19,13 +22,18 @@ __all__ = [
     'Feed',
     'ApiKey',
     'RequestLog',
+    'RequestLogHourly',
+    'RequestLogMinute',
     'CustomWidget',
     'AutomationRule',
+    'AutomationReplayJob',
     'StressTestRun',
     'AIService',
     'AIServicePromptOverride',
     'WidgetVersion',
     'ArchiveSettings',
     'ArchiveBackendType',
+    'ServiceLease',
+    'RateLimitBucket',
 ]
 
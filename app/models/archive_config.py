@@ -20,6 +20,7 @@ from app.database import Base
 class ArchiveBackendType(str, enum.Enum):
     SQLITE = "sqlite"
     POSTGRES = "postgres"
+    PARQUET = "parquet"
 
 
 class ArchiveSettings(Base):
@@ -41,16 +42,34 @@ class ArchiveSettings(Base):
     pg_schema = Column(String(255), nullable=True)
     pg_ssl = Column(Boolean, default=False, nullable=True)
 
+    # Parquet configuration
+    parquet_dir = Column(String(500), nullable=True)
+
     # Common settings
     retention_days = Column(Integer, default=30, nullable=False)
     schedule_interval_seconds = Column(Integer, default=3600, nullable=False)
     schedule_cron = Column(String(100), nullable=True)
     copy_then_delete = Column(Boolean, default=True, nullable=False)
 
+    # Off-peak window (UTC, "HH:MM") and I/O throttling
+    maintenance_window_start = Column(String(5), nullable=True)
+    maintenance_window_end = Column(String(5), nullable=True)
+    max_rows_per_second = Column(Integer, nullable=True)
+    max_lock_ms = Column(Integer, nullable=True)  # бюджет удержания блокировки записи на батч
+
+    # Downsampling: time-bucket aggregates in the archive (None — выключено);
+    # строки старше aggregate_only_after_days хранятся только агрегатами
+    downsample_bucket_seconds = Column(Integer, nullable=True)
+    aggregate_only_after_days = Column(Integer, nullable=True)
+
+    # Request log retention (None — не архивировать журнал запросов)
+    request_log_retention_days = Column(Integer, nullable=True)
+
     last_run_at = Column(DateTime(timezone=True), nullable=True)
     last_status = Column(String(50), nullable=True)
     last_error = Column(Text, nullable=True)
     last_processed = Column(Integer, nullable=True)
+    last_request_logs_archived = Column(Integer, nullable=True)
 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -0,0 +1,24 @@
+"""Automation replay job model (progress shared between uvicorn workers)"""
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text
+from app.database import Base
+
+
+class AutomationReplayJob(Base):
+    """Фоновый пересчёт истории канала правилами автоматизации"""
+    __tablename__ = "automation_replay_jobs"
+    
+    id = Column(String(32), primary_key=True)
+    channel_id = Column(Integer, nullable=False, index=True)
+    dry_run = Column(Boolean, nullable=False, default=True)
+    status = Column(String(20), nullable=False, default="running")  # running, done, error
+    
+    total = Column(Integer, nullable=False, default=0)
+    processed = Column(Integer, nullable=False, default=0)
+    changed_rows = Column(Integer, nullable=False, default=0)
+    changed_values = Column(Text, nullable=True)  # JSON: поле -> число изменённых значений
+    skipped_rules = Column(Text, nullable=True)  # JSON: имена пропущенных правил
+    vectorized = Column(Boolean, nullable=False, default=False)
+    error = Column(Text, nullable=True)
+    
+    started_at = Column(DateTime, nullable=False)  # UTC
+    finished_at = Column(DateTime, nullable=True)
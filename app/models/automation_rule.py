@@ -15,6 +15,7 @@ class AutomationRule(Base):
     
     # Condition rules
     trigger_field = Column(String(20), nullable=True)  # "field1"
+    trigger_channel_id = Column(Integer, ForeignKey("channels.id", ondelete="CASCADE"), nullable=True, index=True)  # Канал-источник trigger_field (NULL = свой канал)
     condition = Column(String(50), nullable=True)  # ">", "<", "==", "!=", ">=", "<="
     threshold_value = Column(Float, nullable=True)  # Пороговое значение
     
@@ -30,12 +31,18 @@ class AutomationRule(Base):
     pid_kd = Column(Float, nullable=True)  # Дифференциальный коэф.
     pid_integral = Column(Float, default=0.0)  # Накопленная ошибка
     pid_last_error = Column(Float, default=0.0)  # Предыдущая ошибка
+    pid_last_ts = Column(DateTime, nullable=True)  # Время предыдущего замера (UTC), для dt
     pid_output_min = Column(Float, default=0.0)  # Минимум выхода
     pid_output_max = Column(Float, default=100.0)  # Максимум выхода
     
     # Math expression
     expression = Column(Text, nullable=True)  # "field2 = field1 * 2 + 10"
     
+    # Windowed rules: moving_average, window_min, window_max, derivative, ewma, hysteresis
+    window_seconds = Column(Integer, nullable=True)  # Длина окна, сек
+    ewma_alpha = Column(Float, nullable=True)  # Коэф. сглаживания EWMA (0..1]
+    threshold_low = Column(Float, nullable=True)  # Нижний порог гистерезиса (верхний — threshold_value)
+    
     is_active = Column(Boolean, default=True)
     priority = Column(Integer, default=0)  # Порядок выполнения (меньше = раньше)
     
@@ -43,7 +50,7 @@ class AutomationRule(Base):
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
     # Relationship
-    channel = relationship("Channel", back_populates="automation_rules")
+    channel = relationship("Channel", back_populates="automation_rules", foreign_keys=[channel_id])
 
 
 
@@ -50,7 +50,10 @@ class Channel(Base):
     feeds = relationship("Feed", back_populates="channel", cascade="all, delete-orphan")
     api_keys = relationship("ApiKey", back_populates="channel", cascade="all, delete-orphan")
     widgets = relationship("CustomWidget", back_populates="channel", cascade="all, delete-orphan")
-    automation_rules = relationship("AutomationRule", back_populates="channel", cascade="all, delete-orphan")
+    automation_rules = relationship(
+        "AutomationRule", back_populates="channel", cascade="all, delete-orphan",
+        foreign_keys="AutomationRule.channel_id"
+    )
     ai_prompt_overrides = relationship(
         "AIServicePromptOverride",
         back_populates="channel",
@@ -0,0 +1,12 @@
+"""Rate limit bucket model (limits shared between uvicorn workers)"""
+from sqlalchemy import Column, String, Float
+from app.database import Base
+
+
+class RateLimitBucket(Base):
+    """Token bucket одного ключа лимита (IP + класс пути или API-ключ)"""
+    __tablename__ = "rate_limit_buckets"
+    
+    key = Column(String(300), primary_key=True)  # "10.0.0.5:/update", "<api_key>:api_key"
+    tokens = Column(Float, nullable=False)  # оставшиеся токены на момент updated
+    updated = Column(Float, nullable=False, index=True)  # epoch seconds последнего пополнения
@@ -18,6 +18,8 @@ class RequestLog(Base):
     response_status = Column(Integer, nullable=False)
     response_time = Column(Float, nullable=False)  # milliseconds
     api_key_used = Column(String(255), nullable=True)
+    # Requests this row stands for: 1 / sample rate (100 for 1% of /update calls)
+    sample_weight = Column(Float, nullable=False, default=1.0, server_default="1")
     
     __table_args__ = (
         Index('ix_request_logs_timestamp_status', 'timestamp', 'response_status'),
@@ -25,17 +27,65 @@ class RequestLog(Base):
     )
 
 
+class RequestLogHourly(Base):
+    """Hourly roll-up of archived request logs (per endpoint template and method)"""
+    __tablename__ = "request_log_hourly"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    hour = Column(DateTime(timezone=True), nullable=False)  # начало часа (UTC)
+    endpoint = Column(String(500), nullable=False)  # шаблон пути: /channels/{id}/feeds.json
+    method = Column(String(10), nullable=False)
+    request_count = Column(Integer, nullable=False, default=0)
+    status_2xx = Column(Integer, nullable=False, default=0)
+    status_3xx = Column(Integer, nullable=False, default=0)
+    status_4xx = Column(Integer, nullable=False, default=0)
+    status_5xx = Column(Integer, nullable=False, default=0)
+    latency_sum = Column(Float, nullable=False, default=0.0)  # milliseconds
+    latency_max = Column(Float, nullable=True)
+    latency_p50 = Column(Float, nullable=True)
+    latency_p95 = Column(Float, nullable=True)
+    latency_p99 = Column(Float, nullable=True)
+    
+    __table_args__ = (
+        Index('ix_request_log_hourly_hour_endpoint', 'hour', 'endpoint', 'method', unique=True),
+    )
 
 
+# Upper bounds (ms) of the latency histogram columns of RequestLogMinute; the last column is +Inf
+LATENCY_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+LATENCY_BUCKET_COLUMNS = (
+    "latency_le_1", "latency_le_2_5", "latency_le_5", "latency_le_10", "latency_le_25", "latency_le_50",
+    "latency_le_100", "latency_le_250", "latency_le_500", "latency_le_1000", "latency_le_2500", "latency_le_inf",
+)
 
 
-
-
-
-
-
-
-
-
-
-
+class RequestLogMinute(Base):
+    """Per-minute request counts of one worker (every request, before log sampling)"""
+    __tablename__ = "request_log_minute"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    minute = Column(DateTime(timezone=True), nullable=False)  # начало минуты (UTC)
+    endpoint = Column(String(500), nullable=False)  # шаблон маршрута: /channels/{channel_id}/feeds.json
+    method = Column(String(10), nullable=False)
+    status_class = Column(Integer, nullable=False)  # 2, 3, 4, 5
+    request_count = Column(Integer, nullable=False, default=0)
+    latency_sum = Column(Float, nullable=False, default=0.0)  # milliseconds
+    latency_max = Column(Float, nullable=True)
+    
+    # Latency histogram: requests with latency <= bound (and above the previous bound)
+    latency_le_1 = Column(Integer, nullable=False, default=0)
+    latency_le_2_5 = Column(Integer, nullable=False, default=0)
+    latency_le_5 = Column(Integer, nullable=False, default=0)
+    latency_le_10 = Column(Integer, nullable=False, default=0)
+    latency_le_25 = Column(Integer, nullable=False, default=0)
+    latency_le_50 = Column(Integer, nullable=False, default=0)
+    latency_le_100 = Column(Integer, nullable=False, default=0)
+    latency_le_250 = Column(Integer, nullable=False, default=0)
+    latency_le_500 = Column(Integer, nullable=False, default=0)
+    latency_le_1000 = Column(Integer, nullable=False, default=0)
+    latency_le_2500 = Column(Integer, nullable=False, default=0)
+    latency_le_inf = Column(Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        Index('ix_request_log_minute_minute_endpoint', 'minute', 'endpoint'),
+    )
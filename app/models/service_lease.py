@@ -0,0 +1,12 @@
+"""Service lease model (leader election between uvicorn workers)"""
+from sqlalchemy import Column, String, DateTime
+from app.database import Base
+
+
+class ServiceLease(Base):
+    """Аренда фоновой задачи: только держатель аренды выполняет задачу"""
+    __tablename__ = "service_leases"
+    
+    name = Column(String(100), primary_key=True)  # "archive-scheduler"
+    holder = Column(String(255), nullable=False)  # host:pid:token воркера
+    expires_at = Column(DateTime, nullable=False)  # UTC
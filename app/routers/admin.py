@@ -1,9 +1,9 @@
 """Admin panel routes"""
+import os
 from typing import Optional
 from datetime import datetime, timedelta
 from fastapi import APIRouter, Depends, HTTPException, Request, Query
-from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
+from fastapi.responses import HTMLResponse, PlainTextResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import func, desc
 import psutil
@@ -14,15 +14,25 @@ from app.models.user import User
 from app.models.user_profile import UserProfile
 from app.models.channel import Channel
 from app.models.feed import Feed
-from app.models.request_log import RequestLog
+from app.models.request_log import RequestLog, RequestLogHourly
 from app.config import settings
+from app.templating import RootPathTemplates
 import psutil as _psutil
 from app.services.mem_buffer import mem_buffer
+from app.services.request_log_writer import request_log_writer
+from app.services.request_timing import slow_requests
+from app.services.profiler import ProfilerBusy, memory_tracer, stack_sampler
+from app.services.sql_stats import sql_stats
+from app.services import request_stats
 from app.services import auth_service
 from app.schemas.user import UserUpdate, UserDetailResponse
+from app.schemas.automation import AutomationReplayRequest
+from app.services.automation import replay
+from app.services.automation.metrics import automation_metrics
+from app.services.automation.post_commit import post_commit_queue
 
 router = APIRouter(prefix="/api/admin", tags=["admin"])
-templates = Jinja2Templates(directory="app/templates")
+templates = RootPathTemplates(directory="app/templates")
 
 
 @router.get("/stats")
@@ -45,13 +55,10 @@ def get_stats(
     yesterday = datetime.utcnow() - timedelta(days=1)
     recent_feeds = db.query(Feed).filter(Feed.created_at >= yesterday).count()
     
-    # Request stats (last 24 hours)
-    recent_requests = db.query(RequestLog).filter(RequestLog.timestamp >= yesterday).count()
-    
-    # Average response time
-    avg_response_time = db.query(func.avg(RequestLog.response_time)).filter(
-        RequestLog.timestamp >= yesterday
-    ).scalar() or 0
+    # Request stats (last 24 hours) from the per-minute aggregates: every request, not the log sample
+    requests_24h = request_stats.totals(db, yesterday)
+    recent_requests = requests_24h["count"]
+    avg_response_time = requests_24h["avg_response_time"] or 0
     
     # System stats
     cpu_percent = psutil.cpu_percent(interval=0.1)
@@ -67,6 +74,8 @@ def get_stats(
         "recent_feeds_24h": recent_feeds,
         "recent_requests_24h": recent_requests,
         "avg_response_time": round(avg_response_time, 2),
+        "p95_response_time": requests_24h["p95"],
+        "error_requests_24h": requests_24h["status_4xx"] + requests_24h["status_5xx"],
         "cpu_percent": cpu_percent,
         "memory_percent": memory.percent,
         "disk_percent": disk.percent
@@ -93,10 +102,20 @@ def list_all_users(
     
     users = query.offset(skip).limit(limit).all()
     
-    # Add channel count and profile for each user
+    # Profiles and channel counts of the whole page in two queries
+    user_ids = [user.id for user in users]
+    display_names = dict(
+        db.query(UserProfile.user_id, UserProfile.display_name).filter(UserProfile.user_id.in_(user_ids)).all()
+    )
+    channel_counts = dict(
+        db.query(Channel.user_id, func.count(Channel.id))
+        .filter(Channel.user_id.in_(user_ids))
+        .group_by(Channel.user_id)
+        .all()
+    )
+    
     users_with_stats = []
     for user in users:
-        profile = db.query(UserProfile).filter(UserProfile.user_id == user.id).first()
         user_dict = {
             "id": user.id,
             "email": user.email,
@@ -104,8 +123,8 @@ def list_all_users(
             "is_admin": user.is_admin,
             "created_at": user.created_at,
             "last_login": user.last_login,
-            "display_name": profile.display_name if profile else None,
-            "channel_count": db.query(Channel).filter(Channel.user_id == user.id).count()
+            "display_name": display_names.get(user.id),
+            "channel_count": channel_counts.get(user.id, 0)
         }
         users_with_stats.append(user_dict)
     
@@ -309,7 +328,7 @@ def list_all_channels(
     """List all channels with sorting and filtering"""
     from app.services import channel_stats
     
-    query = db.query(Channel)
+    query = db.query(Channel, User.email).outerjoin(User, User.id == Channel.user_id)
     
     # Apply filter
     if filter_public is not None:
@@ -321,16 +340,19 @@ def list_all_channels(
     else:
         query = query.order_by(getattr(Channel, sort, Channel.created_at))
     
-    channels = query.offset(skip).limit(limit).all()
+    rows = query.offset(skip).limit(limit).all()
+    
+    # Stats of the whole page with grouped queries
+    stats_by_channel = {}
+    if include_stats:
+        stats_by_channel = channel_stats.calculate_channels_stats([channel.id for channel, _ in rows], db)
     
-    # Add stats for each channel
     channels_with_stats = []
-    for channel in channels:
-        owner = db.query(User).filter(User.id == channel.user_id).first() if channel.user_id else None
+    for channel, owner_email in rows:
         channel_dict = {
             "id": channel.id,
             "name": channel.name,
-            "owner_email": owner.email if owner else "N/A",
+            "owner_email": owner_email or "N/A",
             "public": channel.public,
             "entry_count": channel.last_entry_id,
             "created_at": channel.created_at,
@@ -338,7 +360,7 @@ def list_all_channels(
         }
         
         if include_stats:
-            stats = channel_stats.calculate_channel_stats(channel.id, db)
+            stats = stats_by_channel[channel.id]
             channel_dict.update({
                 "avg_interval_seconds": stats.avg_interval_seconds,
                 "min_interval_seconds": stats.min_interval_seconds,
@@ -367,18 +389,73 @@ def get_channel_stats(
     return stats.to_dict()
 
 
+@router.post("/channels/{channel_id}/automation/replay")
+def replay_channel_automation(
+    channel_id: int,
+    request: AutomationReplayRequest,
+    db: Session = Depends(get_db),
+    admin: User = Depends(get_current_admin)
+):
+    """Start automation replay for any channel"""
+    if not db.query(Channel.id).filter(Channel.id == channel_id).first():
+        raise HTTPException(status_code=404, detail="Channel not found")
+    job = replay.start_replay(db, channel_id, request.dry_run, request.start, request.end, request.rule_ids)
+    if job is None:
+        raise HTTPException(status_code=409, detail="Replay is already running for this channel")
+    return job.to_dict()
+
+
+@router.get("/automation/replay/{job_id}")
+def get_automation_replay(
+    job_id: str,
+    db: Session = Depends(get_db),
+    admin: User = Depends(get_current_admin)
+):
+    """Replay job progress"""
+    job = replay.get_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Replay job not found")
+    return job.to_dict()
+
+
+@router.get("/automation/metrics")
+def get_automation_metrics(
+    channel_id: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    admin: User = Depends(get_current_admin)
+):
+    """Per-rule automation metrics of this worker, slowest first"""
+    return {
+        "slow_rule_ms": settings.AUTOMATION_SLOW_RULE_MS,
+        "post_commit": post_commit_queue.stats(),
+        "rules": automation_metrics.snapshot(channel_id)[:limit],
+    }
+
+
+@router.post("/automation/metrics/reset")
+def reset_automation_metrics(channel_id: Optional[int] = None, admin: User = Depends(get_current_admin)):
+    """Reset automation metrics"""
+    automation_metrics.reset(channel_id)
+    return {"ok": True}
+
+
 @router.get("/requests")
 def list_requests(
     skip: int = 0,
     limit: int = 100,
     status: Optional[int] = None,
     method: Optional[str] = None,
+    before: Optional[datetime] = None,
     db: Session = Depends(get_db),
     admin: User = Depends(get_current_admin)
 ):
-    """List recent API requests"""
+    """List recent API requests (logged sample); pass the last timestamp as ``before`` for the next page"""
     query = db.query(RequestLog)
     
+    # Keyset paging on the timestamp index instead of a growing OFFSET
+    if before:
+        query = query.filter(RequestLog.timestamp < before)
+    
     # Apply filters
     if status:
         query = query.filter(RequestLog.response_status == status)
@@ -404,6 +481,97 @@ def list_requests(
     ]
 
 
+@router.get("/requests/summary")
+def requests_summary(
+    hours: int = Query(24, ge=1, le=24 * 90),
+    step_minutes: int = Query(5, ge=1, le=24 * 60),
+    top: int = Query(10, ge=1, le=100),
+    order: str = Query("count", pattern="^(count|time)$"),
+    endpoint: Optional[str] = None,
+    db: Session = Depends(get_db),
+    admin: User = Depends(get_current_admin)
+):
+    """Totals, percentiles, chart points and top endpoints from the per-minute request aggregates"""
+    since = (datetime.utcnow() - timedelta(hours=hours)).replace(second=0, microsecond=0)
+    step_minutes = max(step_minutes, -(-hours * 60 // 1440))  # at most 1440 chart points
+    return {
+        "since": since,
+        "totals": request_stats.totals(db, since, endpoint),
+        "timeline": request_stats.timeline(db, since, step_minutes, endpoint),
+        "top_endpoints": request_stats.top_endpoints(db, since, top, order),
+    }
+
+
+@router.get("/requests/slow")
+def list_slow_requests(
+    limit: int = Query(100, ge=1, le=1000),
+    admin: User = Depends(get_current_admin)
+):
+    """Requests of this worker slower than SLOW_REQUEST_MS: phases and SQL statements, newest first"""
+    return {
+        "threshold_ms": settings.SLOW_REQUEST_MS,
+        "requests": slow_requests.snapshot(limit),
+    }
+
+
+@router.post("/requests/slow/reset")
+def reset_slow_requests(admin: User = Depends(get_current_admin)):
+    """Clear the slow request ring"""
+    slow_requests.clear()
+    return {"ok": True}
+
+
+@router.get("/sql/stats")
+def list_sql_stats(
+    limit: int = Query(50, ge=1, le=1000),
+    sort: str = Query("total", pattern="^(total|count|max)$"),
+    admin: User = Depends(get_current_admin)
+):
+    """Statement fingerprints of this worker by cumulative cost, and the likely N+1 queries"""
+    return sql_stats.snapshot(limit, sort)
+
+
+@router.post("/sql/stats/reset")
+def reset_sql_stats(admin: User = Depends(get_current_admin)):
+    """Clear the statement statistics and N+1 findings"""
+    sql_stats.reset()
+    return {"ok": True}
+
+
+@router.get("/requests/hourly")
+def list_requests_hourly(
+    hours: int = Query(168, ge=1, le=24 * 366),
+    endpoint: Optional[str] = None,
+    db: Session = Depends(get_db),
+    admin: User = Depends(get_current_admin)
+):
+    """Hourly request aggregates rolled up from archived request logs"""
+    since = datetime.utcnow() - timedelta(hours=hours)
+    query = db.query(RequestLogHourly).filter(RequestLogHourly.hour >= since)
+    if endpoint:
+        query = query.filter(RequestLogHourly.endpoint == endpoint)
+    rows = query.order_by(desc(RequestLogHourly.hour), desc(RequestLogHourly.request_count)).all()
+    
+    return [
+        {
+            "hour": row.hour,
+            "endpoint": row.endpoint,
+            "method": row.method,
+            "count": row.request_count,
+            "status_2xx": row.status_2xx,
+            "status_3xx": row.status_3xx,
+            "status_4xx": row.status_4xx,
+            "status_5xx": row.status_5xx,
+            "avg_response_time": round(row.latency_sum / row.request_count, 2) if row.request_count else None,
+            "max_response_time": row.latency_max,
+            "p50": row.latency_p50,
+            "p95": row.latency_p95,
+            "p99": row.latency_p99,
+        }
+        for row in rows
+    ]
+
+
 @router.get("/system/health")
 def system_health(admin: User = Depends(get_current_admin)):
     """Get system health metrics"""
@@ -427,7 +595,8 @@ def system_health(admin: User = Depends(get_current_admin)):
             "free": disk.free,
             "percent": disk.percent
         },
-        "membuffer": mem_buffer.stats() if settings.MEMBUFFER_ENABLED else None
+        "membuffer": mem_buffer.stats() if settings.MEMBUFFER_ENABLED else None,
+        "request_log": request_log_writer.stats()
     }
 
 
@@ -460,6 +629,63 @@ def process_memory(admin: User = Depends(get_current_admin)):
         return {"error": str(e)}
 
 
+@router.get("/process/profile")
+def process_profile(
+    seconds: float = Query(10, gt=0, le=settings.PROFILER_MAX_SECONDS),
+    interval_ms: float = Query(5, ge=1, le=1000),
+    format: str = Query("collapsed", pattern="^(collapsed|json)$"),
+    include_idle: bool = False,
+    admin: User = Depends(get_current_admin)
+):
+    """Sample the stacks of this worker for ``seconds``
+
+    ``collapsed`` returns flamegraph input (``frame;frame count`` lines),
+    ``json`` the top functions. Threads waiting in select/queues are skipped
+    unless ``include_idle``.
+    """
+    try:
+        result = stack_sampler.sample(seconds, interval_ms / 1000, include_idle)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if format == "collapsed":
+        return PlainTextResponse(stack_sampler.collapsed(result), headers={
+            "X-Profile-Samples": str(result["samples"]),
+            "X-Profile-Duration": str(result["duration_s"]),
+        })
+    return {
+        "pid": os.getpid(),
+        **{key: value for key, value in result.items() if key != "stacks"},
+        "top": stack_sampler.top_functions(result),
+    }
+
+
+@router.post("/process/tracemalloc/start")
+def tracemalloc_start(frames: int = Query(10, ge=1, le=100), admin: User = Depends(get_current_admin)):
+    """Start tracing allocations in this worker; the current state becomes the baseline"""
+    return {"pid": os.getpid(), **memory_tracer.start(frames)}
+
+
+@router.post("/process/tracemalloc/stop")
+def tracemalloc_stop(admin: User = Depends(get_current_admin)):
+    """Stop tracing allocations (tracing slows every allocation down)"""
+    return {"pid": os.getpid(), **memory_tracer.stop()}
+
+
+@router.get("/process/tracemalloc")
+def tracemalloc_top(
+    limit: int = Query(30, ge=1, le=500),
+    group_by: str = Query("lineno", pattern="^(lineno|filename|traceback)$"),
+    diff: bool = Query(False, description="Growth since the baseline instead of current size"),
+    rebase: bool = Query(False, description="Make this snapshot the new baseline"),
+    admin: User = Depends(get_current_admin)
+):
+    """Top allocation sites of this worker"""
+    try:
+        return {"pid": os.getpid(), **memory_tracer.top(limit, group_by, diff, rebase)}
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
 @router.get("/membuffer/stats")
 def membuffer_stats(admin: User = Depends(get_current_admin)):
     """Get in-memory buffer stats"""
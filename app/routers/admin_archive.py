@@ -67,6 +67,7 @@ async def update_config(
         source_config.pg_password_enc = config.pg_password_enc
         source_config.pg_schema = config.pg_schema
         source_config.pg_ssl = config.pg_ssl
+        source_config.parquet_dir = config.parquet_dir
         
         # Target config is the new one
         target_config = ArchiveSettings()
@@ -86,6 +87,8 @@ async def update_config(
             pass
     
     db.commit()
+    # Engines of the previous archive target are no longer needed
+    archive_service.dispose_backends(keep=config)
     # Restart scheduler with new settings
     await archive_scheduler.stop()
     if payload.enabled:
@@ -119,6 +122,7 @@ def run_archive_now(db: Session = Depends(get_db), admin: User = Depends(get_cur
     return ArchiveRunResponse(
         processed=processed,
         deleted=deleted,
+        request_logs_archived=config.last_request_logs_archived or 0,
         duration_seconds=duration,
         status="success",
     )
@@ -134,7 +138,10 @@ def get_status(db: Session = Depends(get_db), admin: User = Depends(get_current_
         last_status=config.last_status,
         last_error=config.last_error,
         last_processed=config.last_processed,
+        last_request_logs_archived=config.last_request_logs_archived,
         scheduler_running=archive_scheduler.is_running,
+        scheduler_leader=archive_scheduler.is_leader,
+        next_run_at=archive_scheduler.next_run_at,
     )
 
 
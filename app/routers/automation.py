@@ -6,13 +6,72 @@ from sqlalchemy.orm import Session
 from app.database import get_db
 from app.models.automation_rule import AutomationRule
 from app.models.user import User
-from app.schemas.automation import AutomationRuleCreate, AutomationRuleUpdate, AutomationRuleResponse
+from app.schemas.automation import (
+    AutomationReplayRequest, AutomationRuleCreate, AutomationRuleUpdate, AutomationRuleResponse,
+    AutomationSimulationRequest
+)
 from app.services import channel_service
+from app.services.automation.expression import FIELD_NAMES, ExpressionError, compile_expression
+from app.services.automation import replay, simulation
+from app.services.automation.metrics import automation_metrics
+from app.services.automation.pid_state import pid_state_store
+from app.services.automation.triggers import find_cycle, load_edges
+from app.services.automation.windows import WINDOW_RULE_TYPES, window_rule_error, window_state_store
+from app.services.automation_service import automation_engine
 from app.dependencies import get_current_user_optional
 
 router = APIRouter(prefix="/api/channels", tags=["automation"])
 
 
+def _validate_expression(rule_type: Optional[str], expression: Optional[str]) -> None:
+    """Reject math expressions the rule compiler would skip"""
+    if rule_type != 'math' or not expression:
+        return
+    try:
+        compile_expression(expression)
+    except ExpressionError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid expression: {e}")
+
+
+def _validate_window_rule(rule_type: Optional[str], window_seconds, ewma_alpha, threshold_value, threshold_low) -> None:
+    """Reject windowed rules with missing or inconsistent parameters"""
+    if rule_type not in WINDOW_RULE_TYPES:
+        return
+    error = window_rule_error(rule_type, window_seconds, ewma_alpha, threshold_value, threshold_low)
+    if error:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid {rule_type} rule: {error}")
+
+
+def _validate_trigger_channel(
+    db: Session,
+    channel_id: int,
+    trigger_channel_id: Optional[int],
+    current_user: Optional[User],
+    rule_type: Optional[str] = None
+) -> Optional[int]:
+    """Check the source channel of a cross-channel trigger; returns the id to store"""
+    if trigger_channel_id is None or trigger_channel_id == channel_id:
+        return None
+    if rule_type == "math":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Math rules read the channel's own feed, trigger_channel_id is not supported"
+        )
+    source = channel_service.get_channel(db, trigger_channel_id)
+    if not source:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Trigger channel not found")
+    if not channel_service.check_channel_access(source, current_user):
+        raise HTTPException(status_code=403, detail="No access to trigger channel")
+    cycle = find_cycle(load_edges(db), trigger_channel_id, channel_id)
+    if cycle:
+        path = " -> ".join(str(c) for c in cycle)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Cross-channel trigger would create a cycle: {path}"
+        )
+    return trigger_channel_id
+
+
 @router.post("/{channel_id}/automation", response_model=AutomationRuleResponse, status_code=status.HTTP_201_CREATED)
 async def create_automation_rule(
     channel_id: int,
@@ -29,6 +88,15 @@ async def create_automation_rule(
     if not channel_service.check_channel_access(channel, current_user, require_owner=True):
         raise HTTPException(status_code=403, detail="Only channel owner can create rules")
     
+    _validate_expression(rule_create.rule_type, rule_create.expression)
+    _validate_window_rule(
+        rule_create.rule_type, rule_create.window_seconds, rule_create.ewma_alpha,
+        rule_create.threshold_value, rule_create.threshold_low
+    )
+    trigger_channel_id = _validate_trigger_channel(
+        db, channel_id, rule_create.trigger_channel_id, current_user, rule_create.rule_type
+    )
+    
     # Create rule
     rule = AutomationRule(
         channel_id=channel_id,
@@ -36,6 +104,7 @@ async def create_automation_rule(
         rule_type=rule_create.rule_type,
         priority=rule_create.priority,
         trigger_field=rule_create.trigger_field,
+        trigger_channel_id=trigger_channel_id,
         condition=rule_create.condition,
         threshold_value=rule_create.threshold_value,
         target_field=rule_create.target_field,
@@ -47,12 +116,16 @@ async def create_automation_rule(
         pid_kd=rule_create.pid_kd,
         pid_output_min=rule_create.pid_output_min,
         pid_output_max=rule_create.pid_output_max,
-        expression=rule_create.expression
+        expression=rule_create.expression,
+        window_seconds=rule_create.window_seconds,
+        ewma_alpha=rule_create.ewma_alpha,
+        threshold_low=rule_create.threshold_low
     )
     
     db.add(rule)
     db.commit()
     db.refresh(rule)
+    automation_engine.invalidate(channel_id)
     
     return rule
 
@@ -79,6 +152,23 @@ def list_automation_rules(
     return rules
 
 
+@router.get("/{channel_id}/automation/metrics")
+def get_automation_metrics(
+    channel_id: int,
+    db: Session = Depends(get_db),
+    current_user: Optional[User] = Depends(get_current_user_optional)
+):
+    """Execution metrics of the channel's rules (this worker process)"""
+    channel = channel_service.get_channel(db, channel_id)
+    if not channel:
+        raise HTTPException(status_code=404, detail="Channel not found")
+    
+    if not channel_service.check_channel_access(channel, current_user, require_owner=True):
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    return automation_metrics.snapshot(channel_id)
+
+
 @router.get("/{channel_id}/automation/{rule_id}", response_model=AutomationRuleResponse)
 def get_automation_rule(
     channel_id: int,
@@ -133,11 +223,24 @@ async def update_automation_rule(
     
     # Update fields
     update_data = rule_update.dict(exclude_unset=True)
+    _validate_expression(rule.rule_type, update_data.get('expression', rule.expression))
+    _validate_window_rule(rule.rule_type, *(
+        update_data.get(name, getattr(rule, name))
+        for name in ('window_seconds', 'ewma_alpha', 'threshold_value', 'threshold_low')
+    ))
+    if 'trigger_channel_id' in update_data or update_data.get('is_active'):
+        # Re-activated rules rejoin the dependency graph, check them as new
+        update_data['trigger_channel_id'] = _validate_trigger_channel(
+            db, channel_id, update_data.get('trigger_channel_id', rule.trigger_channel_id), current_user,
+            rule.rule_type
+        )
     for field, value in update_data.items():
         setattr(rule, field, value)
     
     db.commit()
     db.refresh(rule)
+    automation_engine.invalidate(channel_id)
+    window_state_store.forget(rule_id)
     
     return rule
 
@@ -168,19 +271,94 @@ async def delete_automation_rule(
     
     db.delete(rule)
     db.commit()
+    automation_engine.invalidate(channel_id)
+    pid_state_store.forget(rule_id)
+    window_state_store.forget(rule_id)
+    automation_metrics.forget(rule_id)
 
 
+@router.post("/{channel_id}/automation/replay", status_code=status.HTTP_202_ACCEPTED)
+def start_automation_replay(
+    channel_id: int,
+    request: AutomationReplayRequest,
+    db: Session = Depends(get_db),
+    current_user: Optional[User] = Depends(get_current_user_optional)
+):
+    """Recompute rule outputs over stored feeds (dry run by default)"""
+    channel = channel_service.get_channel(db, channel_id)
+    if not channel:
+        raise HTTPException(status_code=404, detail="Channel not found")
+    
+    if not channel_service.check_channel_access(channel, current_user, require_owner=True):
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    job = replay.start_replay(db, channel_id, request.dry_run, request.start, request.end, request.rule_ids)
+    if job is None:
+        raise HTTPException(status_code=409, detail="Replay is already running for this channel")
+    return job.to_dict()
 
 
+@router.get("/{channel_id}/automation/replay/{job_id}")
+def get_automation_replay(
+    channel_id: int,
+    job_id: str,
+    db: Session = Depends(get_db),
+    current_user: Optional[User] = Depends(get_current_user_optional)
+):
+    """Replay job progress"""
+    channel = channel_service.get_channel(db, channel_id)
+    if not channel:
+        raise HTTPException(status_code=404, detail="Channel not found")
+    
+    if not channel_service.check_channel_access(channel, current_user, require_owner=True):
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    job = replay.get_job(db, job_id)
+    if not job or job.channel_id != channel_id:
+        raise HTTPException(status_code=404, detail="Replay job not found")
+    
+    return job.to_dict()
 
 
-
-
-
-
-
-
-
-
-
-
+@router.post("/{channel_id}/automation/simulate")
+def simulate_automation(
+    channel_id: int,
+    request: AutomationSimulationRequest,
+    db: Session = Depends(get_db),
+    current_user: Optional[User] = Depends(get_current_user_optional)
+):
+    """Run saved or draft rules over samples in memory and return the output series"""
+    channel = channel_service.get_channel(db, channel_id)
+    if not channel:
+        raise HTTPException(status_code=404, detail="Channel not found")
+    
+    if not channel_service.check_channel_access(channel, current_user, require_owner=True):
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    if request.rule_ids:
+        saved = db.query(AutomationRule).filter(
+            AutomationRule.channel_id == channel_id,
+            AutomationRule.id.in_(request.rule_ids)
+        ).order_by(AutomationRule.priority.asc(), AutomationRule.id.asc()).all()
+    elif request.rules:
+        saved = []
+    else:
+        saved = db.query(AutomationRule).filter(
+            AutomationRule.channel_id == channel_id,
+            AutomationRule.is_active == True
+        ).order_by(AutomationRule.priority.asc(), AutomationRule.id.asc()).all()
+    rules = [simulation.rule_snapshot(rule, channel_id) for rule in saved]
+    rules += [simulation.rule_snapshot(rule, channel_id) for rule in request.rules or []]
+    # Stable: drafts run after saved rules of the same priority
+    rules.sort(key=lambda rule: rule.priority or 0)
+    
+    columns = {name: getattr(request, name) for name in FIELD_NAMES}
+    try:
+        if request.timestamps is not None or any(values is not None for values in columns.values()):
+            data = simulation.input_from_samples(request.timestamps, columns, request.interval_seconds)
+        else:
+            data = simulation.input_from_feeds(db, channel_id, request.start, request.end)
+    except simulation.SimulationError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    return simulation.simulate(rules, data)
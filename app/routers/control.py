@@ -78,25 +78,12 @@ async def update_channel_field(
     # 4. Prepare feed data with output fields preservation
     from app.schemas.feed import FeedCreate
     from app.services import feed_service
-    from app.services.automation_service import get_output_fields
-    
-    # Get output fields and last feed to preserve automation state
-    output_fields = get_output_fields(channel_id, db)
-    last_feed = feed_service.get_last_feed(db, channel_id) if output_fields else None
-    
-    # Create field values dict
-    feed_data_dict = {}
-    for i in range(1, 9):
-        field_name = f'field{i}'
-        if field_name == field_update.field_name:
-            # This is the field we're updating
-            feed_data_dict[field_name] = field_update.value
-        elif field_name in output_fields and last_feed:
-            # This is an output field - preserve its value
-            feed_data_dict[field_name] = getattr(last_feed, field_name, None)
-        else:
-            # All other fields - None
-            feed_data_dict[field_name] = None
+    from app.services.automation_service import automation_engine
+    
+    # Only the updated field is set, output fields keep their last values
+    feed_data_dict = {f'field{i}': None for i in range(1, 9)}
+    feed_data_dict[field_update.field_name] = field_update.value
+    automation_engine.preserve_output_fields(db, channel, feed_data_dict)
     
     feed_data = FeedCreate(**feed_data_dict)
     
@@ -105,12 +92,12 @@ async def update_channel_field(
         feed = feed_service.create_feed(db, channel, feed_data, auto_commit=False)
         
         # Execute automation rules
-        from app.services.automation_service import automation_engine
         feed = automation_engine.execute_rules(channel.id, feed, db)
         
         # Commit
         db.commit()
         db.refresh(feed)
+        await automation_engine.after_commit(db)
         
         # 5. Logging
         logger.info(
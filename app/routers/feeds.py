@@ -6,6 +6,7 @@ from fastapi.responses import JSONResponse, PlainTextResponse
 from sqlalchemy.orm import Session
 import csv
 import io
+import time
 import xml.etree.ElementTree as ET
 from xml.dom import minidom
 
@@ -14,6 +15,8 @@ from app.schemas.feed import FeedCreate, FeedResponse
 from app.services import channel_service, feed_service, data_processor
 from app.config import settings as app_settings
 from app.services.mem_buffer import mem_buffer, FeedSpec
+from app.services import request_timing
+from app.services.metrics import update_phase_seconds
 from app.dependencies import verify_api_key, get_current_user_optional
 from app.models.user import User
 
@@ -66,6 +69,14 @@ def _get_channel_by_write_key_cached(db: Session, key: str):
     from app.services import channel_service as _cs
     return _cs.get_channel(db, key_obj.channel_id)
 
+def _phase_done(phase: str, start: float) -> float:
+    """Record an /update phase (/metrics, Server-Timing); returns the start of the next one"""
+    now = time.perf_counter()
+    update_phase_seconds.observe(now - start, phase)
+    request_timing.add(phase, now - start)
+    return now
+
+
 @router.post("/update")
 @router.get("/update")
 async def update_feed(
@@ -92,6 +103,7 @@ async def update_feed(
     from app.config import settings
     from app.models.api_key import ApiKey
     
+    phase_start = time.perf_counter()
     if settings.AUTH_ENABLED:
         # In auth mode, verify API key (cached)
         channel = _get_channel_by_write_key_cached(db, api_key)
@@ -117,11 +129,7 @@ async def update_feed(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Channel not found"
         )
-    
-    # Получить выходные поля и последнее значение для сохранения состояния автоматизации
-    from app.services.automation_service import get_output_fields
-    output_fields = get_output_fields(channel.id, db)
-    last_feed = feed_service.get_last_feed(db, channel.id) if output_fields else None
+    phase_start = _phase_done("auth", phase_start)
     
     # Словарь для полей, сохраняющий значения выходных полей
     field_values = {
@@ -135,11 +143,10 @@ async def update_feed(
         'field8': field8,
     }
     
-    # Для выходных полей: если не указаны явно, взять из последнего feed
-    if last_feed:
-        for field_name in ['field1', 'field2', 'field3', 'field4', 'field5', 'field6', 'field7', 'field8']:
-            if field_values[field_name] is None and field_name in output_fields:
-                field_values[field_name] = getattr(last_feed, field_name, None)
+    # Для выходных полей: если не указаны явно, взять последние значения
+    from app.services.automation_service import automation_engine
+    automation_engine.preserve_output_fields(db, channel, field_values)
+    phase_start = _phase_done("output_fields", phase_start)
     
     # Always do direct write to return real entry_id (ThingSpeak compatible)
     # Memory buffer can be used for internal operations, but /update endpoint
@@ -161,15 +168,20 @@ async def update_feed(
     
     # Create feed without committing
     feed = feed_service.create_feed(db, channel, feed_data, auto_commit=False)
+    phase_start = _phase_done("insert", phase_start)
     
     # Execute automation rules
-    from app.services.automation_service import automation_engine
     feed = automation_engine.execute_rules(channel.id, feed, db)
+    phase_start = _phase_done("rules", phase_start)
     
     # Now commit with modified feed
     db.commit()
     db.refresh(feed)
     
+    # Post-commit automation (dependent channels) runs off the request
+    await automation_engine.after_commit(db)
+    _phase_done("commit", phase_start)
+    
     # Return entry_id as plain text
     return PlainTextResponse(content=str(feed.entry_id))
 
@@ -2,11 +2,11 @@
 from typing import Optional
 from fastapi import APIRouter, Depends, Request, Form, File, UploadFile, HTTPException, status
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
 
 from app.database import get_db
 from app.config import settings
+from app.templating import RootPathTemplates
 from app.dependencies import get_current_user
 from app.models.user import User
 from app.models.user_profile import UserProfile
@@ -14,7 +14,7 @@ from app.schemas.user_profile import UserProfileUpdate
 from app.services import upload_service, auth_service
 
 router = APIRouter(prefix="/settings", tags=["settings"])
-templates = Jinja2Templates(directory="app/templates")
+templates = RootPathTemplates(directory="app/templates")
 
 
 def get_template_context(request: Request, user: User):
@@ -2,12 +2,12 @@
 from typing import Optional
 from fastapi import APIRouter, Depends, Request, Form, HTTPException, status, Response, File, UploadFile
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
 from datetime import timedelta
 
 from app.database import get_db
 from app.config import settings
+from app.templating import RootPathTemplates
 from app.dependencies import get_current_user_optional
 from app.models.user import User
 from app.services import channel_service, auth_service, widget_version_service
@@ -15,7 +15,7 @@ from app.schemas.channel import ChannelCreate, ChannelUpdate
 from app.schemas.user import UserCreate
 
 router = APIRouter(tags=["web"])
-templates = Jinja2Templates(directory="app/templates")
+templates = RootPathTemplates(directory="app/templates")
 
 
 def get_template_context(request: Request, user: Optional[User] = None):
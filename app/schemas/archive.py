@@ -4,9 +4,10 @@ from __future__ import annotations
 from datetime import datetime
 from typing import Optional
 
-from pydantic import BaseModel, ConfigDict, Field, model_validator
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
 
 from app.models.archive_config import ArchiveBackendType
+from app.services.archive.cron import CronSchedule, parse_hhmm
 
 
 class ArchiveConfigCore(BaseModel):
@@ -24,14 +25,61 @@ class ArchiveConfigCore(BaseModel):
     pg_schema: Optional[str] = None
     pg_ssl: bool = False
 
+    # Parquet
+    parquet_dir: Optional[str] = None
+
     # Common
     retention_days: int = Field(default=30, ge=1, le=3650)
     schedule_interval_seconds: int = Field(default=3600, ge=300)
     schedule_cron: Optional[str] = None
     copy_then_delete: bool = True
+    request_log_retention_days: Optional[int] = Field(default=None, ge=1, le=3650)
+
+    # Downsampling
+    downsample_bucket_seconds: Optional[int] = Field(default=None, ge=60, le=31 * 86400)
+    aggregate_only_after_days: Optional[int] = Field(default=None, ge=1, le=36500)
+
+    # Off-peak window (UTC) and throttling
+    maintenance_window_start: Optional[str] = None
+    maintenance_window_end: Optional[str] = None
+    max_rows_per_second: Optional[int] = Field(default=None, ge=1)
+    max_lock_ms: Optional[int] = Field(default=None, ge=1, le=60000)
+
+    @field_validator('schedule_cron')
+    @classmethod
+    def validate_cron(cls, v: Optional[str]) -> Optional[str]:
+        if v is None or not v.strip():
+            return None
+        try:
+            # Also rejects expressions that never match, such as 0 0 30 2 *
+            CronSchedule(v).next_after(datetime.utcnow())
+        except ValueError as exc:
+            raise ValueError(f'Некорректное cron-выражение: {exc}')
+        return v.strip()
+
+    @field_validator('maintenance_window_start', 'maintenance_window_end')
+    @classmethod
+    def validate_window_time(cls, v: Optional[str]) -> Optional[str]:
+        if v is None or not v.strip():
+            return None
+        try:
+            return parse_hhmm(v).strftime('%H:%M')
+        except ValueError:
+            raise ValueError('Время окна обслуживания задаётся в формате ЧЧ:ММ')
 
     @model_validator(mode='after')
     def validate_backend_config(self):
+        if bool(self.maintenance_window_start) != bool(self.maintenance_window_end):
+            raise ValueError('Для окна обслуживания нужно указать и начало, и конец')
+        if self.maintenance_window_start and self.maintenance_window_start == self.maintenance_window_end:
+            raise ValueError('Начало и конец окна обслуживания должны различаться')
+        if self.downsample_bucket_seconds and not self.copy_then_delete:
+            raise ValueError('Агрегаты требуют удаления из основной БД, иначе строки будут учтены повторно')
+        if self.aggregate_only_after_days:
+            if not self.downsample_bucket_seconds:
+                raise ValueError('Хранение только агрегатов требует включённого прореживания')
+            if self.aggregate_only_after_days < self.retention_days:
+                raise ValueError('Порог хранения только агрегатов не может быть меньше retention_days')
         if self.backend_type == ArchiveBackendType.SQLITE:
             if not self.sqlite_file_path or not self.sqlite_file_path.strip():
                 raise ValueError('Необходимо указать путь к файлу SQLite')
@@ -42,6 +90,9 @@ class ArchiveConfigCore(BaseModel):
                 raise ValueError('Поле pg_db обязательно для PostgreSQL')
             if not self.pg_user:
                 raise ValueError('Поле pg_user обязательно для PostgreSQL')
+        elif self.backend_type == ArchiveBackendType.PARQUET:
+            if not self.parquet_dir or not self.parquet_dir.strip():
+                raise ValueError('Необходимо указать каталог для Parquet-архива')
         return self
 
 
@@ -51,6 +102,7 @@ class ArchiveConfigResponse(ArchiveConfigCore):
     last_status: Optional[str] = None
     last_error: Optional[str] = None
     last_processed: Optional[int] = None
+    last_request_logs_archived: Optional[int] = None
     pg_password: Optional[str] = None  # Всегда None при чтении из БД
 
     model_config = ConfigDict(from_attributes=True, use_enum_values=True)
@@ -67,6 +119,7 @@ class ArchiveTestRequest(BaseModel):
 class ArchiveRunResponse(BaseModel):
     processed: int
     deleted: int
+    request_logs_archived: int = 0
     duration_seconds: float
     status: str
     error: Optional[str] = None
@@ -79,7 +132,10 @@ class ArchiveStatusResponse(BaseModel):
     last_status: Optional[str]
     last_error: Optional[str]
     last_processed: Optional[int]
+    last_request_logs_archived: Optional[int] = None
     scheduler_running: bool
+    scheduler_leader: Optional[bool] = None
+    next_run_at: Optional[datetime] = None
 
 
 class ArchiveMigrationRequest(BaseModel):
@@ -1,7 +1,7 @@
 """Automation rule schemas"""
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 
 class AutomationRuleBase(BaseModel):
@@ -13,6 +13,7 @@ class AutomationRuleBase(BaseModel):
 class AutomationRuleCreate(AutomationRuleBase):
     # Condition fields
     trigger_field: Optional[str] = None
+    trigger_channel_id: Optional[int] = None
     condition: Optional[str] = None
     threshold_value: Optional[float] = None
     target_field: Optional[str] = None
@@ -29,6 +30,11 @@ class AutomationRuleCreate(AutomationRuleBase):
     
     # Math fields
     expression: Optional[str] = None
+    
+    # Windowed rule fields
+    window_seconds: Optional[int] = None
+    ewma_alpha: Optional[float] = None
+    threshold_low: Optional[float] = None
 
 
 class AutomationRuleUpdate(BaseModel):
@@ -38,6 +44,7 @@ class AutomationRuleUpdate(BaseModel):
     
     # Condition fields
     trigger_field: Optional[str] = None
+    trigger_channel_id: Optional[int] = None
     condition: Optional[str] = None
     threshold_value: Optional[float] = None
     target_field: Optional[str] = None
@@ -54,12 +61,18 @@ class AutomationRuleUpdate(BaseModel):
     
     # Math fields
     expression: Optional[str] = None
+    
+    # Windowed rule fields
+    window_seconds: Optional[int] = None
+    ewma_alpha: Optional[float] = None
+    threshold_low: Optional[float] = None
 
 
 class AutomationRuleResponse(AutomationRuleBase):
     id: int
     channel_id: int
     trigger_field: Optional[str]
+    trigger_channel_id: Optional[int] = None
     condition: Optional[str]
     threshold_value: Optional[float]
     target_field: Optional[str]
@@ -72,10 +85,14 @@ class AutomationRuleResponse(AutomationRuleBase):
     pid_kd: Optional[float]
     pid_integral: float
     pid_last_error: float
+    pid_last_ts: Optional[datetime] = None
     pid_output_min: float
     pid_output_max: float
     
     expression: Optional[str]
+    window_seconds: Optional[int] = None
+    ewma_alpha: Optional[float] = None
+    threshold_low: Optional[float] = None
     is_active: bool
     created_at: datetime
     updated_at: Optional[datetime]
@@ -84,17 +101,28 @@ class AutomationRuleResponse(AutomationRuleBase):
         from_attributes = True
 
 
+class AutomationReplayRequest(BaseModel):
+    dry_run: bool = True
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    rule_ids: Optional[List[int]] = None  # default: all active rules
 
 
-
-
-
-
-
-
-
-
-
-
-
-
+class AutomationSimulationRequest(BaseModel):
+    rule_ids: Optional[List[int]] = None  # saved rules; default: all active rules unless drafts are given
+    rules: Optional[List[AutomationRuleCreate]] = None  # draft rules, not saved
+    
+    # Samples as columns (one value per sample, null: empty field);
+    # without them the channel's stored feeds between start and end are used
+    timestamps: Optional[List[datetime]] = None
+    field1: Optional[List[Optional[float]]] = None
+    field2: Optional[List[Optional[float]]] = None
+    field3: Optional[List[Optional[float]]] = None
+    field4: Optional[List[Optional[float]]] = None
+    field5: Optional[List[Optional[float]]] = None
+    field6: Optional[List[Optional[float]]] = None
+    field7: Optional[List[Optional[float]]] = None
+    field8: Optional[List[Optional[float]]] = None
+    interval_seconds: float = 1.0  # spacing of samples without timestamps
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
@@ -1,12 +1,18 @@
-"""Archive backends for SQLite and PostgreSQL."""
+"""Archive backends for SQLite, PostgreSQL and Parquet files."""
 from __future__ import annotations
 
-from datetime import datetime
-from typing import Iterable
+import heapq
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Iterable, Iterator, Optional
 
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.engine import Engine
 
+from .downsample import AGGREGATE_COLUMNS, AGGREGATE_KEY_COLUMNS, FIELD_NAMES, merge_aggregates
+
 
 ARCHIVE_COLUMNS = [
     "id",
@@ -27,16 +33,42 @@ ARCHIVE_COLUMNS = [
     "status",
 ]
 
+REQUEST_LOG_ARCHIVE_COLUMNS = [
+    "id",
+    "timestamp",
+    "user_id",
+    "channel_id",
+    "endpoint",
+    "method",
+    "ip_address",
+    "user_agent",
+    "response_status",
+    "response_time",
+    "api_key_used",
+]
+
 
 class ArchiveBackend:
     """Base class for archive backend implementations."""
 
+    _schema_ready = False
+
     def test_connection(self) -> None:
         raise NotImplementedError
 
     def init_schema(self) -> None:
         raise NotImplementedError
 
+    def ensure_schema(self) -> None:
+        """Run init_schema() once per backend instance."""
+        if not self._schema_ready:
+            self.init_schema()
+            self._schema_ready = True
+
+    def dispose(self) -> None:
+        """Release pooled connections (no-op by default)."""
+        return None
+
     def archive_batch(self, rows: Iterable[dict]) -> int:
         raise NotImplementedError
 
@@ -56,16 +88,171 @@ class ArchiveBackend:
         """Get total count of archived records."""
         raise NotImplementedError
 
+    def archive_request_logs(self, rows: Iterable[dict]) -> int:
+        """Store raw request log rows (see REQUEST_LOG_ARCHIVE_COLUMNS)."""
+        raise NotImplementedError
+
+    def compact(self) -> None:
+        """Optional maintenance after an archive cycle (no-op by default)."""
+        return None
+
+    def archive_aggregates(self, rows: Iterable[dict]) -> int:
+        """Merge time-bucket aggregates (see downsample.AGGREGATE_COLUMNS).
+
+        Rows for an existing channel/bucket are combined with the stored one,
+        not replaced, so a bucket may arrive in several parts.
+        """
+        raise NotImplementedError
+
+    def read_aggregates(
+        self,
+        channel_id: Optional[int] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        bucket_seconds: Optional[int] = None,
+    ) -> list[dict]:
+        """Read aggregates ordered by channel_id, bucket_start."""
+        raise NotImplementedError
+
+    def read_range(
+        self,
+        channel_id: Optional[int] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        batch_size: int = 1000,
+    ) -> Iterable[list[dict]]:
+        """Read archived records of a channel within a time range.
+
+        Args:
+            channel_id: Only return records of this channel (all channels if None)
+            start: Inclusive lower bound for created_at
+            end: Inclusive upper bound for created_at
+            batch_size: Number of records per batch
+
+        Yields:
+            Lists of dictionaries ordered by created_at
+        """
+        raise NotImplementedError
+
+
+def _range_filter_sql(channel_id: Optional[int], start: Optional[datetime], end: Optional[datetime]) -> tuple[str, dict]:
+    """Build WHERE clause for channel/time-range reads of feeds_archive."""
+    clauses = []
+    params: dict = {}
+    if channel_id is not None:
+        clauses.append("channel_id = :channel_id")
+        params["channel_id"] = channel_id
+    if start is not None:
+        clauses.append("created_at >= :start")
+        params["start"] = start
+    if end is not None:
+        clauses.append("created_at <= :end")
+        params["end"] = end
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+    return where, params
+
+
+def _sqlite_archive_pragmas(dbapi_connection, connection_record):
+    # Archive writes are large batches: WAL keeps readers unblocked and
+    # synchronous=NORMAL is durable enough for data already kept in the main DB
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("PRAGMA journal_mode=WAL;")
+        cursor.execute("PRAGMA synchronous=NORMAL;")
+    finally:
+        cursor.close()
+
+
+def _aggregate_filter_sql(
+    channel_id: Optional[int],
+    start: Optional[datetime],
+    end: Optional[datetime],
+    bucket_seconds: Optional[int],
+) -> tuple[str, dict]:
+    clauses = []
+    params: dict = {}
+    if channel_id is not None:
+        clauses.append("channel_id = :channel_id")
+        params["channel_id"] = channel_id
+    if bucket_seconds is not None:
+        clauses.append("bucket_seconds = :bucket_seconds")
+        params["bucket_seconds"] = bucket_seconds
+    if start is not None:
+        clauses.append("bucket_start >= :start")
+        params["start"] = start
+    if end is not None:
+        clauses.append("bucket_start <= :end")
+        params["end"] = end
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+    return where, params
+
+
+def _aggregate_upsert_sql(table: str, target: str, least: str, greatest: str) -> str:
+    """INSERT ... ON CONFLICT DO UPDATE that merges like merge_aggregates().
+
+    ``least``/``greatest`` are NULL-ignoring two-argument templates with
+    ``{a}``/``{b}`` placeholders; ``target`` is the unqualified table name.
+    """
+    newer = f"({target}.last_at IS NULL OR excluded.last_at >= {target}.last_at)"
+    updates = [
+        f"row_count = {target}.row_count + excluded.row_count",
+        f"last_at = CASE WHEN {newer} THEN excluded.last_at ELSE {target}.last_at END",
+    ]
+    for field in FIELD_NAMES:
+        old, new = f"{target}.{field}", f"excluded.{field}"
+        updates += [
+            f"{field}_min = " + least.format(a=f"{old}_min", b=f"{new}_min"),
+            f"{field}_max = " + greatest.format(a=f"{old}_max", b=f"{new}_max"),
+            f"{field}_sum = {old}_sum + {new}_sum",
+            f"{field}_count = {old}_count + {new}_count",
+            f"{field}_last = CASE WHEN {newer} THEN COALESCE({new}_last, {old}_last) "
+            f"ELSE COALESCE({old}_last, {new}_last) END",
+        ]
+    columns = ",".join(AGGREGATE_COLUMNS)
+    values = ",".join(f":{col}" for col in AGGREGATE_COLUMNS)
+    return (
+        f"INSERT INTO {table} ({columns}) VALUES ({values}) "
+        f"ON CONFLICT ({','.join(AGGREGATE_KEY_COLUMNS)}) DO UPDATE SET {', '.join(updates)}"
+    )
+
+
+def _aggregate_table_sql(table: str, timestamp_type: str, real_type: str) -> str:
+    field_columns = ",\n".join(
+        f"            {field}_min {real_type},\n"
+        f"            {field}_max {real_type},\n"
+        f"            {field}_sum {real_type} NOT NULL DEFAULT 0,\n"
+        f"            {field}_count INTEGER NOT NULL DEFAULT 0,\n"
+        f"            {field}_last {real_type}"
+        for field in FIELD_NAMES
+    )
+    return f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            channel_id INTEGER NOT NULL,
+            bucket_start {timestamp_type} NOT NULL,
+            bucket_seconds INTEGER NOT NULL,
+            row_count INTEGER NOT NULL DEFAULT 0,
+            last_at {timestamp_type},
+{field_columns},
+            PRIMARY KEY (channel_id, bucket_start, bucket_seconds)
+        )
+        """
+
 
 class SQLiteArchiveBackend(ArchiveBackend):
-    def __init__(self, file_path: str):
+    def __init__(self, file_path: str, pool_size: int = 2, max_overflow: int = 3):
         if not file_path:
             raise ValueError("SQLite file path is required")
         self.file_path = file_path
         self.engine: Engine = create_engine(
             f"sqlite:///{file_path}",
-            connect_args={"check_same_thread": False}
+            connect_args={"check_same_thread": False, "timeout": 30},
+            pool_size=pool_size,
+            max_overflow=max_overflow,
         )
+        event.listen(self.engine, "connect", _sqlite_archive_pragmas)
+
+    def dispose(self) -> None:
+        self.engine.dispose()
 
     def test_connection(self) -> None:
         with self.engine.connect() as conn:
@@ -97,9 +284,32 @@ class SQLiteArchiveBackend(ArchiveBackend):
         CREATE INDEX IF NOT EXISTS idx_feeds_archive_channel_created
         ON feeds_archive(channel_id, created_at);
         """
+        logs_sql = """
+        CREATE TABLE IF NOT EXISTS request_logs_archive (
+            id INTEGER PRIMARY KEY,
+            timestamp DATETIME,
+            user_id INTEGER,
+            channel_id INTEGER,
+            endpoint TEXT NOT NULL,
+            method TEXT NOT NULL,
+            ip_address TEXT,
+            user_agent TEXT,
+            response_status INTEGER,
+            response_time REAL,
+            api_key_used TEXT,
+            archived_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+        logs_idx_sql = """
+        CREATE INDEX IF NOT EXISTS idx_request_logs_archive_timestamp
+        ON request_logs_archive(timestamp);
+        """
         with self.engine.begin() as conn:
             conn.execute(text(sql))
             conn.execute(text(idx_sql))
+            conn.execute(text(logs_sql))
+            conn.execute(text(logs_idx_sql))
+            conn.execute(text(_aggregate_table_sql("feeds_aggregate", "DATETIME", "REAL")))
 
     def archive_batch(self, rows: Iterable[dict]) -> int:
         rows = list(rows)
@@ -115,6 +325,49 @@ class SQLiteArchiveBackend(ArchiveBackend):
             conn.execute(text(sql), rows_with_defaults)
         return len(rows)
 
+    def archive_request_logs(self, rows: Iterable[dict]) -> int:
+        rows = list(rows)
+        if not rows:
+            return 0
+        columns = ','.join(REQUEST_LOG_ARCHIVE_COLUMNS)
+        placeholders = ",".join([f":{col}" for col in REQUEST_LOG_ARCHIVE_COLUMNS])
+        sql = f"INSERT OR IGNORE INTO request_logs_archive ({columns}) VALUES ({placeholders})"
+        payload = [{col: row.get(col) for col in REQUEST_LOG_ARCHIVE_COLUMNS} for row in rows]
+        with self.engine.begin() as conn:
+            conn.execute(text(sql), payload)
+        return len(rows)
+
+    def archive_aggregates(self, rows: Iterable[dict]) -> int:
+        rows = list(rows)
+        if not rows:
+            return 0
+        # SQLite's multi-argument min()/max() return NULL if any argument is NULL
+        sql = _aggregate_upsert_sql(
+            "feeds_aggregate",
+            "feeds_aggregate",
+            least="COALESCE(MIN({a}, {b}), {a}, {b})",
+            greatest="COALESCE(MAX({a}, {b}), {a}, {b})",
+        )
+        payload = [{col: row.get(col) for col in AGGREGATE_COLUMNS} for row in rows]
+        with self.engine.begin() as conn:
+            conn.execute(text(sql), payload)
+        return len(rows)
+
+    def read_aggregates(
+        self,
+        channel_id: Optional[int] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        bucket_seconds: Optional[int] = None,
+    ) -> list[dict]:
+        where, params = _aggregate_filter_sql(channel_id, start, end, bucket_seconds)
+        sql = text(
+            f"SELECT {','.join(AGGREGATE_COLUMNS)} FROM feeds_aggregate{where} "
+            f"ORDER BY channel_id, bucket_start"
+        )
+        with self.engine.connect() as conn:
+            return [dict(row._mapping) for row in conn.execute(sql, params)]
+
     def read_all(self, batch_size: int = 1000, offset: int = 0) -> Iterable[list[dict]]:
         """Read all archived records in batches."""
         columns = ','.join(ARCHIVE_COLUMNS)
@@ -146,6 +399,24 @@ class SQLiteArchiveBackend(ArchiveBackend):
             row = result.fetchone()
             return int(row[0]) if row else 0
 
+    def read_range(
+        self,
+        channel_id: Optional[int] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        batch_size: int = 1000,
+    ) -> Iterable[list[dict]]:
+        """Read archived records of a channel within a time range."""
+        where, params = _range_filter_sql(channel_id, start, end)
+        sql = text(f"SELECT {','.join(ARCHIVE_COLUMNS)} FROM feeds_archive{where} ORDER BY created_at, id")
+        with self.engine.connect() as conn:
+            result = conn.execute(sql, params)
+            while True:
+                chunk = result.fetchmany(batch_size)
+                if not chunk:
+                    break
+                yield [{col: row[i] for i, col in enumerate(ARCHIVE_COLUMNS)} for row in chunk]
+
 
 class PostgresArchiveBackend(ArchiveBackend):
     def __init__(
@@ -157,15 +428,24 @@ class PostgresArchiveBackend(ArchiveBackend):
         password: str,
         schema: str | None = None,
         ssl: bool = False,
+        pool_size: int = 2,
+        max_overflow: int = 3,
     ):
         if not all([host, port, database, user]):
             raise ValueError("PostgreSQL configuration is incomplete")
         ssl_part = "?sslmode=require" if ssl else ""
         self.schema = schema or "public"
         self.engine: Engine = create_engine(
-            f"postgresql+psycopg2://{user}:{password}@{host}:{port}/{database}{ssl_part}"
+            f"postgresql+psycopg2://{user}:{password}@{host}:{port}/{database}{ssl_part}",
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_pre_ping=True,
+            pool_recycle=1800,
         )
 
+    def dispose(self) -> None:
+        self.engine.dispose()
+
     def test_connection(self) -> None:
         with self.engine.connect() as conn:
             conn.execute(text("SELECT 1"))
@@ -196,10 +476,35 @@ class PostgresArchiveBackend(ArchiveBackend):
         CREATE INDEX IF NOT EXISTS idx_feeds_archive_channel_created
         ON {self.schema}.feeds_archive(channel_id, created_at);
         """
+        logs_sql = f"""
+        CREATE TABLE IF NOT EXISTS {self.schema}.request_logs_archive (
+            id INTEGER PRIMARY KEY,
+            timestamp TIMESTAMPTZ,
+            user_id INTEGER,
+            channel_id INTEGER,
+            endpoint TEXT NOT NULL,
+            method TEXT NOT NULL,
+            ip_address TEXT,
+            user_agent TEXT,
+            response_status INTEGER,
+            response_time DOUBLE PRECISION,
+            api_key_used TEXT,
+            archived_at TIMESTAMPTZ DEFAULT NOW()
+        );
+        """
+        logs_index_sql = f"""
+        CREATE INDEX IF NOT EXISTS idx_request_logs_archive_timestamp
+        ON {self.schema}.request_logs_archive(timestamp);
+        """
         with self.engine.begin() as conn:
             conn.execute(text(f"SET search_path TO {self.schema}"))
             conn.execute(text(create_sql))
             conn.execute(text(index_sql))
+            conn.execute(text(logs_sql))
+            conn.execute(text(logs_index_sql))
+            conn.execute(text(_aggregate_table_sql(
+                f"{self.schema}.feeds_aggregate", "TIMESTAMPTZ", "DOUBLE PRECISION"
+            )))
 
     def archive_batch(self, rows: Iterable[dict]) -> int:
         rows = list(rows)
@@ -216,6 +521,52 @@ class PostgresArchiveBackend(ArchiveBackend):
             conn.execute(sql, payload)
         return len(rows)
 
+    def archive_request_logs(self, rows: Iterable[dict]) -> int:
+        rows = list(rows)
+        if not rows:
+            return 0
+        columns = ','.join(REQUEST_LOG_ARCHIVE_COLUMNS)
+        values = ','.join([f":{col}" for col in REQUEST_LOG_ARCHIVE_COLUMNS])
+        sql = text(
+            f"INSERT INTO {self.schema}.request_logs_archive ({columns}) "
+            f"VALUES ({values}) ON CONFLICT (id) DO NOTHING"
+        )
+        payload = [{col: row.get(col) for col in REQUEST_LOG_ARCHIVE_COLUMNS} for row in rows]
+        with self.engine.begin() as conn:
+            conn.execute(sql, payload)
+        return len(rows)
+
+    def archive_aggregates(self, rows: Iterable[dict]) -> int:
+        rows = list(rows)
+        if not rows:
+            return 0
+        # LEAST/GREATEST ignore NULL arguments
+        sql = text(_aggregate_upsert_sql(
+            f"{self.schema}.feeds_aggregate",
+            "feeds_aggregate",
+            least="LEAST({a}, {b})",
+            greatest="GREATEST({a}, {b})",
+        ))
+        payload = [{col: row.get(col) for col in AGGREGATE_COLUMNS} for row in rows]
+        with self.engine.begin() as conn:
+            conn.execute(sql, payload)
+        return len(rows)
+
+    def read_aggregates(
+        self,
+        channel_id: Optional[int] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        bucket_seconds: Optional[int] = None,
+    ) -> list[dict]:
+        where, params = _aggregate_filter_sql(channel_id, start, end, bucket_seconds)
+        sql = text(
+            f"SELECT {','.join(AGGREGATE_COLUMNS)} FROM {self.schema}.feeds_aggregate{where} "
+            f"ORDER BY channel_id, bucket_start"
+        )
+        with self.engine.connect() as conn:
+            return [dict(row._mapping) for row in conn.execute(sql, params)]
+
     def read_all(self, batch_size: int = 1000, offset: int = 0) -> Iterable[list[dict]]:
         """Read all archived records in batches."""
         columns = ','.join(ARCHIVE_COLUMNS)
@@ -252,3 +603,510 @@ class PostgresArchiveBackend(ArchiveBackend):
             row = result.fetchone()
             return int(row[0]) if row else 0
 
+    def read_range(
+        self,
+        channel_id: Optional[int] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        batch_size: int = 1000,
+    ) -> Iterable[list[dict]]:
+        """Read archived records of a channel within a time range."""
+        where, params = _range_filter_sql(channel_id, start, end)
+        sql = text(
+            f"SELECT {','.join(ARCHIVE_COLUMNS)} FROM {self.schema}.feeds_archive{where} "
+            f"ORDER BY created_at, id"
+        )
+        with self.engine.connect() as conn:
+            result = conn.execute(sql, params)
+            while True:
+                chunk = result.fetchmany(batch_size)
+                if not chunk:
+                    break
+                yield [{col: row[i] for i, col in enumerate(ARCHIVE_COLUMNS)} for row in chunk]
+
+
+
+PARQUET_MANIFEST = "manifest.json"
+# Partitions with several files smaller than this are merged by compact()
+PARQUET_COMPACT_ROWS = 100_000
+
+_parquet_locks: dict[str, threading.Lock] = {}
+_parquet_locks_guard = threading.Lock()
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as exc:
+        raise RuntimeError("Parquet archive requires the 'pyarrow' package (pip install pyarrow)") from exc
+    return pyarrow, pyarrow.parquet
+
+
+def _to_utc_naive(value) -> Optional[datetime]:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _parquet_lock(root_dir: str) -> threading.Lock:
+    key = os.path.abspath(root_dir)
+    with _parquet_locks_guard:
+        lock = _parquet_locks.get(key)
+        if lock is None:
+            lock = _parquet_locks[key] = threading.Lock()
+        return lock
+
+
+class ParquetArchiveBackend(ArchiveBackend):
+    """Immutable, compressed Parquet files partitioned by channel and month.
+
+    Layout::
+
+        <root>/manifest.json
+        <root>/channel_id=<id>/month=<YYYY-MM>/part-<min_id>-<max_id>.parquet
+        <root>/aggregates/bucket=<seconds>/channel_id=<id>/month=<YYYY-MM>/part-*.parquet
+
+    The manifest stores row counts and id/created_at bounds of every file, so
+    channel and time-range reads only open the files that can match. Aggregate
+    parts of the same bucket are merged on read and by compact().
+    """
+
+    def __init__(self, root_dir: str, compression: str = "zstd"):
+        if not root_dir:
+            raise ValueError("Parquet archive directory is required")
+        self.root_dir = root_dir
+        self.compression = compression
+        self._pa, self._pq = _require_pyarrow()
+        pa = self._pa
+        self._schema = pa.schema(
+            [
+                ("id", pa.int64()),
+                ("channel_id", pa.int64()),
+                ("entry_id", pa.int64()),
+                ("created_at", pa.timestamp("us")),
+            ]
+            + [(f"field{i}", pa.float64()) for i in range(1, 9)]
+            + [
+                ("latitude", pa.float64()),
+                ("longitude", pa.float64()),
+                ("elevation", pa.float64()),
+                ("status", pa.string()),
+            ]
+        )
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.root_dir, PARQUET_MANIFEST)
+
+    def _load_manifest(self) -> dict:
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"version": 1, "files": []}
+
+    def _save_manifest(self, manifest: dict) -> None:
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(tmp_path, self.manifest_path)
+
+    def test_connection(self) -> None:
+        os.makedirs(self.root_dir, exist_ok=True)
+        probe = os.path.join(self.root_dir, ".write_test")
+        with open(probe, "w", encoding="utf-8") as f:
+            f.write("ok")
+        os.remove(probe)
+
+    def init_schema(self) -> None:
+        os.makedirs(self.root_dir, exist_ok=True)
+        with _parquet_lock(self.root_dir):
+            if not os.path.exists(self.manifest_path):
+                self._save_manifest({"version": 1, "files": []})
+
+    def archive_batch(self, rows: Iterable[dict]) -> int:
+        rows = list(rows)
+        if not rows:
+            return 0
+
+        partitions: dict[tuple[int, str], list[dict]] = {}
+        for row in rows:
+            data = {col: row.get(col) for col in ARCHIVE_COLUMNS}
+            data["created_at"] = _to_utc_naive(data["created_at"])
+            month = data["created_at"].strftime("%Y-%m") if data["created_at"] else "unknown"
+            partitions.setdefault((int(data["channel_id"]), month), []).append(data)
+
+        with _parquet_lock(self.root_dir):
+            manifest = self._load_manifest()
+            for (channel_id, month), part_rows in partitions.items():
+                # Files are immutable, so re-archived rows are skipped instead of overwritten
+                existing = self._existing_ids(manifest, channel_id, month, part_rows)
+                if existing:
+                    part_rows = [r for r in part_rows if r["id"] not in existing]
+                if not part_rows:
+                    continue
+                manifest["files"].append(self._write_part(channel_id, month, part_rows))
+            self._save_manifest(manifest)
+        # Like INSERT OR IGNORE: already archived rows count as safely stored
+        return len(rows)
+
+    def archive_request_logs(self, rows: Iterable[dict]) -> int:
+        """Append request logs as request_logs/month=<YYYY-MM>/part-*.parquet.
+
+        Logs are archived in ascending id order, so rows at or below the last
+        archived id are already stored and skipped.
+        """
+        rows = list(rows)
+        if not rows:
+            return 0
+        pa = self._pa
+        schema = pa.schema(
+            [
+                ("id", pa.int64()),
+                ("timestamp", pa.timestamp("us")),
+                ("user_id", pa.int64()),
+                ("channel_id", pa.int64()),
+                ("endpoint", pa.string()),
+                ("method", pa.string()),
+                ("ip_address", pa.string()),
+                ("user_agent", pa.string()),
+                ("response_status", pa.int64()),
+                ("response_time", pa.float64()),
+                ("api_key_used", pa.string()),
+            ]
+        )
+        with _parquet_lock(self.root_dir):
+            manifest = self._load_manifest()
+            entries = manifest.setdefault("request_logs", [])
+            last_id = max((e["max_id"] for e in entries), default=0)
+            months: dict[str, list[dict]] = {}
+            for row in rows:
+                if row["id"] <= last_id:
+                    continue
+                data = {col: row.get(col) for col in REQUEST_LOG_ARCHIVE_COLUMNS}
+                data["timestamp"] = _to_utc_naive(data["timestamp"])
+                month = data["timestamp"].strftime("%Y-%m") if data["timestamp"] else "unknown"
+                months.setdefault(month, []).append(data)
+
+            for month, month_rows in months.items():
+                ids = [r["id"] for r in month_rows]
+                rel_path = os.path.join("request_logs", f"month={month}", f"part-{min(ids)}-{max(ids)}.parquet")
+                full_path = os.path.join(self.root_dir, rel_path)
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                table = pa.Table.from_pylist(month_rows, schema=schema)
+                self._pq.write_table(table, full_path + ".tmp", compression=self.compression)
+                os.replace(full_path + ".tmp", full_path)
+                entries.append({
+                    "path": rel_path,
+                    "month": month,
+                    "rows": len(month_rows),
+                    "min_id": min(ids),
+                    "max_id": max(ids),
+                })
+            self._save_manifest(manifest)
+        return len(rows)
+
+    def _aggregate_schema(self):
+        pa = self._pa
+        columns = [
+            ("channel_id", pa.int64()),
+            ("bucket_start", pa.timestamp("us")),
+            ("bucket_seconds", pa.int64()),
+            ("row_count", pa.int64()),
+            ("last_at", pa.timestamp("us")),
+        ]
+        for field in FIELD_NAMES:
+            columns += [
+                (f"{field}_min", pa.float64()),
+                (f"{field}_max", pa.float64()),
+                (f"{field}_sum", pa.float64()),
+                (f"{field}_count", pa.int64()),
+                (f"{field}_last", pa.float64()),
+            ]
+        return pa.schema(columns)
+
+    def _write_aggregate_part(self, key: tuple[int, int, str], rows: list[dict]) -> dict:
+        bucket_seconds, channel_id, month = key
+        rows.sort(key=lambda r: r["bucket_start"])
+        part_dir = os.path.join("aggregates", f"bucket={bucket_seconds}", f"channel_id={channel_id}", f"month={month}")
+        os.makedirs(os.path.join(self.root_dir, part_dir), exist_ok=True)
+        first, last = rows[0]["bucket_start"], rows[-1]["bucket_start"]
+        name = f"part-{first:%Y%m%d%H%M%S}-{last:%Y%m%d%H%M%S}"
+        rel_path = os.path.join(part_dir, f"{name}.parquet")
+        suffix = 1
+        while os.path.exists(os.path.join(self.root_dir, rel_path)):
+            rel_path = os.path.join(part_dir, f"{name}.{suffix}.parquet")
+            suffix += 1
+        full_path = os.path.join(self.root_dir, rel_path)
+        table = self._pa.Table.from_pylist(rows, schema=self._aggregate_schema())
+        self._pq.write_table(table, full_path + ".tmp", compression=self.compression)
+        os.replace(full_path + ".tmp", full_path)
+        return {
+            "path": rel_path,
+            "channel_id": channel_id,
+            "month": month,
+            "bucket_seconds": bucket_seconds,
+            "rows": len(rows),
+            "min_bucket": first.isoformat(),
+            "max_bucket": last.isoformat(),
+        }
+
+    def archive_aggregates(self, rows: Iterable[dict]) -> int:
+        rows = list(rows)
+        if not rows:
+            return 0
+        partitions: dict[tuple[int, int, str], list[dict]] = {}
+        for row in rows:
+            data = {col: row.get(col) for col in AGGREGATE_COLUMNS}
+            data["bucket_start"] = _to_utc_naive(data["bucket_start"])
+            data["last_at"] = _to_utc_naive(data["last_at"])
+            key = (int(data["bucket_seconds"]), int(data["channel_id"]), data["bucket_start"].strftime("%Y-%m"))
+            partitions.setdefault(key, []).append(data)
+        with _parquet_lock(self.root_dir):
+            manifest = self._load_manifest()
+            entries = manifest.setdefault("aggregates", [])
+            for key, part_rows in partitions.items():
+                entries.append(self._write_aggregate_part(key, part_rows))
+            self._save_manifest(manifest)
+        return len(rows)
+
+    def _merged_aggregates(self, entries: list[dict], filters=None) -> list[dict]:
+        merged: dict[tuple, dict] = {}
+        for entry in entries:
+            table = self._pq.read_table(
+                os.path.join(self.root_dir, entry["path"]),
+                filters=filters or None,
+                schema=self._aggregate_schema(),
+            )
+            for row in table.to_pylist():
+                key = tuple(row[col] for col in AGGREGATE_KEY_COLUMNS)
+                merged[key] = merge_aggregates(merged[key], row) if key in merged else row
+        return sorted(merged.values(), key=lambda r: (r["channel_id"], r["bucket_start"], r["bucket_seconds"]))
+
+    def read_aggregates(
+        self,
+        channel_id: Optional[int] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        bucket_seconds: Optional[int] = None,
+    ) -> list[dict]:
+        start = _to_utc_naive(start)
+        end = _to_utc_naive(end)
+        filters = []
+        if start is not None:
+            filters.append(("bucket_start", ">=", start))
+        if end is not None:
+            filters.append(("bucket_start", "<=", end))
+        entries = [
+            entry for entry in self._load_manifest().get("aggregates", [])
+            if (channel_id is None or entry["channel_id"] == channel_id)
+            and (bucket_seconds is None or entry["bucket_seconds"] == bucket_seconds)
+            and (start is None or entry["max_bucket"] >= start.isoformat())
+            and (end is None or entry["min_bucket"] <= end.isoformat())
+        ]
+        return self._merged_aggregates(entries, filters)
+
+    def _compact_aggregates(self, manifest: dict) -> list[str]:
+        groups: dict[tuple[int, int, str], list[dict]] = {}
+        for entry in manifest.get("aggregates", []):
+            groups.setdefault((entry["bucket_seconds"], entry["channel_id"], entry["month"]), []).append(entry)
+        kept: list[dict] = []
+        obsolete: list[str] = []
+        for key, entries in groups.items():
+            if len(entries) < 2:
+                kept.extend(entries)
+                continue
+            kept.append(self._write_aggregate_part(key, self._merged_aggregates(entries)))
+            obsolete.extend(entry["path"] for entry in entries)
+        if obsolete:
+            manifest["aggregates"] = kept
+        return obsolete
+
+    def _existing_ids(self, manifest: dict, channel_id: int, month: str, rows: list[dict]) -> set:
+        ids = {r["id"] for r in rows}
+        lo, hi = min(ids), max(ids)
+        found: set = set()
+        for entry in manifest["files"]:
+            if entry["channel_id"] != channel_id or entry["month"] != month:
+                continue
+            if entry["max_id"] < lo or entry["min_id"] > hi:
+                continue
+            table = self._pq.read_table(os.path.join(self.root_dir, entry["path"]), columns=["id"])
+            found.update(ids.intersection(table.column("id").to_pylist()))
+        return found
+
+    def _write_part(self, channel_id: int, month: str, rows: list[dict]) -> dict:
+        rows.sort(key=lambda r: (r["created_at"] or datetime.min, r["id"]))
+        ids = [r["id"] for r in rows]
+        stamps = [r["created_at"] for r in rows if r["created_at"] is not None]
+        part_dir = os.path.join(f"channel_id={channel_id}", f"month={month}")
+        os.makedirs(os.path.join(self.root_dir, part_dir), exist_ok=True)
+
+        name = f"part-{min(ids)}-{max(ids)}"
+        rel_path = os.path.join(part_dir, f"{name}.parquet")
+        suffix = 1
+        while os.path.exists(os.path.join(self.root_dir, rel_path)):
+            rel_path = os.path.join(part_dir, f"{name}.{suffix}.parquet")
+            suffix += 1
+
+        table = self._pa.Table.from_pylist(rows, schema=self._schema)
+        full_path = os.path.join(self.root_dir, rel_path)
+        self._pq.write_table(table, full_path + ".tmp", compression=self.compression)
+        os.replace(full_path + ".tmp", full_path)
+        return {
+            "path": rel_path,
+            "channel_id": channel_id,
+            "month": month,
+            "rows": len(rows),
+            "min_id": min(ids),
+            "max_id": max(ids),
+            "min_created_at": min(stamps).isoformat() if stamps else None,
+            "max_created_at": max(stamps).isoformat() if stamps else None,
+        }
+
+    def compact(self) -> None:
+        """Merge small files of each channel/month partition into one file.
+
+        Aggregate parts of a partition are always merged into one file.
+        """
+        with _parquet_lock(self.root_dir):
+            manifest = self._load_manifest()
+            groups: dict[tuple[int, str], list[dict]] = {}
+            for entry in manifest["files"]:
+                groups.setdefault((entry["channel_id"], entry["month"]), []).append(entry)
+
+            kept: list[dict] = []
+            obsolete: list[str] = []
+            for (channel_id, month), entries in groups.items():
+                small = [e for e in entries if e["rows"] < PARQUET_COMPACT_ROWS]
+                if len(small) < 2:
+                    kept.extend(entries)
+                    continue
+                kept.extend(e for e in entries if e["rows"] >= PARQUET_COMPACT_ROWS)
+                rows: list[dict] = []
+                for entry in small:
+                    rows.extend(self._pq.read_table(os.path.join(self.root_dir, entry["path"])).to_pylist())
+                    obsolete.append(entry["path"])
+                kept.append(self._write_part(channel_id, month, rows))
+
+            if obsolete:
+                manifest["files"] = kept
+            obsolete.extend(self._compact_aggregates(manifest))
+            if not obsolete:
+                return
+            self._save_manifest(manifest)
+            for rel_path in obsolete:
+                try:
+                    os.remove(os.path.join(self.root_dir, rel_path))
+                except OSError:
+                    pass
+
+    def _select_files(
+        self,
+        channel_id: Optional[int] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> list[dict]:
+        """Pick manifest entries whose channel and time bounds can match."""
+        start_iso = start.isoformat() if start else None
+        end_iso = end.isoformat() if end else None
+        selected = []
+        for entry in self._load_manifest()["files"]:
+            if channel_id is not None and entry["channel_id"] != channel_id:
+                continue
+            if start_iso and entry["max_created_at"] and entry["max_created_at"] < start_iso:
+                continue
+            if end_iso and entry["min_created_at"] and entry["min_created_at"] > end_iso:
+                continue
+            selected.append(entry)
+        return selected
+
+    def read_all(self, batch_size: int = 1000, offset: int = 0) -> Iterable[list[dict]]:
+        """Read all archived records in batches, in ascending id order.
+
+        Partitions are merged by id like ORDER BY id in the SQL backends, so an
+        offset means the same rows before and after compact(). A file is only
+        opened once its min_id can be the next row.
+        """
+        entries = sorted(self._select_files(), key=lambda e: (e["min_id"], e["max_id"]))
+        skip = offset
+        heap: list[tuple[int, int, dict, Iterator[dict]]] = []
+        next_entry = 0
+        batch: list[dict] = []
+        while heap or next_entry < len(entries):
+            while next_entry < len(entries) and (not heap or entries[next_entry]["min_id"] <= heap[0][0]):
+                entry = entries[next_entry]
+                next_entry += 1
+                following = entries[next_entry]["min_id"] if next_entry < len(entries) else None
+                # A file that overlaps nothing else can be skipped without reading it
+                if not heap and skip >= entry["rows"] and (following is None or entry["max_id"] < following):
+                    skip -= entry["rows"]
+                    continue
+                table = self._pq.read_table(os.path.join(self.root_dir, entry["path"]))
+                rows = iter(table.sort_by([("id", "ascending")]).to_pylist())
+                first = next(rows, None)
+                if first is not None:
+                    heapq.heappush(heap, (first["id"], next_entry, first, rows))
+            if not heap:
+                continue
+            _, seq, row, rows = heapq.heappop(heap)
+            following_row = next(rows, None)
+            if following_row is not None:
+                heapq.heappush(heap, (following_row["id"], seq, following_row, rows))
+            if skip:
+                skip -= 1
+                continue
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def read_range(
+        self,
+        channel_id: Optional[int] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        batch_size: int = 1000,
+    ) -> Iterable[list[dict]]:
+        """Read archived records of a channel within a time range.
+
+        Only files whose manifest bounds overlap the range are opened, and the
+        time filter is pushed down to the Parquet reader.
+        """
+        start = _to_utc_naive(start)
+        end = _to_utc_naive(end)
+        filters = []
+        if start is not None:
+            filters.append(("created_at", ">=", start))
+        if end is not None:
+            filters.append(("created_at", "<=", end))
+
+        # Months do not overlap in time, so sorting each month (across channels
+        # when channel_id is None) yields the whole range ordered by created_at
+        groups: dict[str, list[dict]] = {}
+        for entry in self._select_files(channel_id, start, end):
+            groups.setdefault(entry["month"], []).append(entry)
+
+        for key in sorted(groups):
+            tables = [
+                self._pq.read_table(
+                    os.path.join(self.root_dir, entry["path"]),
+                    filters=filters or None,
+                    schema=self._schema,
+                )
+                for entry in groups[key]
+            ]
+            table = self._pa.concat_tables(tables).sort_by([("created_at", "ascending"), ("id", "ascending")])
+            for chunk_start in range(0, table.num_rows, batch_size):
+                yield table.slice(chunk_start, batch_size).to_pylist()
+
+    def count_records(self) -> int:
+        """Get total count of archived records."""
+        return sum(entry["rows"] for entry in self._load_manifest()["files"])
@@ -0,0 +1,162 @@
+"""Cron expressions and maintenance windows for the archive scheduler.
+
+All times are UTC, like the rest of the archive service.
+"""
+from __future__ import annotations
+
+from datetime import datetime, time as dtime, timedelta
+from typing import Optional
+
+
+_ALIASES = {
+    "@hourly": "0 * * * *",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@weekly": "0 0 * * 0",
+    "@monthly": "0 0 1 * *",
+}
+
+_MONTH_NAMES = {name: i for i, name in enumerate(
+    ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"], start=1
+)}
+_WEEKDAY_NAMES = {name: i for i, name in enumerate(["sun", "mon", "tue", "wed", "thu", "fri", "sat"])}
+
+# (name, min, max, names)
+_FIELDS = [
+    ("minute", 0, 59, None),
+    ("hour", 0, 23, None),
+    ("day", 1, 31, None),
+    ("month", 1, 12, _MONTH_NAMES),
+    ("weekday", 0, 7, _WEEKDAY_NAMES),
+]
+
+
+def _parse_value(token: str, names: Optional[dict], field: str) -> int:
+    token = token.strip().lower()
+    if names and token in names:
+        return names[token]
+    try:
+        return int(token)
+    except ValueError:
+        raise ValueError(f"Invalid value '{token}' in cron field '{field}'")
+
+
+def _parse_field(part: str, low: int, high: int, names: Optional[dict], field: str) -> set[int]:
+    values: set[int] = set()
+    for item in part.split(","):
+        step = 1
+        if "/" in item:
+            item, step_text = item.split("/", 1)
+            step = _parse_value(step_text, None, field)
+            if step <= 0:
+                raise ValueError(f"Step must be positive in cron field '{field}'")
+        if item == "*":
+            start, end = low, high
+        elif "-" in item:
+            start_text, end_text = item.split("-", 1)
+            start, end = _parse_value(start_text, names, field), _parse_value(end_text, names, field)
+        else:
+            start = _parse_value(item, names, field)
+            end = high if step > 1 else start
+        if start < low or end > high or start > end:
+            raise ValueError(f"Value out of range {low}-{high} in cron field '{field}'")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSchedule:
+    """Standard 5-field cron expression: minute hour day month weekday.
+
+    Supports ``*``, lists, ranges, steps, month/weekday names and the
+    @hourly/@daily/@weekly/@monthly aliases. As in cron, when both day and
+    weekday are restricted a time matches if either of them matches.
+    """
+
+    def __init__(self, expression: str):
+        expression = (expression or "").strip()
+        source = _ALIASES.get(expression.lower(), expression)
+        parts = source.split()
+        if len(parts) != 5:
+            raise ValueError("Cron expression must have 5 fields: minute hour day month weekday")
+        self.expression = expression
+        fields = [
+            _parse_field(part, low, high, names, name)
+            for part, (name, low, high, names) in zip(parts, _FIELDS)
+        ]
+        self.minutes, self.hours, self.days, self.months, weekdays = fields
+        self.weekdays = {0 if d == 7 else d for d in weekdays}
+        self._any_day = parts[2] == "*"
+        self._any_weekday = parts[4] == "*"
+
+    def _matches_day(self, value: datetime) -> bool:
+        day_ok = value.day in self.days
+        weekday_ok = (value.isoweekday() % 7) in self.weekdays
+        if self._any_day and self._any_weekday:
+            return True
+        if self._any_day:
+            return weekday_ok
+        if self._any_weekday:
+            return day_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, value: datetime) -> datetime:
+        """First matching minute strictly after ``value``."""
+        current = value.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = current + timedelta(days=366 * 5)
+        while current < limit:
+            if current.month not in self.months:
+                year = current.year + (1 if current.month == 12 else 0)
+                month = 1 if current.month == 12 else current.month + 1
+                current = current.replace(year=year, month=month, day=1, hour=0, minute=0)
+                continue
+            if not self._matches_day(current):
+                current = (current + timedelta(days=1)).replace(hour=0, minute=0)
+                continue
+            if current.hour not in self.hours:
+                current = (current + timedelta(hours=1)).replace(minute=0)
+                continue
+            if current.minute not in self.minutes:
+                current += timedelta(minutes=1)
+                continue
+            return current
+        raise ValueError(f"Cron expression '{self.expression}' never matches")
+
+
+def parse_hhmm(value: str) -> dtime:
+    try:
+        hours, minutes = value.strip().split(":")
+        return dtime(int(hours), int(minutes))
+    except (ValueError, AttributeError):
+        raise ValueError(f"Time must be in HH:MM format, got '{value}'")
+
+
+class MaintenanceWindow:
+    """Daily time window (may wrap past midnight, e.g. 22:00-06:00)."""
+
+    def __init__(self, start: str, end: str):
+        self.start = parse_hhmm(start)
+        self.end = parse_hhmm(end)
+        if self.start == self.end:
+            raise ValueError("Maintenance window start and end must differ")
+
+    def contains(self, value: datetime) -> bool:
+        current = value.time()
+        if self.start < self.end:
+            return self.start <= current < self.end
+        return current >= self.start or current < self.end
+
+    def next_start(self, value: datetime) -> datetime:
+        """Next moment the window opens (``value`` itself if already inside)."""
+        if self.contains(value):
+            return value
+        candidate = datetime.combine(value.date(), self.start)
+        if candidate <= value:
+            candidate += timedelta(days=1)
+        return candidate
+
+    def end_after(self, value: datetime) -> datetime:
+        """When the window containing ``value`` closes."""
+        candidate = datetime.combine(value.date(), self.end)
+        if candidate <= value:
+            candidate += timedelta(days=1)
+        return candidate
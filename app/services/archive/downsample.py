@@ -0,0 +1,108 @@
+"""Time-bucket aggregates of archived feeds (downsampling).
+
+Each aggregate row covers one channel and one bucket of ``bucket_seconds``
+and keeps min, max, sum, count and the last value of every data field; the
+mean is ``sum / count``. Partial aggregates of the same bucket (a bucket split
+across archive batches) are combined with :func:`merge_aggregates`.
+"""
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Optional
+
+FIELD_NAMES = [f"field{i}" for i in range(1, 9)]
+FIELD_STATS = ["min", "max", "sum", "count", "last"]
+
+AGGREGATE_KEY_COLUMNS = ["channel_id", "bucket_start", "bucket_seconds"]
+AGGREGATE_COLUMNS = (
+    AGGREGATE_KEY_COLUMNS
+    + ["row_count", "last_at"]
+    + [f"{field}_{stat}" for field in FIELD_NAMES for stat in FIELD_STATS]
+)
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _naive_utc(value: datetime) -> datetime:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def bucket_start(value: datetime, bucket_seconds: int) -> datetime:
+    """Start of the UTC bucket containing ``value``."""
+    seconds = int((_naive_utc(value) - _EPOCH).total_seconds())
+    return _EPOCH + timedelta(seconds=seconds - seconds % bucket_seconds)
+
+
+def _empty(channel_id: int, start: datetime, bucket_seconds: int) -> dict:
+    row = {col: None for col in AGGREGATE_COLUMNS}
+    row.update(channel_id=channel_id, bucket_start=start, bucket_seconds=bucket_seconds, row_count=0)
+    for field in FIELD_NAMES:
+        row[f"{field}_sum"] = 0.0
+        row[f"{field}_count"] = 0
+    return row
+
+
+def aggregate_rows(rows: Iterable[dict], bucket_seconds: int) -> list[dict]:
+    """Aggregate feed rows (ARCHIVE_COLUMNS dicts) per channel and bucket."""
+    buckets: dict[tuple[int, datetime], dict] = {}
+    for row in rows:
+        created_at = row.get("created_at")
+        if created_at is None:
+            continue
+        created_at = _naive_utc(created_at)
+        start = bucket_start(created_at, bucket_seconds)
+        key = (int(row["channel_id"]), start)
+        agg = buckets.get(key)
+        if agg is None:
+            agg = buckets[key] = _empty(key[0], start, bucket_seconds)
+        agg["row_count"] += 1
+        is_last = agg["last_at"] is None or created_at >= agg["last_at"]
+        if is_last:
+            agg["last_at"] = created_at
+        for field in FIELD_NAMES:
+            value = row.get(field)
+            if value is None:
+                continue
+            if agg[f"{field}_min"] is None or value < agg[f"{field}_min"]:
+                agg[f"{field}_min"] = value
+            if agg[f"{field}_max"] is None or value > agg[f"{field}_max"]:
+                agg[f"{field}_max"] = value
+            agg[f"{field}_sum"] += value
+            agg[f"{field}_count"] += 1
+            if is_last or agg[f"{field}_last"] is None:
+                agg[f"{field}_last"] = value
+    return list(buckets.values())
+
+
+def _pick(a: Optional[float], b: Optional[float], fn) -> Optional[float]:
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return fn(a, b)
+
+
+def merge_aggregates(old: dict, new: dict) -> dict:
+    """Combine two partial aggregates of the same channel/bucket."""
+    merged = dict(old)
+    merged["row_count"] = (old["row_count"] or 0) + (new["row_count"] or 0)
+    new_is_later = old["last_at"] is None or (new["last_at"] is not None and new["last_at"] >= old["last_at"])
+    merged["last_at"] = new["last_at"] if new_is_later else old["last_at"]
+    for field in FIELD_NAMES:
+        merged[f"{field}_min"] = _pick(old[f"{field}_min"], new[f"{field}_min"], min)
+        merged[f"{field}_max"] = _pick(old[f"{field}_max"], new[f"{field}_max"], max)
+        merged[f"{field}_sum"] = (old[f"{field}_sum"] or 0.0) + (new[f"{field}_sum"] or 0.0)
+        merged[f"{field}_count"] = (old[f"{field}_count"] or 0) + (new[f"{field}_count"] or 0)
+        first, second = (old, new) if new_is_later else (new, old)
+        merged[f"{field}_last"] = _pick(first[f"{field}_last"], second[f"{field}_last"], lambda _, b: b)
+    return merged
+
+
+def with_means(row: dict) -> dict:
+    """Add ``fieldN_mean`` keys for chart consumers."""
+    for field in FIELD_NAMES:
+        count = row.get(f"{field}_count") or 0
+        row[f"{field}_mean"] = row[f"{field}_sum"] / count if count else None
+    return row
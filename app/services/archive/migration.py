@@ -65,7 +65,7 @@ def migrate_archive_data(
         target_backend = get_backend(target_config)
 
         # Initialize target schema
-        target_backend.init_schema()
+        target_backend.ensure_schema()
 
         # Get total count from source (for progress tracking)
         try:
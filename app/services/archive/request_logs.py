@@ -0,0 +1,209 @@
+"""Request log retention: hourly roll-ups plus raw rows moved to the archive."""
+from __future__ import annotations
+
+import math
+import re
+import time
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models.archive_config import ArchiveSettings
+from app.models.request_log import RequestLog, RequestLogHourly
+from .backends import ArchiveBackend, REQUEST_LOG_ARCHIVE_COLUMNS
+
+
+REQUEST_LOG_BATCH_SIZE = 5000
+
+_ID_SEGMENT = re.compile(r"/\d+(?=/|\.|$)")
+
+
+def normalize_endpoint(path: str) -> str:
+    """Collapse numeric path segments: /channels/5/feeds.json -> /channels/{id}/feeds.json"""
+    return _ID_SEGMENT.sub("/{id}", path or "")
+
+
+def percentile(sorted_values: list[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = math.ceil(q / 100.0 * len(sorted_values))
+    return sorted_values[max(0, min(len(sorted_values), rank) - 1)]
+
+
+def weighted_percentile(sorted_samples: list[tuple[float, float]], q: float) -> Optional[float]:
+    """Nearest-rank percentile of (value, weight) pairs sorted by value."""
+    if not sorted_samples:
+        return None
+    rank = q / 100.0 * sum(weight for _, weight in sorted_samples)
+    cumulative = 0.0
+    for value, weight in sorted_samples:
+        cumulative += weight
+        if cumulative >= rank:
+            return value
+    return sorted_samples[-1][0]
+
+
+def _floor_hour(value: datetime) -> datetime:
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+class _HourBucket:
+    """Accumulates one (hour, endpoint, method) group.
+
+    Rows are sampled (1% of /update calls by default), so each counts as
+    ``sample_weight`` requests.
+    """
+
+    __slots__ = ("weight", "status", "latency_sum", "samples")
+
+    def __init__(self) -> None:
+        self.weight = 0.0
+        self.status = {2: 0.0, 3: 0.0, 4: 0.0, 5: 0.0}
+        self.latency_sum = 0.0
+        self.samples: list[tuple[float, float]] = []
+
+    def add(self, status: int, latency: float, weight: Optional[float] = None) -> None:
+        weight = weight or 1.0
+        latency = latency or 0.0
+        self.weight += weight
+        status_class = status // 100
+        if status_class in self.status:
+            self.status[status_class] += weight
+        self.latency_sum += latency * weight
+        self.samples.append((latency, weight))
+
+    @property
+    def count(self) -> int:
+        return round(self.weight)
+
+    def status_count(self, status_class: int) -> int:
+        return round(self.status[status_class])
+
+
+def _store_rollup(db: Session, hour: datetime, buckets: dict[tuple[str, str], _HourBucket]) -> None:
+    for (endpoint, method), bucket in buckets.items():
+        samples = sorted(bucket.samples)
+        latency_max = samples[-1][0] if samples else None
+        row = db.query(RequestLogHourly).filter(
+            RequestLogHourly.hour == hour,
+            RequestLogHourly.endpoint == endpoint,
+            RequestLogHourly.method == method,
+        ).first()
+        if row is None:
+            db.add(RequestLogHourly(
+                hour=hour,
+                endpoint=endpoint,
+                method=method,
+                request_count=bucket.count,
+                status_2xx=bucket.status_count(2),
+                status_3xx=bucket.status_count(3),
+                status_4xx=bucket.status_count(4),
+                status_5xx=bucket.status_count(5),
+                latency_sum=bucket.latency_sum,
+                latency_max=latency_max,
+                latency_p50=weighted_percentile(samples, 50),
+                latency_p95=weighted_percentile(samples, 95),
+                latency_p99=weighted_percentile(samples, 99),
+            ))
+            continue
+
+        # Hour was partially rolled up before: counts add up, percentiles
+        # are merged as a count-weighted average (an approximation).
+        total = row.request_count + bucket.count
+
+        def merge(old: Optional[float], new: Optional[float]) -> Optional[float]:
+            if old is None or new is None:
+                return new if old is None else old
+            return (old * row.request_count + new * bucket.count) / total
+
+        row.latency_p50 = merge(row.latency_p50, weighted_percentile(samples, 50))
+        row.latency_p95 = merge(row.latency_p95, weighted_percentile(samples, 95))
+        row.latency_p99 = merge(row.latency_p99, weighted_percentile(samples, 99))
+        row.latency_max = max(row.latency_max or 0.0, latency_max or 0.0)
+        row.latency_sum += bucket.latency_sum
+        row.status_2xx += bucket.status_count(2)
+        row.status_3xx += bucket.status_count(3)
+        row.status_4xx += bucket.status_count(4)
+        row.status_5xx += bucket.status_count(5)
+        row.request_count = total
+
+
+def archive_request_logs(
+    db: Session,
+    config: ArchiveSettings,
+    backend: ArchiveBackend,
+    now: Optional[datetime] = None,
+    throttle=None,
+) -> Tuple[int, int]:
+    """Roll up and archive request logs older than request_log_retention_days.
+
+    Works one whole hour at a time: raw rows are copied to the archive backend
+    in id order, the hour is aggregated into RequestLogHourly and the raw rows
+    are deleted with a single range DELETE in the same transaction. An
+    optional ArchiveThrottle paces the hours and can stop the run early.
+
+    Returns tuple(archived_rows, deleted_rows)
+    """
+    if not config.request_log_retention_days:
+        return 0, 0
+
+    cutoff = _floor_hour((now or datetime.utcnow()) - timedelta(days=config.request_log_retention_days))
+    columns = [getattr(RequestLog, col) for col in REQUEST_LOG_ARCHIVE_COLUMNS] + [RequestLog.sample_weight]
+    total_archived = 0
+    total_deleted = 0
+
+    while not (throttle and throttle.should_stop()):
+        first = db.query(func.min(RequestLog.timestamp)).filter(RequestLog.timestamp < cutoff).scalar()
+        if first is None:
+            break
+        hour = _floor_hour(first)
+        hour_end = min(hour + timedelta(hours=1), cutoff)
+
+        # Earlier hours are already deleted, so only the upper bound is needed
+        buckets: dict[tuple[str, str], _HourBucket] = {}
+        min_id: Optional[int] = None
+        last_id = 0
+        while True:
+            # Plain column rows: nothing lands in the session identity map
+            logs = (
+                db.query(*columns)
+                .filter(RequestLog.timestamp < hour_end, RequestLog.id > last_id)
+                .order_by(RequestLog.id)
+                .limit(REQUEST_LOG_BATCH_SIZE)
+                .all()
+            )
+            if not logs:
+                break
+            rows = [dict(log._mapping) for log in logs]
+            total_archived += backend.archive_request_logs(rows)
+            for log in logs:
+                key = (normalize_endpoint(log.endpoint), log.method)
+                bucket = buckets.get(key)
+                if bucket is None:
+                    bucket = buckets[key] = _HourBucket()
+                bucket.add(log.response_status, log.response_time, log.sample_weight)
+            if min_id is None:
+                min_id = logs[0].id
+            last_id = logs[-1].id
+
+        if min_id is None:
+            break
+
+        lock_start = time.monotonic()
+        _store_rollup(db, hour, buckets)
+        deleted = (
+            db.query(RequestLog)
+            .filter(RequestLog.timestamp < hour_end, RequestLog.id.between(min_id, last_id))
+            .delete(synchronize_session=False)
+        )
+        db.commit()
+        if throttle:
+            throttle.after_batch(deleted, time.monotonic() - lock_start)
+        total_deleted += deleted
+        if not deleted:
+            break
+
+    return total_archived, total_deleted
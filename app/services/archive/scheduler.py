@@ -1,71 +1,177 @@
-"""Background scheduler for archive service."""
+"""Background scheduler for archive service.
+
+Only one worker process runs archiving at a time: the leader holds the
+``archive-scheduler`` lease in the main database and renews it between
+batches. Runs follow ``schedule_cron`` (UTC) or ``schedule_interval_seconds``
+and, when a maintenance window is configured, only happen inside it.
+"""
 from __future__ import annotations
 
 import asyncio
-from datetime import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from typing import Optional
 
 from sqlalchemy.orm import Session
 
 from app.database import SessionLocal
-from .service import load_config, archive_once_with_handling
+from app.services import lease_service
+from .cron import CronSchedule, MaintenanceWindow
+from .service import ArchiveThrottle, load_config, archive_once_with_handling
+
+
+LEADER_LEASE_NAME = "archive-scheduler"
+LEADER_LEASE_TTL_SECONDS = 600
+# Sleep in short steps so config changes and lost leadership are noticed
+MAX_SLEEP_SECONDS = 60
 
 
 class ArchiveScheduler:
     def __init__(self) -> None:
         self._task: Optional[asyncio.Task] = None
         self._stop_event = asyncio.Event()
-        self._running = False
+        self._cancel = threading.Event()
+        # Dedicated thread: long archive runs must not starve the default executor
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="archive")
+        self._is_leader = False
+        self._next_run_at: Optional[datetime] = None
+        self._schedule_key_seen: Optional[tuple] = None
 
     @property
     def is_running(self) -> bool:
         return self._task is not None and not self._task.done()
 
+    @property
+    def is_leader(self) -> bool:
+        return self._is_leader
+
+    @property
+    def next_run_at(self) -> Optional[datetime]:
+        return self._next_run_at
+
     async def start(self) -> None:
         if self.is_running:
             return
         self._stop_event = asyncio.Event()
+        self._cancel.clear()
+        self._next_run_at = None
         self._task = asyncio.create_task(self._run_loop())
 
     async def stop(self) -> None:
         if not self.is_running:
             return
         self._stop_event.set()
+        self._cancel.set()
         await self._task
         self._task = None
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._release_leadership)
 
     async def _run_loop(self) -> None:
         loop = asyncio.get_running_loop()
         while not self._stop_event.is_set():
             try:
-                delay = await loop.run_in_executor(None, self._execute_cycle)
-            except Exception:
-                delay = 600
+                delay = await loop.run_in_executor(self._executor, self._execute_cycle)
+            except Exception as e:
+                print(f"[WARN] Archive scheduler cycle failed: {e}")
+                delay = MAX_SLEEP_SECONDS
             try:
                 await asyncio.wait_for(self._stop_event.wait(), timeout=delay)
             except asyncio.TimeoutError:
                 continue
 
-    def _execute_cycle(self) -> int:
-        delay_seconds = 3600
+    def _renew_lease(self) -> bool:
         session: Session = SessionLocal()
         try:
-            config = load_config(session)
-            interval = config.schedule_interval_seconds or 3600
-            delay_seconds = max(300, interval)
+            self._is_leader = lease_service.try_acquire(
+                session, LEADER_LEASE_NAME, LEADER_LEASE_TTL_SECONDS
+            )
+        except Exception:
+            session.rollback()
+            self._is_leader = False
+        finally:
+            session.close()
+        return self._is_leader
+
+    def _release_leadership(self) -> None:
+        if not self._is_leader:
+            return
+        session: Session = SessionLocal()
+        try:
+            lease_service.release(session, LEADER_LEASE_NAME)
+        finally:
+            session.close()
+            self._is_leader = False
+
+    def _heartbeat(self) -> bool:
+        return not self._cancel.is_set() and self._renew_lease()
 
+    @staticmethod
+    def _schedule_next(config, now: datetime, last_run: Optional[datetime]) -> datetime:
+        if config.schedule_cron:
+            return CronSchedule(config.schedule_cron).next_after(now)
+        interval = max(300, config.schedule_interval_seconds or 3600)
+        if last_run is None:
+            return now
+        return max(now, last_run + timedelta(seconds=interval))
+
+    @staticmethod
+    def _schedule_key(config) -> tuple:
+        return (
+            config.schedule_cron, config.schedule_interval_seconds,
+            config.maintenance_window_start, config.maintenance_window_end,
+        )
+
+    def _execute_cycle(self, now: Optional[datetime] = None) -> float:
+        session: Session = SessionLocal()
+        try:
+            config = load_config(session)
             if not config.enabled:
-                return delay_seconds
+                self._next_run_at = None
+                return MAX_SLEEP_SECONDS
+            if not self._renew_lease():
+                self._next_run_at = None
+                return MAX_SLEEP_SECONDS
+
+            now = now or datetime.utcnow()
+            # An edited schedule or window applies from the next cycle
+            schedule_key = self._schedule_key(config)
+            if schedule_key != self._schedule_key_seen:
+                self._schedule_key_seen = schedule_key
+                self._next_run_at = None
+            if self._next_run_at is None:
+                self._next_run_at = self._schedule_next(config, now, config.last_run_at)
+
+            window = None
+            if config.maintenance_window_start and config.maintenance_window_end:
+                window = MaintenanceWindow(config.maintenance_window_start, config.maintenance_window_end)
+                self._next_run_at = window.next_start(self._next_run_at)
 
-            processed, deleted, duration, error = archive_once_with_handling(session, config)
+            if now < self._next_run_at:
+                return min(MAX_SLEEP_SECONDS, (self._next_run_at - now).total_seconds())
+            if window and not window.contains(now):
+                # Woken after the window closed: wait for the next one instead of running at peak time
+                self._next_run_at = window.next_start(now)
+                return min(MAX_SLEEP_SECONDS, (self._next_run_at - now).total_seconds())
+
+            deadline = window.end_after(now) if window else None
+            throttle = ArchiveThrottle.from_config(config, deadline=deadline, heartbeat=self._heartbeat)
+            _, _, _, error = archive_once_with_handling(session, config, throttle=throttle)
             session.commit()
+
+            finished = datetime.utcnow()
             if error:
                 # In case of error, wait longer to avoid tight loop
-                return max(delay_seconds, 600)
-            return delay_seconds
+                self._next_run_at = max(
+                    self._schedule_next(config, finished, finished),
+                    finished + timedelta(seconds=600),
+                )
+            else:
+                self._next_run_at = self._schedule_next(config, finished, finished)
+            return MAX_SLEEP_SECONDS
         finally:
             session.close()
 
 
 archive_scheduler = ArchiveScheduler()
-
@@ -4,10 +4,12 @@ from __future__ import annotations
 import base64
 import hashlib
 import os
+import threading
 import time
+from collections import OrderedDict
 from contextlib import contextmanager
-from datetime import datetime, timedelta
-from typing import Optional, Tuple
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional, Tuple
 
 from sqlalchemy.orm import Session
 
@@ -16,11 +18,27 @@ from app.database import SessionLocal
 from app.models.archive_config import ArchiveBackendType, ArchiveSettings
 from app.models.feed import Feed
 from app.schemas.archive import ArchiveConfigCore
-from .backends import ArchiveBackend, SQLiteArchiveBackend, PostgresArchiveBackend, ARCHIVE_COLUMNS
+from app.services.metrics import archive_batch_seconds
+from .backends import (
+    ArchiveBackend,
+    SQLiteArchiveBackend,
+    PostgresArchiveBackend,
+    ParquetArchiveBackend,
+    ARCHIVE_COLUMNS,
+)
+from .downsample import aggregate_rows
+from .request_logs import archive_request_logs
 
 
 ARCHIVE_DEFAULT_SQLITE = os.path.join("archive", "archive.db")
+ARCHIVE_DEFAULT_PARQUET = os.path.join("archive", "parquet")
 ARCHIVE_BATCH_SIZE = 500
+ARCHIVE_MIN_BATCH_SIZE = 50
+# Live configuration plus the temporary ones used by "test" and migrations
+ARCHIVE_BACKEND_CACHE_SIZE = 4
+
+_backend_cache: "OrderedDict[str, ArchiveBackend]" = OrderedDict()
+_backend_cache_lock = threading.Lock()
 
 
 def _encryption_salt() -> bytes:
@@ -96,17 +114,43 @@ def apply_update(config: ArchiveSettings, payload: ArchiveConfigCore) -> None:
         config.pg_password_enc = encrypt_password(payload.pg_password)
     config.pg_schema = payload.pg_schema
     config.pg_ssl = payload.pg_ssl
+    config.parquet_dir = payload.parquet_dir
     config.retention_days = payload.retention_days
     config.schedule_interval_seconds = payload.schedule_interval_seconds
     config.schedule_cron = payload.schedule_cron
     config.copy_then_delete = payload.copy_then_delete
+    config.request_log_retention_days = payload.request_log_retention_days
+    config.downsample_bucket_seconds = payload.downsample_bucket_seconds
+    config.aggregate_only_after_days = payload.aggregate_only_after_days
+    config.maintenance_window_start = payload.maintenance_window_start
+    config.maintenance_window_end = payload.maintenance_window_end
+    config.max_rows_per_second = payload.max_rows_per_second
+    config.max_lock_ms = payload.max_lock_ms
 
 
-def get_backend(config: ArchiveSettings) -> ArchiveBackend:
+def backend_fingerprint(config: ArchiveSettings) -> str:
+    """Identity of the archive target: equal fingerprints share one backend."""
+    if config.backend_type == ArchiveBackendType.SQLITE:
+        parts = ["sqlite", os.path.abspath(config.sqlite_file_path or ARCHIVE_DEFAULT_SQLITE)]
+    elif config.backend_type == ArchiveBackendType.PARQUET:
+        parts = ["parquet", os.path.abspath(config.parquet_dir or ARCHIVE_DEFAULT_PARQUET)]
+    else:
+        parts = [
+            "postgres", config.pg_host, config.pg_port, config.pg_db, config.pg_user,
+            config.pg_password_enc, config.pg_schema, bool(config.pg_ssl),
+        ]
+    return hashlib.sha256(repr(parts).encode("utf-8")).hexdigest()
+
+
+def _create_backend(config: ArchiveSettings) -> ArchiveBackend:
+    pool = {"pool_size": settings.ARCHIVE_DB_POOL_SIZE, "max_overflow": settings.ARCHIVE_DB_MAX_OVERFLOW}
     if config.backend_type == ArchiveBackendType.SQLITE:
         path = config.sqlite_file_path or ARCHIVE_DEFAULT_SQLITE
         os.makedirs(os.path.dirname(path), exist_ok=True)
-        return SQLiteArchiveBackend(path)
+        return SQLiteArchiveBackend(path, **pool)
+
+    if config.backend_type == ArchiveBackendType.PARQUET:
+        return ParquetArchiveBackend(config.parquet_dir or ARCHIVE_DEFAULT_PARQUET)
 
     password = decrypt_password(config.pg_password_enc) or ""
     return PostgresArchiveBackend(
@@ -117,13 +161,50 @@ def get_backend(config: ArchiveSettings) -> ArchiveBackend:
         password=password,
         schema=config.pg_schema,
         ssl=bool(config.pg_ssl),
+        **pool,
     )
 
 
+def get_backend(config: ArchiveSettings) -> ArchiveBackend:
+    """Return the cached backend for this configuration, creating it on first use."""
+    key = backend_fingerprint(config)
+    evicted = []
+    with _backend_cache_lock:
+        backend = _backend_cache.get(key)
+        if backend is not None:
+            _backend_cache.move_to_end(key)
+            return backend
+        backend = _create_backend(config)
+        _backend_cache[key] = backend
+        while len(_backend_cache) > ARCHIVE_BACKEND_CACHE_SIZE:
+            evicted.append(_backend_cache.popitem(last=False)[1])
+    for old in evicted:
+        old.dispose()
+    return backend
+
+
+def forget_backend(config: ArchiveSettings) -> None:
+    """Drop the cached backend (e.g. after an error) so the next call rebuilds it."""
+    with _backend_cache_lock:
+        backend = _backend_cache.pop(backend_fingerprint(config), None)
+    if backend is not None:
+        backend.dispose()
+
+
+def dispose_backends(keep: Optional[ArchiveSettings] = None) -> None:
+    """Dispose cached backends, except the one for ``keep`` (the live config)."""
+    keep_key = backend_fingerprint(keep) if keep is not None else None
+    with _backend_cache_lock:
+        stale = [key for key in _backend_cache if key != keep_key]
+        backends = [_backend_cache.pop(key) for key in stale]
+    for backend in backends:
+        backend.dispose()
+
+
 def test_backend_connection(config: ArchiveSettings) -> None:
     backend = get_backend(config)
     backend.test_connection()
-    backend.init_schema()
+    backend.ensure_schema()
 
 
 @contextmanager
@@ -135,24 +216,113 @@ def db_session_scope():
         session.close()
 
 
-def archive_once(db: Session, config: ArchiveSettings, now: Optional[datetime] = None) -> Tuple[int, int, float]:
+class ArchiveThrottle:
+    """Paces archive batches so live ingest keeps getting the write lock.
+
+    - max_rows_per_second: sleeps between batches to cap throughput;
+    - max_lock_ms: halves the batch size while a batch holds the write lock
+      longer than the budget (grows it back when well under) and pauses for
+      as long as the lock was held;
+    - deadline: stop once the maintenance window closes;
+    - heartbeat: called between batches (e.g. to renew the leader lease),
+      returning False stops the run.
+    """
+
+    def __init__(
+        self,
+        max_rows_per_second: Optional[int] = None,
+        max_lock_ms: Optional[int] = None,
+        deadline: Optional[datetime] = None,
+        heartbeat: Optional[Callable[[], bool]] = None,
+    ) -> None:
+        self.max_rows_per_second = max_rows_per_second
+        self.max_lock_ms = max_lock_ms
+        self.deadline = deadline
+        self.heartbeat = heartbeat
+        self.batch_size = ARCHIVE_BATCH_SIZE
+        self._rows = 0
+        self._started = time.monotonic()
+        self._stopped = False
+
+    @classmethod
+    def from_config(
+        cls,
+        config: ArchiveSettings,
+        deadline: Optional[datetime] = None,
+        heartbeat: Optional[Callable[[], bool]] = None,
+    ) -> "ArchiveThrottle":
+        return cls(
+            max_rows_per_second=config.max_rows_per_second,
+            max_lock_ms=config.max_lock_ms,
+            deadline=deadline,
+            heartbeat=heartbeat,
+        )
+
+    def should_stop(self) -> bool:
+        if self._stopped:
+            return True
+        if self.deadline and datetime.utcnow() >= self.deadline:
+            self._stopped = True
+        return self._stopped
+
+    def after_batch(self, rows: int, lock_seconds: float) -> None:
+        self._rows += rows
+        pause = 0.0
+        if self.max_lock_ms:
+            budget = self.max_lock_ms / 1000.0
+            if lock_seconds > budget:
+                self.batch_size = max(ARCHIVE_MIN_BATCH_SIZE, self.batch_size // 2)
+            elif lock_seconds < budget / 2:
+                self.batch_size = min(ARCHIVE_BATCH_SIZE, self.batch_size * 2)
+            pause = lock_seconds
+        if self.max_rows_per_second:
+            expected = self._rows / self.max_rows_per_second
+            pause = max(pause, expected - (time.monotonic() - self._started))
+        if pause > 0:
+            time.sleep(pause)
+        if self.heartbeat and not self.heartbeat():
+            self._stopped = True
+
+
+def _older_than(value: Optional[datetime], cutoff: datetime) -> bool:
+    if value is None:
+        return False
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value < cutoff
+
+
+def archive_once(
+    db: Session,
+    config: ArchiveSettings,
+    now: Optional[datetime] = None,
+    throttle: Optional[ArchiveThrottle] = None,
+) -> Tuple[int, int, float]:
     """Archive data based on retention settings.
 
     Returns tuple(processed_rows, deleted_rows, duration_seconds)
     """
     backend = get_backend(config)
-    backend.init_schema()
-    cutoff = (now or datetime.utcnow()) - timedelta(days=config.retention_days)
+    backend.ensure_schema()
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(days=config.retention_days)
+    # Aggregates are additive, so they are only safe when rows leave the main DB
+    downsample = config.downsample_bucket_seconds if config.copy_then_delete else None
+    raw_cutoff = None
+    if downsample and config.aggregate_only_after_days:
+        raw_cutoff = now - timedelta(days=config.aggregate_only_after_days)
     total_processed = 0
     total_deleted = 0
     start = time.monotonic()
 
-    while True:
+    while not (throttle and throttle.should_stop()):
+        batch_size = throttle.batch_size if throttle else ARCHIVE_BATCH_SIZE
+        batch_start = time.monotonic()
         feeds = (
             db.query(Feed)
             .filter(Feed.created_at < cutoff)
             .order_by(Feed.created_at)
-            .limit(ARCHIVE_BATCH_SIZE)
+            .limit(batch_size)
             .all()
         )
         if not feeds:
@@ -163,9 +333,17 @@ def archive_once(db: Session, config: ArchiveSettings, now: Optional[datetime] =
             row = {col: getattr(feed, col) for col in ARCHIVE_COLUMNS}
             rows.append(row)
 
-        inserted = backend.archive_batch(rows)
+        if raw_cutoff is not None:
+            # Past the second threshold only the aggregates are kept
+            raw_rows = [r for r in rows if not _older_than(r["created_at"], raw_cutoff)]
+            inserted = backend.archive_batch(raw_rows) + (len(rows) - len(raw_rows))
+        else:
+            inserted = backend.archive_batch(rows)
+        if downsample and inserted:
+            backend.archive_aggregates(aggregate_rows(rows, downsample))
         total_processed += inserted
 
+        lock_start = time.monotonic()
         if inserted and config.copy_then_delete:
             feed_ids = [feed.id for feed in feeds]
             deleted = (
@@ -175,26 +353,41 @@ def archive_once(db: Session, config: ArchiveSettings, now: Optional[datetime] =
             )
             total_deleted += deleted
         db.commit()
+        archive_batch_seconds.observe(time.monotonic() - batch_start)
+        if throttle:
+            throttle.after_batch(inserted, time.monotonic() - lock_start)
 
         # If copy_without_delete and inserted rows less than batch (due to duplicates) -> avoid busy loop
-        if inserted < ARCHIVE_BATCH_SIZE:
+        if inserted < batch_size:
             break
 
+    logs_archived, _ = archive_request_logs(db, config, backend, now=now, throttle=throttle)
+
+    if total_processed or logs_archived:
+        backend.compact()
+
     duration = time.monotonic() - start
     config.last_run_at = datetime.utcnow()
     config.last_processed = total_processed
+    config.last_request_logs_archived = logs_archived
     config.last_status = "success"
     config.last_error = None
     return total_processed, total_deleted, duration
 
 
-def archive_once_with_handling(db: Session, config: ArchiveSettings) -> Tuple[int, int, float, Optional[str]]:
+def archive_once_with_handling(
+    db: Session,
+    config: ArchiveSettings,
+    throttle: Optional[ArchiveThrottle] = None,
+) -> Tuple[int, int, float, Optional[str]]:
     try:
-        processed, deleted, duration = archive_once(db, config)
+        processed, deleted, duration = archive_once(db, config, throttle=throttle)
         db.commit()
         return processed, deleted, duration, None
     except Exception as exc:  # pragma: no cover - log and propagate message
         db.rollback()
+        # Rebuild the engine and re-check the schema on the next run
+        forget_backend(config)
         config.last_run_at = datetime.utcnow()
         config.last_status = "error"
         config.last_error = str(exc)
@@ -0,0 +1 @@
+"""Automation engine internals (rule compilation and runtime state)."""
@@ -0,0 +1,232 @@
+"""Compiled per-channel automation plans.
+
+A channel's active rules are compiled once into a ChannelPlan: an ordered
+tuple of steps with the operator, action and parameters already resolved and
+math expressions compiled by the safe expression compiler. Plans are cached per
+process for AUTOMATION_PLAN_CACHE_TTL seconds (other workers pick up rule
+changes after the TTL) and dropped immediately by ``invalidate()``.
+"""
+from __future__ import annotations
+
+import logging
+import operator
+import threading
+import time
+from typing import Callable, Optional
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.automation_rule import AutomationRule
+from .expression import ExpressionError, compile_expression
+from .pid_state import feed_timestamp, pid_state_store
+from .triggers import last_values
+from .windows import WINDOW_RULE_TYPES, WindowSpec, window_state_store
+
+logger = logging.getLogger(__name__)
+
+OPERATORS = {
+    ">": operator.gt,
+    "<": operator.lt,
+    "==": operator.eq,
+    ">=": operator.ge,
+    "<=": operator.le,
+    "!=": operator.ne,
+}
+
+
+class CompiledRule:
+    """One executable step of a channel plan.
+
+    ``execute(feed, db)`` returns True when the rule fired (wrote its target).
+    """
+
+    __slots__ = ("rule_id", "name", "rule_type", "target_field", "trigger_channel_id", "execute")
+
+    def __init__(
+        self,
+        rule: AutomationRule,
+        target_field: Optional[str],
+        execute: Callable[[object, Session], bool],
+    ) -> None:
+        self.rule_id = rule.id
+        self.name = rule.name
+        self.rule_type = rule.rule_type
+        self.target_field = target_field
+        self.trigger_channel_id = _trigger_channel(rule)
+        self.execute = execute
+
+
+class ChannelPlan:
+    """Ordered compiled rules of one channel."""
+
+    __slots__ = ("channel_id", "rules", "output_fields")
+
+    def __init__(self, channel_id: int, rules: tuple[CompiledRule, ...]) -> None:
+        self.channel_id = channel_id
+        self.rules = rules
+        self.output_fields = frozenset(r.target_field for r in rules if r.target_field)
+
+
+def _trigger_channel(rule: AutomationRule) -> Optional[int]:
+    source = getattr(rule, "trigger_channel_id", None)
+    return source if source is not None and source != rule.channel_id else None
+
+
+def _trigger_reader(rule: AutomationRule) -> Callable[[object, Session], Optional[float]]:
+    """Read the trigger value from the feed or, for cross-channel rules, the last-value index."""
+    trigger, source = rule.trigger_field, _trigger_channel(rule)
+    if source is None:
+        return lambda feed, db: getattr(feed, trigger, None)
+    return lambda feed, db: last_values.get(db, source, trigger)
+
+
+def _compile_condition(rule: AutomationRule) -> Optional[CompiledRule]:
+    trigger, target = rule.trigger_field, rule.target_field
+    test = OPERATORS.get(rule.condition)
+    if not trigger or not target:
+        return None
+    read = _trigger_reader(rule)
+    threshold = rule.threshold_value
+    value = rule.action_value
+
+    if rule.action_type == "set_value":
+        def act(feed):
+            setattr(feed, target, value)
+    elif rule.action_type == "increment":
+        def act(feed):
+            setattr(feed, target, (getattr(feed, target, None) or 0) + value)
+    elif rule.action_type == "decrement":
+        def act(feed):
+            setattr(feed, target, (getattr(feed, target, None) or 0) - value)
+    else:
+        act = None
+
+    def execute(feed, db):
+        current = read(feed, db)
+        if current is None or test is None:
+            return False
+        if test(current, threshold) and act is not None:
+            act(feed)
+            return True
+        return False
+
+    return CompiledRule(rule, target, execute)
+
+
+def _compile_pid(rule: AutomationRule) -> Optional[CompiledRule]:
+    trigger, target = rule.trigger_field, rule.target_field
+    if not trigger or not target:
+        return None
+    rule_id, channel_id = rule.id, rule.channel_id
+    read = _trigger_reader(rule)
+    setpoint, kp, ki, kd = rule.pid_setpoint, rule.pid_kp, rule.pid_ki, rule.pid_kd
+    out_min, out_max = rule.pid_output_min, rule.pid_output_max
+
+    def execute(feed, db):
+        current = read(feed, db)
+        if current is None:
+            return False
+        error = setpoint - current
+        integral, derivative = pid_state_store.update(db, rule_id, channel_id, error, feed_timestamp(feed))
+        output = kp * error + ki * integral + kd * derivative
+        setattr(feed, target, round(max(out_min, min(out_max, output)), 2))
+        return True
+
+    return CompiledRule(rule, target, execute)
+
+
+def _compile_math(rule: AutomationRule) -> Optional[CompiledRule]:
+    if not rule.expression:
+        return None
+    try:
+        expression = compile_expression(rule.expression)
+    except ExpressionError as e:
+        logger.warning("Skipping rule %s: invalid expression: %s", rule.id, e)
+        return None
+    target = expression.target_field
+
+    def execute(feed, db):
+        setattr(feed, target, round(expression(feed), 2))
+        return True
+
+    return CompiledRule(rule, target, execute)
+
+
+def _compile_window(rule: AutomationRule) -> Optional[CompiledRule]:
+    spec = WindowSpec.from_rule(rule)
+    if spec is None:
+        return None
+    target = rule.target_field
+    read = _trigger_reader(rule)
+
+    def execute(feed, db):
+        output = window_state_store.observe(db, spec, feed, read(feed, db))
+        if output is None:
+            return False
+        setattr(feed, target, round(output, 2))
+        return True
+
+    return CompiledRule(rule, target, execute)
+
+
+_COMPILERS = {
+    "condition": _compile_condition,
+    "pid": _compile_pid,
+    "math": _compile_math,
+    **{rule_type: _compile_window for rule_type in WINDOW_RULE_TYPES},
+}
+
+
+def compile_rule(rule: AutomationRule) -> Optional[CompiledRule]:
+    compiler = _COMPILERS.get(rule.rule_type)
+    return compiler(rule) if compiler else None
+
+
+def compile_plan(channel_id: int, rules: list[AutomationRule]) -> ChannelPlan:
+    steps = []
+    for rule in rules:
+        step = compile_rule(rule)
+        if step is not None:
+            steps.append(step)
+    return ChannelPlan(channel_id, tuple(steps))
+
+
+def load_active_rules(db: Session, channel_id: int) -> list[AutomationRule]:
+    return db.query(AutomationRule).filter(
+        AutomationRule.channel_id == channel_id,
+        AutomationRule.is_active == True
+    ).order_by(AutomationRule.priority.asc(), AutomationRule.id.asc()).all()
+
+
+class PlanCache:
+    """Per-process cache of ChannelPlan objects."""
+
+    def __init__(self) -> None:
+        self._plans: dict[int, tuple[ChannelPlan, float]] = {}
+        self._lock = threading.Lock()
+        # Bumped by invalidate() so a plan compiled concurrently is not stored
+        self._generation = 0
+
+    def get(self, db: Session, channel_id: int) -> ChannelPlan:
+        now = time.monotonic()
+        item = self._plans.get(channel_id)
+        if item and now - item[1] < settings.AUTOMATION_PLAN_CACHE_TTL:
+            return item[0]
+        generation = self._generation
+        plan = compile_plan(channel_id, load_active_rules(db, channel_id))
+        with self._lock:
+            if generation == self._generation:
+                self._plans[channel_id] = (plan, now)
+        return plan
+
+    def invalidate(self, channel_id: Optional[int] = None) -> None:
+        with self._lock:
+            self._generation += 1
+            if channel_id is None:
+                self._plans.clear()
+            else:
+                self._plans.pop(channel_id, None)
+
+
+plan_cache = PlanCache()
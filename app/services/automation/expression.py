@@ -0,0 +1,198 @@
+"""Safe compiler for math rule expressions: ``fieldN = <expr>``.
+
+The right-hand side is parsed with :mod:`ast` and every node is checked
+against a whitelist (numbers, field1-field8, + - * / // ** and the functions
+sqrt, abs, pow, min, max, round). The vetted tree is compiled once into a
+plain Python function of the fields it uses, so evaluating it per feed is a
+single call with no parsing, regex or name lookups in a context dict.
+"""
+from __future__ import annotations
+
+import ast
+import functools
+import math
+import re
+from typing import Callable
+
+FIELD_NAMES = tuple(f"field{i}" for i in range(1, 9))
+
+# Exponents beyond this are rejected at run time
+MAX_EXPONENT = 1000
+# Longer right-hand sides are rejected before parsing
+MAX_EXPRESSION_LENGTH = 1000
+
+
+def _safe_pow(base, exponent, *modulo):
+    """Power in floats: nested integer powers ((10 ^ 1000) ^ 1000) would build huge ints and hang"""
+    if modulo:
+        raise ValueError("pow() with modulo is not supported")
+    if abs(exponent) > MAX_EXPONENT:
+        raise ValueError("Exponent is too large")
+    try:
+        return float(base) ** exponent
+    except OverflowError:
+        raise ValueError("Result is too large")
+
+
+# name -> (function, min args, max args)
+FUNCTIONS = {
+    "sqrt": (math.sqrt, 1, 1),
+    "abs": (abs, 1, 1),
+    "pow": (_safe_pow, 2, 2),
+    "min": (min, 2, None),
+    "max": (max, 2, None),
+    "round": (round, 1, 2),
+}
+
+_BIN_OPS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Pow)
+_UNARY_OPS = (ast.UAdd, ast.USub)
+_ASSIGNMENT = re.compile(r"^\s*(\w+)\s*=\s*(.+?)\s*$", re.DOTALL)
+
+
+class ExpressionError(ValueError):
+    """Expression is outside the supported grammar."""
+
+
+class _Validator(ast.NodeTransformer):
+    def __init__(self) -> None:
+        self.fields: set[str] = set()
+
+    def generic_visit(self, node):
+        raise ExpressionError(f"Unsupported syntax: {type(node).__name__}")
+
+    def visit_Expression(self, node: ast.Expression):
+        node.body = self.visit(node.body)
+        return node
+
+    def visit_Constant(self, node: ast.Constant):
+        if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+            raise ExpressionError("Only numeric constants are allowed")
+        return node
+
+    def visit_Name(self, node: ast.Name):
+        if node.id not in FIELD_NAMES:
+            raise ExpressionError(f"Unknown name '{node.id}'")
+        self.fields.add(node.id)
+        return node
+
+    def visit_BinOp(self, node: ast.BinOp):
+        if not isinstance(node.op, _BIN_OPS):
+            raise ExpressionError(f"Unsupported operator: {type(node.op).__name__}")
+        left, right = self.visit(node.left), self.visit(node.right)
+        if isinstance(node.op, ast.Pow):
+            # Route ** through the bounded pow
+            return ast.copy_location(
+                ast.Call(func=ast.Name(id="pow", ctx=ast.Load()), args=[left, right], keywords=[]),
+                node,
+            )
+        node.left, node.right = left, right
+        return node
+
+    def visit_UnaryOp(self, node: ast.UnaryOp):
+        if not isinstance(node.op, _UNARY_OPS):
+            raise ExpressionError(f"Unsupported operator: {type(node.op).__name__}")
+        node.operand = self.visit(node.operand)
+        return node
+
+    def visit_Call(self, node: ast.Call):
+        if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS:
+            raise ExpressionError("Only sqrt, abs, pow, min, max and round can be called")
+        if node.keywords:
+            raise ExpressionError("Keyword arguments are not supported")
+        _, min_args, max_args = FUNCTIONS[node.func.id]
+        if len(node.args) < min_args or (max_args is not None and len(node.args) > max_args):
+            raise ExpressionError(f"Wrong number of arguments for {node.func.id}()")
+        node.args = [self.visit(arg) for arg in node.args]
+        return node
+
+
+class CompiledExpression:
+    """Callable evaluating the expression on an object with fieldN attributes."""
+
+    __slots__ = ("target_field", "source", "fields", "function")
+
+    def __init__(self, target_field: str, source: str, fields: tuple[str, ...], function: Callable):
+        self.target_field = target_field
+        self.source = source
+        self.fields = fields  # positional parameters of ``function``
+        self.function = function
+
+    def __call__(self, feed) -> float:
+        args = []
+        for name in self.fields:
+            value = getattr(feed, name, None)
+            args.append(value if value is not None else 0)
+        return float(self.function(*args))
+
+
+def split_assignment(expression: str) -> tuple[str, str]:
+    match = _ASSIGNMENT.match(expression or "")
+    if not match:
+        raise ExpressionError("Expression must look like 'fieldN = <expression>'")
+    target_field, source = match.group(1), match.group(2)
+    if target_field not in FIELD_NAMES:
+        raise ExpressionError(f"Invalid target field '{target_field}'")
+    return target_field, source
+
+
+def _parse(source: str) -> tuple[ast.Expression, tuple[str, ...]]:
+    if len(source) > MAX_EXPRESSION_LENGTH:
+        raise ExpressionError(f"Expression is longer than {MAX_EXPRESSION_LENGTH} characters")
+    validator = _Validator()
+    try:
+        tree = validator.visit(ast.parse(source.replace("^", "**"), mode="eval"))
+    except SyntaxError as e:
+        raise ExpressionError(f"Syntax error: {e.msg}")
+    except (RecursionError, MemoryError):
+        raise ExpressionError("Expression is nested too deeply")
+    return tree, tuple(sorted(validator.fields))
+
+
+def _build_function(tree: ast.Expression, fields: tuple[str, ...], functions: dict) -> Callable:
+    # lambda field1, field3: <expr>, evaluated with only the given functions visible
+    function_tree = ast.Expression(
+        body=ast.Lambda(
+            args=ast.arguments(
+                posonlyargs=[],
+                args=[ast.arg(arg=name) for name in fields],
+                kwonlyargs=[],
+                kw_defaults=[],
+                defaults=[],
+            ),
+            body=tree.body,
+        )
+    )
+    ast.fix_missing_locations(function_tree)
+    namespace = {"__builtins__": {}}
+    namespace.update(functions)
+    try:
+        code = compile(function_tree, "<automation>", "eval")
+    except (RecursionError, MemoryError):
+        raise ExpressionError("Expression is nested too deeply")
+    return eval(code, namespace)
+
+
+def compile_expression(expression: str) -> CompiledExpression:
+    """Validate and compile ``fieldN = <expr>``. Raises ExpressionError."""
+    target_field, source = split_assignment(expression)
+    tree, fields = _parse(source)
+    function = _build_function(tree, fields, {name: spec[0] for name, spec in FUNCTIONS.items()})
+    return CompiledExpression(target_field, source, fields, function)
+
+
+def compile_vector_function(expression: CompiledExpression, np) -> Callable:
+    """Same expression over NumPy arrays (one positional array per field).
+
+    Invalid results (division by zero, overflow) come out as inf/nan instead
+    of raising, callers treat non-finite values like a failed evaluation.
+    """
+    tree, fields = _parse(expression.source)
+    functions = {
+        "sqrt": np.sqrt,
+        "abs": np.abs,
+        "pow": lambda base, exponent: np.power(np.asarray(base, dtype=float), exponent),
+        "min": lambda *args: functools.reduce(np.minimum, args),
+        "max": lambda *args: functools.reduce(np.maximum, args),
+        "round": lambda value, digits=0: np.round(value, int(digits)),
+    }
+    return _build_function(tree, fields, functions)
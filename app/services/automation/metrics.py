@@ -0,0 +1,128 @@
+"""Per-rule execution metrics of the automation engine.
+
+Counters live in process memory (each worker reports its own share) and
+are cheap enough to update on every feed: a few integer/float additions and
+one slot of a fixed ring of recent durations, from which p99 is computed
+only when metrics are read.
+"""
+from __future__ import annotations
+
+import logging
+import math
+import threading
+from array import array
+from typing import Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Recent durations kept per rule for percentiles
+RECENT_SAMPLES = 256
+
+
+class RuleStats:
+    __slots__ = ("rule_id", "channel_id", "name", "executions", "errors", "fires",
+                 "total_seconds", "max_seconds", "last_error", "_recent", "_next")
+
+    def __init__(self, rule_id: int, channel_id: int, name: str) -> None:
+        self.rule_id = rule_id
+        self.channel_id = channel_id
+        self.name = name
+        self.executions = 0
+        self.errors = 0
+        self.fires = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.last_error: Optional[str] = None
+        self._recent = array("d")
+        self._next = 0
+
+    def add(self, seconds: float, fired: bool) -> None:
+        self.executions += 1
+        if fired:
+            self.fires += 1
+        self.total_seconds += seconds
+        if seconds > self.max_seconds:
+            self.max_seconds = seconds
+        if len(self._recent) < RECENT_SAMPLES:
+            self._recent.append(seconds)
+        else:
+            self._recent[self._next] = seconds
+            self._next = (self._next + 1) % RECENT_SAMPLES
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self._recent:
+            return None
+        ordered = sorted(self._recent)
+        return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+    def to_dict(self) -> dict:
+        p99 = self.percentile(0.99)
+        return {
+            "rule_id": self.rule_id,
+            "channel_id": self.channel_id,
+            "name": self.name,
+            "executions": self.executions,
+            "errors": self.errors,
+            "fires": self.fires,
+            "fire_rate": round(self.fires / self.executions, 4) if self.executions else 0.0,
+            "total_ms": round(self.total_seconds * 1000, 3),
+            "avg_ms": round(self.total_seconds * 1000 / self.executions, 4) if self.executions else None,
+            "p99_ms": round(p99 * 1000, 4) if p99 is not None else None,
+            "max_ms": round(self.max_seconds * 1000, 4),
+            "last_error": self.last_error,
+        }
+
+
+class AutomationMetrics:
+    def __init__(self) -> None:
+        self._rules: dict[int, RuleStats] = {}
+        self._lock = threading.Lock()
+
+    def _stats(self, step, channel_id: int) -> RuleStats:
+        stats = self._rules.get(step.rule_id)
+        if stats is None:
+            with self._lock:
+                stats = self._rules.setdefault(step.rule_id, RuleStats(step.rule_id, channel_id, step.name))
+        return stats
+
+    def record(self, step, channel_id: int, seconds: float, fired: bool) -> None:
+        self._stats(step, channel_id).add(seconds, fired)
+        slow_ms = settings.AUTOMATION_SLOW_RULE_MS
+        if slow_ms and seconds * 1000 >= slow_ms:
+            logger.warning(
+                "Slow automation rule %s (%s) on channel %s: %.2f ms",
+                step.rule_id, step.name, channel_id, seconds * 1000,
+            )
+
+    def record_error(self, step, channel_id: int, seconds: float, error: Exception) -> None:
+        stats = self._stats(step, channel_id)
+        stats.add(seconds, False)
+        stats.errors += 1
+        stats.last_error = f"{type(error).__name__}: {error}"
+        logger.warning("Error executing rule %s on channel %s: %s", step.rule_id, channel_id, error)
+
+    def snapshot(self, channel_id: Optional[int] = None) -> list[dict]:
+        """Stats as dicts, slowest (by total time) first."""
+        with self._lock:
+            rules = list(self._rules.values())
+        if channel_id is not None:
+            rules = [r for r in rules if r.channel_id == channel_id]
+        rules.sort(key=lambda r: r.total_seconds, reverse=True)
+        return [r.to_dict() for r in rules]
+
+    def reset(self, channel_id: Optional[int] = None) -> None:
+        with self._lock:
+            if channel_id is None:
+                self._rules.clear()
+            else:
+                for rule_id in [r for r, s in self._rules.items() if s.channel_id == channel_id]:
+                    del self._rules[rule_id]
+
+    def forget(self, rule_id: int) -> None:
+        with self._lock:
+            self._rules.pop(rule_id, None)
+
+
+automation_metrics = AutomationMetrics()
@@ -0,0 +1,72 @@
+"""Sticky output fields: last values of automation outputs per channel.
+
+A write that leaves an automation output field empty keeps its previous
+value (otherwise a device posting only sensor fields would reset relays and
+setpoints). The previous values come from an in-memory record per channel,
+refreshed after each commit by the engine's post-commit phase. The record
+is trusted only while its entry_id matches ``channel.last_entry_id``, which
+the request has already loaded; after writes by other workers (or a rolled
+back batch) it is reloaded from the last feed once.
+"""
+from __future__ import annotations
+
+import threading
+from typing import Optional
+
+from sqlalchemy import desc
+from sqlalchemy.orm import Session
+
+from app.models.channel import Channel
+from app.models.feed import Feed
+from .compiler import plan_cache
+from .expression import FIELD_NAMES
+
+
+class OutputRecord:
+    __slots__ = ("entry_id", "values")
+
+    def __init__(self, entry_id: Optional[int], values: dict) -> None:
+        self.entry_id = entry_id
+        self.values = values
+
+
+class StickyOutputs:
+    def __init__(self) -> None:
+        self._records: dict[int, OutputRecord] = {}
+        self._lock = threading.Lock()
+
+    def preserve(self, db: Session, channel: Channel, field_values: dict) -> dict:
+        """Fill empty output fields of a new write with their last values (in place)."""
+        output_fields = plan_cache.get(db, channel.id).output_fields
+        missing = [name for name in output_fields if field_values.get(name) is None]
+        if not missing:
+            return field_values
+        values = self._last_values(db, channel)
+        for name in missing:
+            field_values[name] = values.get(name)
+        return field_values
+
+    def record(self, channel_id: int, entry_id: Optional[int], values: dict) -> None:
+        with self._lock:
+            self._records[channel_id] = OutputRecord(entry_id, values)
+
+    def forget(self, channel_id: Optional[int] = None) -> None:
+        with self._lock:
+            if channel_id is None:
+                self._records.clear()
+            else:
+                self._records.pop(channel_id, None)
+
+    def _last_values(self, db: Session, channel: Channel) -> dict:
+        record = self._records.get(channel.id)
+        if record is not None and record.entry_id == channel.last_entry_id:
+            return record.values
+        row = db.query(*[getattr(Feed, name) for name in FIELD_NAMES]).filter(
+            Feed.channel_id == channel.id
+        ).order_by(desc(Feed.created_at), desc(Feed.id)).first()
+        values = dict(zip(FIELD_NAMES, row)) if row else {}
+        self.record(channel.id, channel.last_entry_id, values)
+        return values
+
+
+sticky_outputs = StickyOutputs()
@@ -0,0 +1,294 @@
+"""In-process PID controller state with periodic checkpoints.
+
+The worker that holds the ``pid:<channel_id>`` lease owns the PID state of
+that channel: integral, last error and last timestamp live in memory and are
+written to ``automation_rules`` every AUTOMATION_PID_CHECKPOINT_SECONDS and
+on shutdown, so ingest does not UPDATE the rule row per feed.
+
+Workers without the lease (or when the checkpoint loop is not running) use
+the shared path: read the row and add to the integral with an atomic
+``pid_integral = pid_integral + delta`` in the feed transaction. The owner
+also writes its integral as a delta and reloads the row on checkpoint, so
+contributions from several workers are never lost, only seen by the owner
+up to one checkpoint interval late.
+
+Leases are only taken and renewed by the background loop, never from the
+feed path: on SQLite a second write connection there would wait on the
+request's own write lock.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import case
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.automation_rule import AutomationRule
+from app.services import lease_service
+
+logger = logging.getLogger(__name__)
+
+# Longer gaps (device offline) are integrated as this many seconds
+PID_MAX_DT_SECONDS = 3600.0
+
+
+def lease_name(channel_id: int) -> str:
+    return f"pid:{channel_id}"
+
+
+def feed_timestamp(feed) -> float:
+    """Feed time as epoch seconds without triggering a lazy refresh."""
+    created_at = vars(feed).get("created_at")
+    if isinstance(created_at, datetime):
+        return datetime_ts(created_at)
+    return time.time()
+
+
+def datetime_ts(value: datetime) -> float:
+    """Epoch seconds of a DB timestamp (naive values are UTC)."""
+    return value.timestamp() if value.tzinfo else _naive_utc_ts(value)
+
+
+def _naive_utc_ts(value: datetime) -> float:
+    return (value - datetime(1970, 1, 1)).total_seconds()
+
+
+def _to_datetime(ts: Optional[float]) -> Optional[datetime]:
+    if ts is None:
+        return None
+    return datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None)
+
+
+def pid_step(
+    integral: float,
+    last_error: Optional[float],
+    last_ts: Optional[float],
+    error: float,
+    ts: float,
+) -> tuple[float, float, float]:
+    """Advance the integral/derivative by one sample.
+
+    Returns (integral_increment, derivative, dt). The first sample and
+    samples with the same timestamp do not integrate or differentiate.
+    """
+    if last_ts is None or ts <= last_ts:
+        return 0.0, 0.0, 0.0
+    dt = min(ts - last_ts, PID_MAX_DT_SECONDS)
+    derivative = (error - (last_error or 0.0)) / dt
+    return error * dt, derivative, dt
+
+
+class PidState:
+    __slots__ = ("channel_id", "integral", "last_error", "last_ts", "delta", "dirty")
+
+    def __init__(self, channel_id: int, integral: float, last_error: Optional[float], last_ts: Optional[float]):
+        self.channel_id = channel_id
+        self.integral = integral or 0.0
+        self.last_error = last_error
+        self.last_ts = last_ts
+        self.delta = 0.0  # integral added since the last checkpoint
+        self.dirty = False
+
+
+class PidStateStore:
+    def __init__(self) -> None:
+        self._states: dict[int, PidState] = {}
+        self._owned: set[int] = set()
+        self._wanted: set[int] = set()
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._stop_event = asyncio.Event()
+
+    # --- feed path -------------------------------------------------------
+
+    def update(self, db: Session, rule_id: int, channel_id: int, error: float, ts: float) -> tuple[float, float]:
+        """Record a new error sample. Returns (integral, derivative)."""
+        if channel_id in self._owned:
+            with self._lock:
+                state = self._states.get(rule_id)
+            if state is None:
+                state = self._load(db, rule_id, channel_id)
+            with self._lock:
+                increment, derivative, _ = pid_step(state.integral, state.last_error, state.last_ts, error, ts)
+                state.integral += increment
+                state.delta += increment
+                state.last_error = error
+                state.last_ts = ts
+                state.dirty = True
+                return state.integral, derivative
+
+        if self.is_running:
+            with self._lock:
+                self._wanted.add(channel_id)
+        return self._update_shared(db, rule_id, error, ts)
+
+    def _load(self, db: Session, rule_id: int, channel_id: int) -> PidState:
+        row = db.query(
+            AutomationRule.pid_integral, AutomationRule.pid_last_error, AutomationRule.pid_last_ts
+        ).filter(AutomationRule.id == rule_id).first()
+        state = PidState(
+            channel_id,
+            row.pid_integral if row else 0.0,
+            row.pid_last_error if row else None,
+            _naive_utc_ts(row.pid_last_ts) if row and row.pid_last_ts else None,
+        )
+        with self._lock:
+            return self._states.setdefault(rule_id, state)
+
+    def _update_shared(self, db: Session, rule_id: int, error: float, ts: float) -> tuple[float, float]:
+        row = db.query(
+            AutomationRule.pid_integral, AutomationRule.pid_last_error, AutomationRule.pid_last_ts
+        ).filter(AutomationRule.id == rule_id).first()
+        if row is None:
+            return 0.0, 0.0
+        last_ts = _naive_utc_ts(row.pid_last_ts) if row.pid_last_ts else None
+        increment, derivative, _ = pid_step(row.pid_integral or 0.0, row.pid_last_error, last_ts, error, ts)
+        db.query(AutomationRule).filter(AutomationRule.id == rule_id).update(
+            {
+                AutomationRule.pid_integral: AutomationRule.pid_integral + increment,
+                AutomationRule.pid_last_error: error,
+                AutomationRule.pid_last_ts: _to_datetime(ts),
+            },
+            synchronize_session=False,
+        )
+        return (row.pid_integral or 0.0) + increment, derivative
+
+    def forget(self, rule_id: int) -> None:
+        """Drop cached state (rule deleted or PID state reset)."""
+        with self._lock:
+            self._states.pop(rule_id, None)
+
+    # --- checkpoint loop -------------------------------------------------
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self) -> None:
+        if self.is_running:
+            return
+        self._stop_event = asyncio.Event()
+        self._task = asyncio.create_task(self._run_loop())
+
+    async def stop(self) -> None:
+        if not self.is_running:
+            return
+        self._stop_event.set()
+        await self._task
+        self._task = None
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._shutdown)
+
+    async def _run_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        interval = max(1, settings.AUTOMATION_PID_CHECKPOINT_SECONDS)
+        while not self._stop_event.is_set():
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            if self._stop_event.is_set():
+                break
+            try:
+                await loop.run_in_executor(None, self._cycle)
+            except Exception as e:
+                logger.warning("PID checkpoint failed: %s", e)
+
+    def _cycle(self) -> None:
+        ttl = 3 * max(1, settings.AUTOMATION_PID_CHECKPOINT_SECONDS)
+        db = SessionLocal()
+        try:
+            self.checkpoint(db)
+            # Renew owned leases and try to take the ones seen on the shared path
+            with self._lock:
+                channels = self._owned | self._wanted
+                self._wanted.clear()
+            for channel_id in channels:
+                if lease_service.try_acquire(db, lease_name(channel_id), ttl):
+                    if channel_id not in self._owned:
+                        self._drop_channel(channel_id)  # reload fresh rows as the new owner
+                        self._owned.add(channel_id)
+                elif channel_id in self._owned:
+                    self._owned.discard(channel_id)
+                    self.checkpoint(db)
+                    self._drop_channel(channel_id)
+        finally:
+            db.close()
+
+    def _drop_channel(self, channel_id: int) -> None:
+        with self._lock:
+            for rule_id in [r for r, s in self._states.items() if s.channel_id == channel_id]:
+                del self._states[rule_id]
+
+    def checkpoint(self, db: Session) -> int:
+        """Write dirty states to automation_rules. Returns number of rules written."""
+        with self._lock:
+            pending = {
+                rule_id: (state.delta, state.last_error, state.last_ts)
+                for rule_id, state in self._states.items()
+                if state.dirty
+            }
+            for rule_id in pending:
+                self._states[rule_id].delta = 0.0
+                self._states[rule_id].dirty = False
+        if not pending:
+            return 0
+        try:
+            for rule_id, (delta, last_error, last_ts) in pending.items():
+                last_at = _to_datetime(last_ts)
+                # Keep the newer sample if another worker wrote one meanwhile
+                newer = (AutomationRule.pid_last_ts == None) | (AutomationRule.pid_last_ts <= last_at)
+                db.query(AutomationRule).filter(AutomationRule.id == rule_id).update(
+                    {
+                        AutomationRule.pid_integral: AutomationRule.pid_integral + delta,
+                        AutomationRule.pid_last_error: case((newer, last_error), else_=AutomationRule.pid_last_error),
+                        AutomationRule.pid_last_ts: case((newer, last_at), else_=AutomationRule.pid_last_ts),
+                    },
+                    synchronize_session=False,
+                )
+            db.commit()
+        except Exception:
+            db.rollback()
+            with self._lock:
+                for rule_id, (delta, _, _) in pending.items():
+                    state = self._states.get(rule_id)
+                    if state is not None:
+                        state.delta += delta
+                        state.dirty = True
+            raise
+
+        # Pick up integral contributions of non-owning workers
+        rows = db.query(AutomationRule.id, AutomationRule.pid_integral).filter(
+            AutomationRule.id.in_(list(pending))
+        ).all()
+        with self._lock:
+            found = set()
+            for rule_id, integral in rows:
+                found.add(rule_id)
+                state = self._states.get(rule_id)
+                if state is not None:
+                    state.integral = (integral or 0.0) + state.delta
+            for rule_id in set(pending) - found:
+                self._states.pop(rule_id, None)  # rule was deleted
+        return len(pending)
+
+    def _shutdown(self) -> None:
+        db = SessionLocal()
+        try:
+            self.checkpoint(db)
+            for channel_id in list(self._owned):
+                lease_service.release(db, lease_name(channel_id))
+        finally:
+            self._owned.clear()
+            self._wanted.clear()
+            db.close()
+
+
+pid_state_store = PidStateStore()
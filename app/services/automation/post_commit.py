@@ -0,0 +1,165 @@
+"""Post-commit automation work on a bounded background queue.
+
+Work that does not change the stored feed (firing dependent channels,
+future notifications, statistics) is queued after the request's commit and
+run by a few workers, each task in its own session and transaction in the
+default executor. When the queue is full producers wait up to
+PUT_TIMEOUT_SECONDS (backpressure); failed tasks are retried with
+exponential backoff.
+
+Tasks with a ``key`` are coalesced while queued: a second "fire dependents
+of channel 5" waiting behind the first adds nothing, the first one already
+reads the latest values when it runs. Keyed tasks are never dropped: if the
+queue is still full after the wait they are parked (one per key) and moved
+into the queue as workers free slots. Only unkeyed tasks are dropped and
+counted in ``stats()``.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Callable, Hashable, Optional
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+PUT_TIMEOUT_SECONDS = 1.0
+RETRY_BASE_DELAY_SECONDS = 0.5
+
+
+class PostCommitTask:
+    __slots__ = ("name", "run", "key", "attempts")
+
+    def __init__(self, name: str, run: Callable[[Session], None], key: Optional[Hashable] = None) -> None:
+        self.name = name
+        self.run = run
+        self.key = key
+        self.attempts = 0
+
+
+class PostCommitQueue:
+    def __init__(self) -> None:
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: list[asyncio.Task] = []
+        self._pending_keys: set = set()
+        self._parked: dict = {}  # key -> task waiting for a free slot
+        self.completed = 0
+        self.retried = 0
+        self.failed = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+    @property
+    def is_running(self) -> bool:
+        return bool(self._workers)
+
+    def stats(self) -> dict:
+        return {
+            "running": self.is_running,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "parked": len(self._parked),
+            "max_size": settings.AUTOMATION_POST_COMMIT_QUEUE_SIZE,
+            "completed": self.completed,
+            "retried": self.retried,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+        }
+
+    async def start(self) -> None:
+        if self.is_running:
+            return
+        self._queue = asyncio.Queue(maxsize=max(1, settings.AUTOMATION_POST_COMMIT_QUEUE_SIZE))
+        self._pending_keys.clear()
+        self._parked.clear()
+        self._workers = [
+            asyncio.create_task(self._worker())
+            for _ in range(max(1, settings.AUTOMATION_POST_COMMIT_WORKERS))
+        ]
+
+    async def stop(self) -> None:
+        """Finish queued tasks and stop the workers."""
+        if not self.is_running:
+            return
+        await self._queue.join()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def submit(self, task: PostCommitTask, db: Optional[Session] = None) -> None:
+        """Queue ``task``. Without running workers it runs inline in ``db`` (scripts, tests)."""
+        if not self.is_running:
+            if db is not None:
+                try:
+                    task.run(db)
+                    db.commit()
+                    self.completed += 1
+                except Exception as e:
+                    # The request's own data is already committed
+                    db.rollback()
+                    self.failed += 1
+                    logger.error("Post-commit task %s failed: %s", task.name, e)
+            return
+        if task.key is not None:
+            if task.key in self._pending_keys:
+                self.coalesced += 1
+                return
+            self._pending_keys.add(task.key)
+        try:
+            await asyncio.wait_for(self._queue.put(task), timeout=PUT_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            if task.key is not None:
+                # Cross-channel fan-out must not be lost: park it, it stays coalesced by its key
+                self._parked[task.key] = task
+                return
+            self.dropped += 1
+            logger.warning("Post-commit queue full, dropped %s", task.name)
+
+    def _unpark(self) -> None:
+        while self._parked and not self._queue.full():
+            key = next(iter(self._parked))
+            self._queue.put_nowait(self._parked.pop(key))
+
+    async def _worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            task = await self._queue.get()
+            # Allow a new task with the same key as soon as this one starts
+            self._pending_keys.discard(task.key)
+            self._unpark()
+            try:
+                while True:
+                    task.attempts += 1
+                    try:
+                        await loop.run_in_executor(None, self._execute, task)
+                        self.completed += 1
+                        break
+                    except Exception as e:
+                        if task.attempts > settings.AUTOMATION_POST_COMMIT_RETRIES:
+                            self.failed += 1
+                            logger.error("Post-commit task %s failed: %s", task.name, e)
+                            break
+                        self.retried += 1
+                        await asyncio.sleep(RETRY_BASE_DELAY_SECONDS * 2 ** (task.attempts - 1))
+            finally:
+                self._queue.task_done()
+
+    @staticmethod
+    def _execute(task: PostCommitTask) -> None:
+        db = SessionLocal()
+        try:
+            task.run(db)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+post_commit_queue = PostCommitQueue()
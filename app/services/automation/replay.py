@@ -0,0 +1,369 @@
+"""Replay (backfill) of condition and math rules over a channel's history.
+
+Feeds are streamed in id order in chunks of plain column rows. With NumPy
+available each chunk becomes one float array per field and every rule is
+applied to the whole chunk at once; without it the compiled per-feed steps
+run row by row. Changed rows are written back with one bulk UPDATE per
+chunk. PID rules depend on the order and timing of live samples, and rules
+triggered by another channel read that channel's value at the time of the
+write; neither is replayed.
+
+Job progress lives in automation_replay_jobs so any worker can answer a
+poll, and one replay per channel is enforced with a service lease that the
+running worker renews after every chunk.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Callable, Optional
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models.automation_replay_job import AutomationReplayJob
+from app.models.automation_rule import AutomationRule
+from app.models.feed import Feed
+from app.services import lease_service
+from .compiler import OPERATORS, _trigger_channel, compile_rule, load_active_rules
+from .expression import FIELD_NAMES, ExpressionError, compile_expression, compile_vector_function
+
+try:  # optional: row-by-row fallback without it
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+logger = logging.getLogger(__name__)
+
+REPLAY_CHUNK_SIZE = 5000
+REPLAY_RULE_TYPES = ("condition", "math")
+# Runs renew the channel lease after every chunk
+REPLAY_LEASE_TTL_SECONDS = 300
+FINISHED_JOB_RETENTION_DAYS = 7
+
+
+class ReplayJob:
+    def __init__(self, channel_id: int, dry_run: bool) -> None:
+        self.id = uuid.uuid4().hex[:12]
+        self.channel_id = channel_id
+        self.dry_run = dry_run
+        self.status = "running"
+        self.total = 0
+        self.processed = 0
+        self.changed_rows = 0
+        self.changed_values: dict[str, int] = {}
+        self.skipped_rules: list[str] = []
+        self.vectorized = np is not None
+        self.error: Optional[str] = None
+        self.started_at = datetime.utcnow()
+        self.finished_at: Optional[datetime] = None
+
+    @classmethod
+    def from_row(cls, row: AutomationReplayJob) -> "ReplayJob":
+        job = cls(row.channel_id, row.dry_run)
+        job.id = row.id
+        job.status = row.status
+        job.total = row.total
+        job.processed = row.processed
+        job.changed_rows = row.changed_rows
+        job.changed_values = json.loads(row.changed_values or "{}")
+        job.skipped_rules = json.loads(row.skipped_rules or "[]")
+        job.vectorized = row.vectorized
+        job.error = row.error
+        job.started_at = row.started_at
+        job.finished_at = row.finished_at
+        return job
+
+    def save(self, db: Session) -> None:
+        """Write the job's progress to its row. Commits the session."""
+        db.merge(AutomationReplayJob(
+            id=self.id,
+            channel_id=self.channel_id,
+            dry_run=self.dry_run,
+            status=self.status,
+            total=self.total,
+            processed=self.processed,
+            changed_rows=self.changed_rows,
+            changed_values=json.dumps(self.changed_values),
+            skipped_rules=json.dumps(self.skipped_rules),
+            vectorized=self.vectorized,
+            error=self.error,
+            started_at=self.started_at,
+            finished_at=self.finished_at,
+        ))
+        db.commit()
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "channel_id": self.channel_id,
+            "dry_run": self.dry_run,
+            "status": self.status,
+            "total": self.total,
+            "processed": self.processed,
+            "progress": round(self.processed / self.total, 4) if self.total else 1.0,
+            "changed_rows": self.changed_rows,
+            "changed_values": dict(self.changed_values),
+            "skipped_rules": list(self.skipped_rules),
+            "vectorized": self.vectorized,
+            "error": self.error,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+def _lease_name(channel_id: int) -> str:
+    return f"automation-replay:{channel_id}"
+
+
+def _lease_holder(job_id: str) -> str:
+    return f"{lease_service.WORKER_ID}:{job_id}"
+
+
+def get_job(db: Session, job_id: str) -> Optional[ReplayJob]:
+    """Job progress from the database, whichever worker runs it"""
+    row = db.query(AutomationReplayJob).filter(AutomationReplayJob.id == job_id).first()
+    if not row:
+        return None
+    job = ReplayJob.from_row(row)
+    if job.status == "running":
+        # The runner renews the channel lease every chunk; without it the worker is gone
+        holder = lease_service.current_holder(db, _lease_name(job.channel_id))
+        if not holder or not holder[0].endswith(f":{job.id}"):
+            job.status = "error"
+            job.error = "Replay worker stopped"
+    return job
+
+
+# --- vectorized steps ------------------------------------------------------
+
+def vector_step(rule: AutomationRule):
+    """Return (target_field, fn(columns)) or None if the rule cannot be replayed."""
+    if rule.rule_type == "condition":
+        trigger, target = rule.trigger_field, rule.target_field
+        test = OPERATORS.get(rule.condition)
+        threshold, value, action = rule.threshold_value, rule.action_value, rule.action_type
+        if trigger not in FIELD_NAMES or target not in FIELD_NAMES or test is None or threshold is None:
+            return None
+        if action == "set_value":
+            new_value = np.nan if value is None else float(value)
+        elif action in ("increment", "decrement") and value is not None:
+            delta = float(value) if action == "increment" else -float(value)
+        else:
+            return None
+
+        def apply(columns):
+            trigger_values = columns[trigger]
+            with np.errstate(invalid="ignore"):
+                mask = ~np.isnan(trigger_values) & test(trigger_values, threshold)
+            if action == "set_value":
+                columns[target] = np.where(mask, new_value, columns[target])
+            else:
+                columns[target] = np.where(mask, np.nan_to_num(columns[target], nan=0.0) + delta, columns[target])
+
+        return target, apply
+
+    if rule.rule_type == "math" and rule.expression:
+        try:
+            expression = compile_expression(rule.expression)
+        except ExpressionError:
+            return None
+        function = compile_vector_function(expression, np)
+        target = expression.target_field
+
+        def apply(columns):
+            args = [np.nan_to_num(columns[name], nan=0.0) for name in expression.fields]
+            with np.errstate(all="ignore"):
+                result = np.broadcast_to(np.asarray(function(*args), dtype=float), columns[target].shape)
+                result = np.round(result, 2)
+            # Failed evaluations (x/0, sqrt(-1), overflow) leave the field unchanged like live rules
+            columns[target] = np.where(np.isfinite(result), result, columns[target])
+
+        return target, apply
+
+    return None
+
+
+def _replay_chunk_vectorized(rows, steps) -> tuple[list[int], dict[str, "np.ndarray"], dict[str, "np.ndarray"]]:
+    ids = [row.id for row in rows]
+    columns = {
+        name: np.array([getattr(row, name) for row in rows], dtype=float)
+        for name in FIELD_NAMES
+    }
+    original = {name: values.copy() for name, values in columns.items()}
+    for _, apply in steps:
+        apply(columns)
+    return ids, original, columns
+
+
+def _replay_chunk_rows(rows, steps) -> tuple[list[int], dict[str, list], dict[str, list]]:
+    ids = [row.id for row in rows]
+    original = {name: [getattr(row, name) for row in rows] for name in FIELD_NAMES}
+    result = {name: [] for name in FIELD_NAMES}
+    for row in rows:
+        feed = SimpleNamespace(**{name: getattr(row, name) for name in FIELD_NAMES})
+        for step in steps:
+            try:
+                step.execute(feed, None)
+            except Exception:
+                pass
+        for name in FIELD_NAMES:
+            result[name].append(getattr(feed, name))
+    return ids, original, result
+
+
+def _is_nan(value) -> bool:
+    return value is None or value != value
+
+
+def _changed(old, new) -> bool:
+    if _is_nan(old) and _is_nan(new):
+        return False
+    return _is_nan(old) or _is_nan(new) or old != new
+
+
+def _as_db_value(value) -> Optional[float]:
+    return None if _is_nan(value) else float(value)
+
+
+# --- job -------------------------------------------------------------------
+
+def run_replay(
+    db: Session,
+    job: ReplayJob,
+    rules: list[AutomationRule],
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    chunk_size: int = REPLAY_CHUNK_SIZE,
+    on_progress: Optional[Callable[[ReplayJob], None]] = None,
+) -> ReplayJob:
+    """Replay ``rules`` (in order) over the channel's feeds and update ``job``.
+
+    ``on_progress`` is called after the count and after every chunk.
+    """
+    steps = []
+    for rule in rules:
+        if rule.rule_type not in REPLAY_RULE_TYPES or _trigger_channel(rule) is not None:
+            job.skipped_rules.append(rule.name)
+            continue
+        step = vector_step(rule) if job.vectorized else compile_rule(rule)
+        if step is None:
+            job.skipped_rules.append(rule.name)
+        else:
+            steps.append(step)
+    outputs = sorted({step[0] if job.vectorized else step.target_field for step in steps})
+
+    base = db.query(Feed.id).filter(Feed.channel_id == job.channel_id)
+    if start is not None:
+        base = base.filter(Feed.created_at >= start)
+    if end is not None:
+        base = base.filter(Feed.created_at <= end)
+    job.total = base.count()
+    if on_progress:
+        on_progress(job)
+
+    columns = [Feed.id] + [getattr(Feed, name) for name in FIELD_NAMES]
+    last_id = 0
+    while steps:
+        query = db.query(*columns).filter(Feed.channel_id == job.channel_id, Feed.id > last_id)
+        if start is not None:
+            query = query.filter(Feed.created_at >= start)
+        if end is not None:
+            query = query.filter(Feed.created_at <= end)
+        rows = query.order_by(Feed.id).limit(chunk_size).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        if job.vectorized:
+            ids, original, result = _replay_chunk_vectorized(rows, steps)
+        else:
+            ids, original, result = _replay_chunk_rows(rows, steps)
+
+        updates = []
+        for i, feed_id in enumerate(ids):
+            row_changed = False
+            for name in outputs:
+                if _changed(original[name][i], result[name][i]):
+                    job.changed_values[name] = job.changed_values.get(name, 0) + 1
+                    row_changed = True
+            if row_changed:
+                updates.append({"id": feed_id, **{name: _as_db_value(result[name][i]) for name in outputs}})
+        job.changed_rows += len(updates)
+
+        if updates and not job.dry_run:
+            db.execute(update(Feed), updates)
+            db.commit()
+        job.processed += len(rows)
+        if on_progress:
+            on_progress(job)
+
+    if not steps:
+        job.processed = job.total
+    job.status = "done"
+    job.finished_at = datetime.utcnow()
+    return job
+
+
+def _select_rules(db: Session, channel_id: int, rule_ids: Optional[list[int]]) -> list[AutomationRule]:
+    if not rule_ids:
+        return load_active_rules(db, channel_id)
+    return db.query(AutomationRule).filter(
+        AutomationRule.channel_id == channel_id,
+        AutomationRule.id.in_(rule_ids),
+    ).order_by(AutomationRule.priority.asc(), AutomationRule.id.asc()).all()
+
+
+def start_replay(
+    db: Session,
+    channel_id: int,
+    dry_run: bool = True,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    rule_ids: Optional[list[int]] = None,
+) -> Optional[ReplayJob]:
+    """Start a replay in a background thread and return its job for polling.
+
+    Returns None when a replay of the channel is already running in any worker.
+    """
+    job = ReplayJob(channel_id, dry_run)
+    lease, holder = _lease_name(channel_id), _lease_holder(job.id)
+    if not lease_service.try_acquire(db, lease, REPLAY_LEASE_TTL_SECONDS, holder=holder):
+        return None
+    db.query(AutomationReplayJob).filter(
+        AutomationReplayJob.finished_at < datetime.utcnow() - timedelta(days=FINISHED_JOB_RETENTION_DAYS)
+    ).delete(synchronize_session=False)
+    job.save(db)
+
+    def worker():
+        session = SessionLocal()
+
+        def checkpoint(job: ReplayJob) -> None:
+            job.save(session)
+            if not lease_service.try_acquire(session, lease, REPLAY_LEASE_TTL_SECONDS, holder=holder):
+                raise RuntimeError("Replay lease lost")
+
+        try:
+            run_replay(session, job, _select_rules(session, channel_id, rule_ids), start, end,
+                       on_progress=checkpoint)
+        except Exception as e:
+            session.rollback()
+            job.status = "error"
+            job.error = str(e)
+            job.finished_at = datetime.utcnow()
+        finally:
+            try:
+                job.save(session)
+                lease_service.release(session, lease, holder=holder)
+            except Exception as e:
+                session.rollback()
+                logger.warning("Failed to finish replay job %s: %s", job.id, e)
+            session.close()
+
+    threading.Thread(target=worker, name=f"automation-replay-{job.id}", daemon=True).start()
+    return job
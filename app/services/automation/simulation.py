@@ -0,0 +1,301 @@
+"""In-memory simulation of automation rules over a batch of samples.
+
+Used to tune rules (PID gains in the first place) before saving them: saved
+or draft rules run over given samples or a copy of the channel's stored
+feeds, and nothing is written to the database or to the live rule state
+(PID integrals, window buffers, metrics).
+
+Each rule is applied to the whole series in priority order. This gives the
+same result as running the rules feed by feed, because a rule only sees the
+fields of the current sample and its own state. With NumPy, condition, math
+and PID rules are computed on arrays; windowed rules (and all rules without
+NumPy) run their compiled per-sample steps. Cross-channel rules read the
+trigger field from the samples.
+"""
+from __future__ import annotations
+
+import time
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Optional, Sequence
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.feed import Feed
+from .compiler import compile_rule
+from .expression import FIELD_NAMES
+from .pid_state import PID_MAX_DT_SECONDS, datetime_ts, pid_step
+from .replay import vector_step
+from .windows import WINDOW_RULE_TYPES, WindowSpec
+
+try:  # optional: per-sample fallback without it
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+# Rule columns copied into the in-memory snapshot of a saved rule
+RULE_ATTRIBUTES = (
+    "name", "rule_type", "priority", "trigger_field", "condition", "threshold_value",
+    "target_field", "action_type", "action_value", "pid_setpoint", "pid_kp", "pid_ki",
+    "pid_kd", "pid_output_min", "pid_output_max", "expression", "window_seconds",
+    "ewma_alpha", "threshold_low",
+)
+
+
+class SimulationError(ValueError):
+    pass
+
+
+class SimulationInput:
+    """Samples as columns: epoch seconds and one value list per field (None: empty field)."""
+
+    def __init__(self, timestamps: Sequence[float], fields: dict[str, Sequence[Optional[float]]],
+                 start: Optional[datetime] = None) -> None:
+        self.timestamps = list(timestamps)
+        # Columns without any value stay None instead of lists of None
+        self.fields = {
+            name: list(values) if values and any(v is not None for v in values) else None
+            for name, values in ((name, fields.get(name)) for name in FIELD_NAMES)
+        }
+        self.start = start
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+
+def rule_snapshot(rule, channel_id: int) -> SimpleNamespace:
+    """Detached copy of a saved rule (ORM object) or a draft (schema), trigger read locally."""
+    values = {name: getattr(rule, name, None) for name in RULE_ATTRIBUTES}
+    return SimpleNamespace(id=getattr(rule, "id", None), channel_id=channel_id, trigger_channel_id=None, **values)
+
+
+def input_from_samples(
+    timestamps: Optional[list[datetime]],
+    fields: dict[str, Optional[list[Optional[float]]]],
+    interval_seconds: float = 1.0,
+) -> SimulationInput:
+    """Columns given in the request; without timestamps samples are ``interval_seconds`` apart."""
+    lengths = {len(values) for values in fields.values() if values is not None}
+    if timestamps is not None:
+        lengths.add(len(timestamps))
+    if len(lengths) > 1:
+        raise SimulationError("All sample columns must have the same length")
+    count = lengths.pop() if lengths else 0
+    _check_size(count)
+    if timestamps is not None:
+        return SimulationInput([datetime_ts(t) for t in timestamps], fields, timestamps[0] if timestamps else None)
+    if interval_seconds <= 0:
+        raise SimulationError("interval_seconds must be positive")
+    return SimulationInput([i * interval_seconds for i in range(count)], fields)
+
+
+def input_from_feeds(
+    db: Session,
+    channel_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> SimulationInput:
+    """The channel's stored feeds in [start, end], the latest AUTOMATION_SIMULATION_MAX_POINTS of them."""
+    query = db.query(Feed.created_at, *[getattr(Feed, name) for name in FIELD_NAMES]).filter(
+        Feed.channel_id == channel_id
+    )
+    if start is not None:
+        query = query.filter(Feed.created_at >= start)
+    if end is not None:
+        query = query.filter(Feed.created_at <= end)
+    rows = query.order_by(Feed.id.desc()).limit(settings.AUTOMATION_SIMULATION_MAX_POINTS).all()
+    rows.reverse()
+    fields = {name: [row[i + 1] for row in rows] for i, name in enumerate(FIELD_NAMES)}
+    return SimulationInput([datetime_ts(row.created_at) for row in rows], fields,
+                           rows[0].created_at if rows else None)
+
+
+def _check_size(count: int) -> None:
+    if count > settings.AUTOMATION_SIMULATION_MAX_POINTS:
+        raise SimulationError(
+            f"Too many samples: {count} > {settings.AUTOMATION_SIMULATION_MAX_POINTS}"
+        )
+
+
+# --- per-rule kernels ------------------------------------------------------
+
+def _pid_params(rule) -> Optional[tuple]:
+    if rule.trigger_field not in FIELD_NAMES or rule.target_field not in FIELD_NAMES or rule.pid_setpoint is None:
+        return None
+    low = rule.pid_output_min if rule.pid_output_min is not None else float("-inf")
+    high = rule.pid_output_max if rule.pid_output_max is not None else float("inf")
+    return (rule.trigger_field, rule.target_field, rule.pid_setpoint,
+            rule.pid_kp or 0.0, rule.pid_ki or 0.0, rule.pid_kd or 0.0, low, high)
+
+
+def _pid_vector(rule):
+    params = _pid_params(rule)
+    if params is None:
+        return None
+    trigger, target, setpoint, kp, ki, kd, low, high = params
+
+    def apply(columns, ts):
+        values = columns[trigger]
+        valid = ~np.isnan(values)
+        if not valid.any():
+            return
+        error = setpoint - values[valid]
+        # Same as pid_step: the first sample and non-increasing timestamps do not integrate
+        dt = np.diff(ts[valid], prepend=np.nan)
+        step = dt > 0
+        dt = np.minimum(np.where(step, dt, 1.0), PID_MAX_DT_SECONDS)
+        previous = np.concatenate(([0.0], error[:-1]))
+        integral = np.cumsum(np.where(step, error * dt, 0.0))
+        derivative = np.where(step, (error - previous) / dt, 0.0)
+        output = np.clip(kp * error + ki * integral + kd * derivative, low, high)
+        result = columns[target].copy()
+        result[valid] = np.round(output, 2)
+        columns[target] = result
+
+    return target, apply
+
+
+def _pid_rows(rule):
+    params = _pid_params(rule)
+    if params is None:
+        return None
+    trigger, target, setpoint, kp, ki, kd, low, high = params
+
+    def apply(rows, ts):
+        integral, last_error, last_ts = 0.0, None, None
+        for row, sample_ts in zip(rows, ts):
+            current = getattr(row, trigger)
+            if current is None:
+                continue
+            error = setpoint - current
+            increment, derivative, _ = pid_step(integral, last_error, last_ts, error, sample_ts)
+            integral += increment
+            last_error, last_ts = error, sample_ts
+            output = kp * error + ki * integral + kd * derivative
+            setattr(row, target, round(max(low, min(high, output)), 2))
+
+    return target, apply
+
+
+def _window_outputs(spec: WindowSpec, values, ts) -> list[Optional[float]]:
+    state = spec.new_state()
+    outputs = []
+    for value, sample_ts in zip(values, ts):
+        if value is None or value != value:
+            outputs.append(None)
+        else:
+            output = state.add(sample_ts, value)
+            outputs.append(None if output is None else round(output, 2))
+    return outputs
+
+
+def _window_vector(rule):
+    spec = WindowSpec.from_rule(rule)
+    if spec is None:
+        return None
+    target = rule.target_field
+
+    def apply(columns, ts):
+        outputs = _window_outputs(spec, columns[spec.field].tolist(), ts.tolist())
+        result = np.array([np.nan if v is None else v for v in outputs], dtype=float)
+        columns[target] = np.where(np.isnan(result), columns[target], result)
+
+    return target, apply
+
+
+def _window_rows(rule):
+    spec = WindowSpec.from_rule(rule)
+    if spec is None:
+        return None
+    target = rule.target_field
+
+    def apply(rows, ts):
+        outputs = _window_outputs(spec, [getattr(row, spec.field) for row in rows], ts)
+        for row, output in zip(rows, outputs):
+            if output is not None:
+                setattr(row, target, output)
+
+    return target, apply
+
+
+def _vector_kernel(rule):
+    if rule.rule_type == "pid":
+        return _pid_vector(rule)
+    if rule.rule_type in WINDOW_RULE_TYPES:
+        return _window_vector(rule)
+    step = vector_step(rule)
+    if step is None:
+        return None
+    target, apply = step
+    return target, lambda columns, ts: apply(columns)
+
+
+def _row_kernel(rule):
+    if rule.rule_type == "pid":
+        return _pid_rows(rule)
+    if rule.rule_type in WINDOW_RULE_TYPES:
+        return _window_rows(rule)
+    step = compile_rule(rule)
+    if step is None:
+        return None
+
+    def apply(rows, ts):
+        for row in rows:
+            try:
+                step.execute(row, None)
+            except Exception:
+                pass  # like a failing live rule: the field stays unchanged
+
+    return step.target_field, apply
+
+
+# --- run -------------------------------------------------------------------
+
+def _series(values) -> list[Optional[float]]:
+    return [None if v is None or v != v else v for v in values]
+
+
+def simulate(rules: list, data: SimulationInput) -> dict:
+    """Run rule snapshots (in order) over ``data``; returns the resulting series."""
+    started = time.perf_counter()
+    vectorized = np is not None
+    kernels, outputs, skipped = [], set(), []
+    for rule in rules:
+        kernel = _vector_kernel(rule) if vectorized else _row_kernel(rule)
+        if kernel is None:
+            skipped.append(rule.name)
+        else:
+            outputs.add(kernel[0])
+            kernels.append(kernel[1])
+
+    count = len(data)
+    if vectorized:
+        ts = np.asarray(data.timestamps, dtype=float)
+        columns = {
+            name: np.full(count, np.nan) if values is None else np.array(values, dtype=float)
+            for name, values in data.fields.items()
+        }
+        for kernel in kernels:
+            kernel(columns, ts)
+        fields = {name: _series(values.tolist()) for name, values in columns.items() if not np.isnan(values).all()}
+    else:
+        empty = [None] * count
+        rows = [SimpleNamespace(**dict(zip(FIELD_NAMES, values)))
+                for values in zip(*[data.fields[name] or empty for name in FIELD_NAMES])]
+        for kernel in kernels:
+            kernel(rows, data.timestamps)
+        fields = {name: [getattr(row, name) for row in rows] for name in FIELD_NAMES}
+        fields = {name: values for name, values in fields.items() if any(v is not None for v in values)}
+
+    origin = data.timestamps[0] if data.timestamps else 0.0
+    return {
+        "points": len(data),
+        "start": data.start,
+        "offsets": [round(t - origin, 3) for t in data.timestamps],
+        "fields": fields,
+        "outputs": sorted(outputs),
+        "skipped_rules": skipped,
+        "vectorized": vectorized,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
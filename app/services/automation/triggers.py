@@ -0,0 +1,189 @@
+"""Cross-channel triggers: last-value index and channel dependency graph.
+
+A rule with ``trigger_channel_id`` reads its trigger field from another
+channel. The latest values of such source channels are kept in memory
+(:data:`last_values`), updated by every write that passes through the
+automation engine of this worker and reloaded from ``feeds`` at most once
+per AUTOMATION_LAST_VALUE_TTL to pick up writes of other workers.
+
+The edges ``source channel -> dependent channel`` form the dependency graph.
+Rules that would close a cycle are rejected when saved, and a write fires the
+dependent channels in topological order (see ``AutomationEngine``).
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.automation_rule import AutomationRule
+from app.models.feed import Feed
+from .expression import FIELD_NAMES
+
+# Rows scanned for the latest non-empty value of every field
+LAST_VALUE_LOOKBACK_ROWS = 50
+
+
+class LastValueIndex:
+    """Latest non-empty value of every field per channel."""
+
+    def __init__(self) -> None:
+        # channel_id -> (values, monotonic time of the last DB load)
+        self._values: dict[int, tuple[dict[str, float], float]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, channel_id: int, field: str) -> Optional[float]:
+        return self.values(db, channel_id).get(field)
+
+    def values(self, db: Session, channel_id: int) -> dict[str, float]:
+        item = self._values.get(channel_id)
+        if item is None or time.monotonic() - item[1] >= settings.AUTOMATION_LAST_VALUE_TTL:
+            item = self._load(db, channel_id)
+        return item[0]
+
+    def record(self, channel_id: int, feed) -> None:
+        """Merge a new write. Channels not loaded yet are read from the DB on first use."""
+        with self._lock:
+            item = self._values.get(channel_id)
+            if item is None:
+                return
+            values = dict(item[0])
+            for name in FIELD_NAMES:
+                value = getattr(feed, name, None)
+                if value is not None:
+                    values[name] = value
+            self._values[channel_id] = (values, item[1])
+
+    def forget(self, channel_id: Optional[int] = None) -> None:
+        with self._lock:
+            if channel_id is None:
+                self._values.clear()
+            else:
+                self._values.pop(channel_id, None)
+
+    def _load(self, db: Session, channel_id: int) -> tuple[dict[str, float], float]:
+        rows = db.query(*[getattr(Feed, name) for name in FIELD_NAMES]).filter(
+            Feed.channel_id == channel_id
+        ).order_by(Feed.id.desc()).limit(LAST_VALUE_LOOKBACK_ROWS).all()
+        values: dict[str, float] = {}
+        for row in rows:
+            for name, value in zip(FIELD_NAMES, row):
+                if value is not None and name not in values:
+                    values[name] = value
+            if len(values) == len(FIELD_NAMES):
+                break
+        item = (values, time.monotonic())
+        with self._lock:
+            self._values[channel_id] = item
+        return item
+
+
+def load_edges(db: Session) -> dict[int, set[int]]:
+    """source channel -> channels with active rules triggered by it."""
+    rows = db.query(AutomationRule.trigger_channel_id, AutomationRule.channel_id).filter(
+        AutomationRule.trigger_channel_id != None,
+        AutomationRule.trigger_channel_id != AutomationRule.channel_id,
+        AutomationRule.is_active == True,
+    ).distinct().all()
+    edges: dict[int, set[int]] = {}
+    for source, dependent in rows:
+        edges.setdefault(source, set()).add(dependent)
+    return edges
+
+
+def find_cycle(edges: dict[int, set[int]], source: int, dependent: int) -> Optional[list[int]]:
+    """Cycle closed by a new edge ``source -> dependent`` as a channel path, or None."""
+    if source == dependent:
+        return None
+    previous: dict[int, int] = {dependent: dependent}
+    queue = deque([dependent])
+    while queue:
+        node = queue.popleft()
+        if node == source:
+            path = [source]
+            while node != dependent:
+                node = previous[node]
+                path.append(node)
+            return [source] + path[::-1]
+        for nxt in edges.get(node, ()):
+            if nxt not in previous:
+                previous[nxt] = node
+                queue.append(nxt)
+    return None
+
+
+def propagation_order(edges: dict[int, set[int]], channel_id: int) -> list[int]:
+    """Channels reachable from ``channel_id`` in topological order.
+
+    Channels caught in a cycle (possible only if rules were written around
+    the validation) are left out.
+    """
+    reachable = {channel_id}
+    stack = [channel_id]
+    while stack:
+        for nxt in edges.get(stack.pop(), ()):
+            if nxt not in reachable:
+                reachable.add(nxt)
+                stack.append(nxt)
+    indegree = {node: 0 for node in reachable}
+    for node in reachable:
+        for nxt in edges.get(node, ()):
+            indegree[nxt] += 1
+    queue = deque(sorted(node for node, degree in indegree.items() if degree == 0))
+    order = []
+    while queue:
+        node = queue.popleft()
+        order.append(node)
+        for nxt in sorted(edges.get(node, ())):
+            indegree[nxt] -= 1
+            if indegree[nxt] == 0:
+                queue.append(nxt)
+    return [node for node in order if node != channel_id]
+
+
+class DependencyGraph:
+    """Per-process cache of the channel dependency graph."""
+
+    def __init__(self) -> None:
+        self._edges: Optional[dict[int, set[int]]] = None
+        self._orders: dict[int, list[int]] = {}
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    def edges(self, db: Session) -> dict[int, set[int]]:
+        edges = self._edges
+        if edges is not None and time.monotonic() - self._loaded_at < settings.AUTOMATION_PLAN_CACHE_TTL:
+            return edges
+        generation = self._generation
+        edges = load_edges(db)
+        with self._lock:
+            if generation == self._generation:
+                self._edges, self._orders, self._loaded_at = edges, {}, time.monotonic()
+        return edges
+
+    def dependents(self, db: Session, channel_id: int) -> list[int]:
+        """Channels to fire after a write to ``channel_id``, in order."""
+        edges = self.edges(db)
+        if channel_id not in edges:
+            return []
+        order = self._orders.get(channel_id)
+        if order is None:
+            order = propagation_order(edges, channel_id)
+            if edges is self._edges:
+                self._orders[channel_id] = order
+        return order
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._edges = None
+            self._orders = {}
+
+
+last_values = LastValueIndex()
+dependency_graph = DependencyGraph()
@@ -0,0 +1,307 @@
+"""Stateful (windowed) automation rules.
+
+Rule types: ``moving_average``, ``window_min``, ``window_max`` and
+``derivative`` over the last ``window_seconds`` of the trigger field,
+``ewma`` with smoothing factor ``ewma_alpha`` and ``hysteresis`` between
+``threshold_low`` and ``threshold_value``. The result goes to
+``target_field``, so ordinary condition rules can act on it.
+
+Samples live in per-rule ring buffers in memory. A buffer is rebuilt from
+recent feeds once (at startup or on first use). When the channel's entry_id
+sequence shows writes this worker has not seen (another worker ingested
+them), only the missed rows are fetched and appended; feeds are never
+queried per feed otherwise.
+
+A cross-channel rule (``trigger_channel_id``) samples the source channel's
+feeds only, live and on rebuild alike: every evaluation appends the source
+rows past the last seen source entry_id, and evaluations that find none
+(e.g. the dependent channel's own writes) leave the output unchanged.
+"""
+from __future__ import annotations
+
+import threading
+from array import array
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.automation_rule import AutomationRule
+from app.models.feed import Feed
+from .expression import FIELD_NAMES
+from .pid_state import datetime_ts, feed_timestamp
+
+WINDOW_RULE_TYPES = ("moving_average", "window_min", "window_max", "derivative", "ewma", "hysteresis")
+_BUFFERED_TYPES = ("moving_average", "window_min", "window_max", "derivative")
+
+
+class RingBuffer:
+    """Fixed-capacity ring of (timestamp, value) on two float arrays, with a running sum."""
+
+    __slots__ = ("_ts", "_values", "_start", "_size", "total")
+
+    def __init__(self, capacity: int) -> None:
+        self._ts = array("d", bytes(8 * capacity))
+        self._values = array("d", bytes(8 * capacity))
+        self._start = 0
+        self._size = 0
+        self.total = 0.0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, ts: float, value: float) -> None:
+        capacity = len(self._values)
+        if self._size == capacity:
+            self.popleft()
+        i = (self._start + self._size) % capacity
+        self._ts[i] = ts
+        self._values[i] = value
+        self._size += 1
+        self.total += value
+
+    def popleft(self) -> None:
+        self.total -= self._values[self._start]
+        self._start = (self._start + 1) % len(self._values)
+        self._size -= 1
+        if not self._size:
+            self.total = 0.0  # drop accumulated rounding error
+
+    def oldest(self) -> tuple[float, float]:
+        return self._ts[self._start], self._values[self._start]
+
+    def evict_before(self, cutoff: float) -> None:
+        while self._size and self._ts[self._start] < cutoff:
+            self.popleft()
+
+    def values(self):
+        capacity = len(self._values)
+        for k in range(self._size):
+            yield self._values[(self._start + k) % capacity]
+
+
+class WindowSpec:
+    """Parameters of one windowed rule, resolved at compile time."""
+
+    __slots__ = ("rule_id", "rule_type", "channel_id", "field", "window_seconds",
+                 "alpha", "high", "low", "on_value", "cross_channel", "key")
+
+    def __init__(self, rule: AutomationRule, source_channel_id: int) -> None:
+        self.rule_id = rule.id
+        self.rule_type = rule.rule_type
+        self.channel_id = source_channel_id
+        self.field = rule.trigger_field
+        self.window_seconds = rule.window_seconds
+        self.alpha = rule.ewma_alpha
+        self.high = rule.threshold_value
+        self.low = rule.threshold_low
+        self.on_value = rule.action_value if rule.action_value is not None else 1.0
+        self.cross_channel = source_channel_id != rule.channel_id
+        # States built for other parameters (rule edited on another worker) are rebuilt
+        self.key = (self.rule_type, self.channel_id, self.field, self.window_seconds,
+                    self.alpha, self.high, self.low, self.on_value)
+
+    @classmethod
+    def from_rule(cls, rule: AutomationRule) -> Optional["WindowSpec"]:
+        """None if the rule is not a windowed rule or misses its parameters."""
+        if rule.rule_type not in WINDOW_RULE_TYPES:
+            return None
+        if rule.trigger_field not in FIELD_NAMES or rule.target_field not in FIELD_NAMES:
+            return None
+        if window_rule_error(rule.rule_type, rule.window_seconds, rule.ewma_alpha,
+                             rule.threshold_value, rule.threshold_low):
+            return None
+        return cls(rule, rule.trigger_channel_id or rule.channel_id)
+
+    def new_state(self) -> "WindowState":
+        return WindowState(self)
+
+
+def window_rule_error(
+    rule_type: Optional[str],
+    window_seconds: Optional[int],
+    alpha: Optional[float],
+    high: Optional[float],
+    low: Optional[float],
+) -> Optional[str]:
+    """Why the parameters are invalid for ``rule_type``, or None."""
+    if rule_type in ("moving_average", "window_min", "window_max"):
+        if not window_seconds or window_seconds <= 0:
+            return "window_seconds must be positive"
+    elif rule_type == "derivative":
+        if window_seconds is not None and window_seconds <= 0:
+            return "window_seconds must be positive"
+    elif rule_type == "ewma":
+        if alpha is None or not 0 < alpha <= 1:
+            return "ewma_alpha must be in (0, 1]"
+    elif rule_type == "hysteresis":
+        if high is None or low is None or low > high:
+            return "threshold_low and threshold_value are required, threshold_low <= threshold_value"
+    return None
+
+
+class WindowState:
+    __slots__ = ("spec", "buffer", "ewma", "is_on", "last_entry_id", "output")
+
+    def __init__(self, spec: WindowSpec) -> None:
+        self.spec = spec
+        self.buffer: Optional[RingBuffer] = None
+        if spec.rule_type in _BUFFERED_TYPES:
+            # Without a window the derivative uses the previous sample only
+            capacity = settings.AUTOMATION_WINDOW_MAX_SAMPLES if spec.window_seconds else 2
+            self.buffer = RingBuffer(max(2, capacity))
+        self.ewma: Optional[float] = None
+        self.is_on: Optional[bool] = None
+        self.last_entry_id: Optional[int] = None
+        self.output: Optional[float] = None  # output after the latest sample
+
+    def add(self, ts: float, value: float) -> Optional[float]:
+        """Add a sample and return the rule output."""
+        self.output = self._add(ts, value)
+        return self.output
+
+    def _add(self, ts: float, value: float) -> Optional[float]:
+        spec = self.spec
+        rule_type = spec.rule_type
+        if rule_type == "ewma":
+            self.ewma = value if self.ewma is None else spec.alpha * value + (1 - spec.alpha) * self.ewma
+            return self.ewma
+        if rule_type == "hysteresis":
+            if value >= spec.high:
+                self.is_on = True
+            elif value <= spec.low or self.is_on is None:
+                self.is_on = False
+            return spec.on_value if self.is_on else 0.0
+
+        buffer = self.buffer
+        buffer.append(ts, value)
+        if spec.window_seconds:
+            buffer.evict_before(ts - spec.window_seconds)
+        if rule_type == "moving_average":
+            return buffer.total / len(buffer)
+        if rule_type == "window_min":
+            return min(buffer.values())
+        if rule_type == "window_max":
+            return max(buffer.values())
+        # derivative, per second
+        first_ts, first_value = buffer.oldest()
+        if ts <= first_ts:
+            return None
+        return (value - first_value) / (ts - first_ts)
+
+
+class WindowStateStore:
+    def __init__(self) -> None:
+        self._states: dict[int, WindowState] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, db: Session, spec: WindowSpec, feed, value: Optional[float]) -> Optional[float]:
+        """Account for a new feed and return the rule output (None: no output)."""
+        if spec.cross_channel:
+            return self._observe_source(db, spec)
+        entry_id = vars(feed).get("entry_id")
+        state = self._states.get(spec.rule_id)
+        if state is None or state.spec.key != spec.key:
+            state = self.rebuild(db, spec, exclude_feed_id=vars(feed).get("id"))
+        elif entry_id is not None and state.last_entry_id is not None and entry_id != state.last_entry_id + 1:
+            if not self._catch_up(db, state, entry_id):
+                state = self.rebuild(db, spec, exclude_feed_id=vars(feed).get("id"))
+        with self._lock:
+            if entry_id is not None:
+                state.last_entry_id = entry_id
+            if value is None:
+                return None
+            return state.add(feed_timestamp(feed), value)
+
+    def _observe_source(self, db: Session, spec: WindowSpec) -> Optional[float]:
+        """Append the source channel's new feeds; None if there were none."""
+        state = self._states.get(spec.rule_id)
+        if state is None or state.spec.key != spec.key:
+            return self.rebuild(db, spec).output
+        limit = max(2, settings.AUTOMATION_WINDOW_MAX_SAMPLES)
+        rows = (
+            db.query(Feed.entry_id, Feed.created_at, getattr(Feed, spec.field))
+            .filter(Feed.channel_id == spec.channel_id, Feed.entry_id > state.last_entry_id)
+            .order_by(Feed.entry_id)
+            .limit(limit + 1)
+            .all()
+        )
+        if len(rows) > limit:
+            return self.rebuild(db, spec).output
+        output = None
+        with self._lock:
+            for entry_id, created_at, value in rows:
+                state.last_entry_id = entry_id
+                if value is not None and created_at is not None:
+                    output = state.add(datetime_ts(created_at), value)
+        return output
+
+    def _catch_up(self, db: Session, state: WindowState, entry_id: int) -> bool:
+        """Append the rows between the last seen entry and ``entry_id``. False if a rebuild is needed."""
+        spec, last_entry_id = state.spec, state.last_entry_id
+        if entry_id <= last_entry_id:
+            return False  # sequence went back (channel cleared)
+        limit = max(2, settings.AUTOMATION_WINDOW_MAX_SAMPLES)
+        rows = (
+            db.query(Feed.created_at, getattr(Feed, spec.field))
+            .filter(Feed.channel_id == spec.channel_id, Feed.entry_id > last_entry_id, Feed.entry_id < entry_id)
+            .order_by(Feed.id)
+            .limit(limit + 1)
+            .all()
+        )
+        if len(rows) > limit:
+            return False  # the whole buffer would be replaced anyway
+        with self._lock:
+            for created_at, value in rows:
+                if value is not None and created_at is not None:
+                    state.add(datetime_ts(created_at), value)
+        return True
+
+    def rebuild(self, db: Session, spec: WindowSpec, exclude_feed_id: Optional[int] = None) -> WindowState:
+        """Refill the rule's state from the channel's recent feeds."""
+        column = getattr(Feed, spec.field)
+        query = db.query(Feed.entry_id, Feed.created_at, column).filter(Feed.channel_id == spec.channel_id)
+        if exclude_feed_id is not None:
+            # The feed being ingested is already flushed, it is added by the caller
+            query = query.filter(Feed.id != exclude_feed_id)
+        if spec.window_seconds:
+            query = query.filter(Feed.created_at >= datetime.utcnow() - timedelta(seconds=spec.window_seconds))
+        rows = query.order_by(Feed.id.desc()).limit(max(2, settings.AUTOMATION_WINDOW_MAX_SAMPLES)).all()
+
+        state = spec.new_state()
+        for entry_id, created_at, value in reversed(rows):
+            if value is not None and created_at is not None:
+                state.add(datetime_ts(created_at), value)
+        if rows:
+            state.last_entry_id = rows[0].entry_id
+        elif spec.cross_channel:
+            # Nothing inside the window: read the source from its current end
+            state.last_entry_id = db.query(func.max(Feed.entry_id)).filter(
+                Feed.channel_id == spec.channel_id).scalar() or 0
+        with self._lock:
+            self._states[spec.rule_id] = state
+        return state
+
+    def warm_up(self, db: Session) -> int:
+        """Rebuild the buffers of all active windowed rules. Returns their number."""
+        rules = db.query(AutomationRule).filter(
+            AutomationRule.rule_type.in_(WINDOW_RULE_TYPES),
+            AutomationRule.is_active == True,
+        ).all()
+        count = 0
+        for rule in rules:
+            spec = WindowSpec.from_rule(rule)
+            if spec is not None:
+                self.rebuild(db, spec)
+                count += 1
+        return count
+
+    def forget(self, rule_id: int) -> None:
+        """Drop the state (rule changed or deleted)."""
+        with self._lock:
+            self._states.pop(rule_id, None)
+
+
+window_state_store = WindowStateStore()
@@ -1,190 +1,126 @@
 """Automation engine for executing channel rules"""
+import time
+from functools import partial
+from types import SimpleNamespace
+
 from sqlalchemy.orm import Session
-from app.models.automation_rule import AutomationRule
 from app.models.feed import Feed
-import re
-import math
+from app.schemas.feed import FeedCreate
+from app.services.automation.compiler import plan_cache
+from app.services.automation.expression import FIELD_NAMES
+from app.services.automation.metrics import automation_metrics
+from app.services.automation.outputs import sticky_outputs
+from app.services.automation.post_commit import PostCommitTask, post_commit_queue
+from app.services.automation.triggers import dependency_graph, last_values
+
+
+# db.info key of writes waiting for the post-commit phase
+_PENDING_KEY = "automation_post_commit"
 
 
 class AutomationEngine:
-    """Execute automation rules for channels"""
-    
+    """Execute automation rules for channels
+
+    In-feed phase: ``execute_rules`` changes the feed before it is committed.
+    Post-commit phase: ``after_commit`` publishes the committed values (sticky
+    outputs, last-value index) and queues the rest (dependent channels) off
+    the request.
+    """
+
     def execute_rules(self, channel_id: int, feed: Feed, db: Session) -> Feed:
         """
         Execute all active rules for channel in priority order
         Returns modified feed with calculated fields
         """
-        rules = db.query(AutomationRule).filter(
-            AutomationRule.channel_id == channel_id,
-            AutomationRule.is_active == True
-        ).order_by(AutomationRule.priority.asc()).all()
-        
-        for rule in rules:
-            try:
-                feed = self._execute_rule(rule, feed, db)
-            except Exception as e:
-                print(f"Error executing rule {rule.id}: {e}")
-                # Continue with other rules
-        
-        return feed
-    
-    def _execute_rule(self, rule: AutomationRule, feed: Feed, db: Session) -> Feed:
-        """Execute single rule based on type"""
-        
-        if rule.rule_type == 'condition':
-            return self._execute_condition(rule, feed)
-        elif rule.rule_type == 'pid':
-            return self._execute_pid(rule, feed, db)
-        elif rule.rule_type == 'math':
-            return self._execute_math(rule, feed)
-        
-        return feed
-    
-    def _execute_condition(self, rule: AutomationRule, feed: Feed) -> Feed:
-        """Execute IF-THEN condition rule"""
-        if not rule.trigger_field or not rule.target_field:
-            return feed
-        
-        trigger_value = getattr(feed, rule.trigger_field, None)
-        if trigger_value is None:
-            return feed
-        
-        # Check condition
-        condition_met = False
-        
-        if rule.condition == '>':
-            condition_met = trigger_value > rule.threshold_value
-        elif rule.condition == '<':
-            condition_met = trigger_value < rule.threshold_value
-        elif rule.condition == '==':
-            condition_met = trigger_value == rule.threshold_value
-        elif rule.condition == '>=':
-            condition_met = trigger_value >= rule.threshold_value
-        elif rule.condition == '<=':
-            condition_met = trigger_value <= rule.threshold_value
-        elif rule.condition == '!=':
-            condition_met = trigger_value != rule.threshold_value
-        
-        # Execute action if condition met
-        if condition_met:
-            if rule.action_type == 'set_value':
-                setattr(feed, rule.target_field, rule.action_value)
-            
-            elif rule.action_type == 'increment':
-                current = getattr(feed, rule.target_field, None) or 0
-                setattr(feed, rule.target_field, current + rule.action_value)
-            
-            elif rule.action_type == 'decrement':
-                current = getattr(feed, rule.target_field, None) or 0
-                setattr(feed, rule.target_field, current - rule.action_value)
-        
-        return feed
-    
-    def _execute_pid(self, rule: AutomationRule, feed: Feed, db: Session) -> Feed:
-        """Execute PID controller"""
-        if not rule.trigger_field or not rule.target_field:
-            return feed
-        
-        # Get current value (process variable)
-        current_value = getattr(feed, rule.trigger_field, None)
-        if current_value is None:
-            return feed
-        
-        # Calculate error
-        error = rule.pid_setpoint - current_value
-        
-        # Proportional term
-        P = rule.pid_kp * error
-        
-        # Integral term
-        rule.pid_integral += error
-        I = rule.pid_ki * rule.pid_integral
-        
-        # Derivative term
-        D = rule.pid_kd * (error - rule.pid_last_error)
-        
-        # PID output
-        output = P + I + D
-        
-        # Limit output
-        output = max(rule.pid_output_min, min(rule.pid_output_max, output))
-        
-        # Write to target field
-        setattr(feed, rule.target_field, round(output, 2))
-        
-        # Save PID state
-        rule.pid_last_error = error
-        db.flush()  # Flush to save rule state without committing feed yet
-        
+        plan = plan_cache.get(db, channel_id)
+        self._run_steps(channel_id, plan.rules, feed, db)
+
+        has_dependents = bool(dependency_graph.dependents(db, channel_id))
+        if plan.output_fields or has_dependents:
+            values = {name: getattr(feed, name, None) for name in FIELD_NAMES}
+            entry_id = getattr(feed, "entry_id", None)
+            db.info.setdefault(_PENDING_KEY, []).append((channel_id, entry_id, values, has_dependents))
+
         return feed
-    
-    def _execute_math(self, rule: AutomationRule, feed: Feed) -> Feed:
-        """Execute mathematical expression"""
-        if not rule.expression:
-            return feed
-        
-        # Parse expression: "field2 = field1 * 2 + 10"
-        match = re.match(r'(\w+)\s*=\s*(.+)', rule.expression.strip())
-        if not match:
-            return feed
-        
-        target_field = match.group(1)
-        expression = match.group(2)
-        
-        # Build context with field values
-        context = {}
-        for i in range(1, 9):
-            field_name = f'field{i}'
-            field_value = getattr(feed, field_name, None)
-            context[field_name] = field_value if field_value is not None else 0
-        
-        # Add math functions
-        context.update({
-            'sqrt': math.sqrt,
-            'abs': abs,
-            'pow': pow,
-            'min': min,
-            'max': max,
-            'round': round,
-        })
-        
+
+    def preserve_output_fields(self, db: Session, channel, field_values: dict) -> dict:
+        """Keep last values of automation output fields the write leaves empty"""
+        return sticky_outputs.preserve(db, channel, field_values)
+
+    async def after_commit(self, db: Session) -> None:
+        """Post-commit phase for the feeds executed in ``db`` since the last call."""
+        pending = db.info.pop(_PENDING_KEY, None)
+        if not pending:
+            return
+        sources = {}
+        for channel_id, entry_id, values, has_dependents in pending:
+            sticky_outputs.record(channel_id, entry_id, values)
+            if has_dependents:
+                last_values.record(channel_id, SimpleNamespace(**values))
+                sources[channel_id] = True
+        for channel_id in sources:
+            task = PostCommitTask(
+                f"fire dependents of channel {channel_id}",
+                partial(self.fire_dependents, channel_id),
+                key=("fire", channel_id),
+            )
+            await post_commit_queue.submit(task, db)
+
+    def fire_dependents(self, channel_id: int, db: Session) -> None:
+        """Fire channels triggered by ``channel_id`` in topological order (one transaction)."""
+        dependents = dependency_graph.dependents(db, channel_id)
         try:
-            # Evaluate expression safely
-            result = self._safe_eval(expression, context)
-            
-            # Set target field
-            if result is not None and target_field.startswith('field'):
-                setattr(feed, target_field, round(result, 2))
-        
-        except Exception as e:
-            print(f"Error evaluating expression: {e}")
-        
-        return feed
-    
-    def _safe_eval(self, expression: str, context: dict) -> float:
-        """
-        Safely evaluate mathematical expression
-        Only allows basic math operations and whitelisted functions
+            for dependent_id in dependents:
+                self._fire(dependent_id, db)
+        except Exception:
+            # Values recorded for feeds that will be rolled back
+            for dependent_id in dependents:
+                last_values.forget(dependent_id)
+            raise
+
+    def _run_steps(self, channel_id: int, steps, feed, db: Session) -> None:
+        clock = time.perf_counter
+        for step in steps:
+            started = clock()
+            try:
+                fired = step.execute(feed, db)
+            except Exception as e:
+                automation_metrics.record_error(step, channel_id, clock() - started, e)
+                continue  # Continue with other rules
+            automation_metrics.record(step, channel_id, clock() - started, fired)
+
+    def _fire(self, channel_id: int, db: Session) -> None:
+        """Re-evaluate cross-channel rules of a dependent channel.
+
+        Only rules with a trigger channel run (local rules already ran on the
+        channel's own writes); a new feed is written only if an output changed.
         """
-        # Replace ^ with **
-        expression = expression.replace('^', '**')
-        
-        # Whitelist of allowed operations
-        allowed_names = {
-            'field1', 'field2', 'field3', 'field4',
-            'field5', 'field6', 'field7', 'field8',
-            'sqrt', 'abs', 'pow', 'min', 'max', 'round'
-        }
-        
-        # Simple validation - check that only allowed characters are used
-        if not re.match(r'^[a-zA-Z0-9\s\+\-\*\/\(\)\.,_]+$', expression):
-            raise ValueError("Invalid characters in expression")
-        
-        # Use eval with restricted context (not 100% safe but better than nothing)
-        # For production, consider using asteval library
-        result = eval(expression, {"__builtins__": {}}, context)
-        
-        return float(result)
+        from app.services import channel_service, feed_service
+
+        steps = [step for step in plan_cache.get(db, channel_id).rules if step.trigger_channel_id is not None]
+        if not steps:
+            return
+        current = last_values.values(db, channel_id)
+        state = SimpleNamespace(**{name: current.get(name) for name in FIELD_NAMES})
+        self._run_steps(channel_id, steps, state, db)
+
+        outputs = {step.target_field for step in steps if step.target_field}
+        if all(getattr(state, name) == current.get(name) for name in outputs):
+            return
+        channel = channel_service.get_channel(db, channel_id)
+        if not channel:
+            return
+        # Same shape as a control write: outputs set, other fields empty
+        feed_data = FeedCreate(**{name: getattr(state, name) if name in outputs else None for name in FIELD_NAMES})
+        feed = feed_service.create_feed(db, channel, feed_data, auto_commit=False)
+        last_values.record(channel_id, feed)
+        # If this transaction rolls back, channel.last_entry_id stays behind and the record is reloaded
+        sticky_outputs.record(channel_id, feed.entry_id, {name: getattr(feed, name) for name in FIELD_NAMES})
+
+    def invalidate(self, channel_id: int) -> None:
+        """Drop the compiled plan of a channel after its rules changed"""
+        plan_cache.invalidate(channel_id)
+        dependency_graph.invalidate()
 
 
 def get_output_fields(channel_id: int, db: Session) -> set:
@@ -192,20 +128,8 @@ def get_output_fields(channel_id: int, db: Session) -> set:
     Получить список выходных полей для канала
     Возвращает set полей (field1-field8), которые изменяются правилами автоматизации
     """
-    rules = db.query(AutomationRule).filter(
-        AutomationRule.channel_id == channel_id,
-        AutomationRule.is_active == True
-    ).all()
-    
-    output_fields = set()
-    for rule in rules:
-        if rule.target_field:
-            output_fields.add(rule.target_field)
-    
-    return output_fields
+    return set(plan_cache.get(db, channel_id).output_fields)
 
 
 # Singleton instance
 automation_engine = AutomationEngine()
-
-
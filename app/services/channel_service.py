@@ -1,4 +1,5 @@
 """Channel service"""
+import logging
 import secrets
 from typing import List, Optional
 from sqlalchemy.orm import Session
@@ -11,6 +12,8 @@ from app.models.user import User
 from app.schemas.channel import ChannelCreate, ChannelUpdate
 from app.config import settings
 
+logger = logging.getLogger(__name__)
+
 
 def generate_api_key() -> str:
     """Generate a random API key"""
@@ -92,8 +95,29 @@ def update_channel(
 
 def delete_channel(db: Session, channel: Channel) -> None:
     """Delete channel"""
+    from app.models.automation_rule import AutomationRule
+    from app.services.automation.windows import window_state_store
+    from app.services.automation_service import automation_engine
+    # Cross-channel rules of other channels (possibly other users') triggered by this one
+    # are kept but deactivated: their trigger source is gone
+    dependents = db.query(AutomationRule).filter(
+        AutomationRule.trigger_channel_id == channel.id,
+        AutomationRule.channel_id != channel.id,
+    ).all()
+    for rule in dependents:
+        rule.is_active = False
+        rule.trigger_channel_id = None
+        logger.warning(
+            "Rule %s of channel %s deactivated: trigger channel %s was deleted",
+            rule.id, rule.channel_id, channel.id,
+        )
+    db.flush()
     db.delete(channel)
     db.commit()
+    for rule in dependents:
+        window_state_store.forget(rule.id)
+    for channel_id in {rule.channel_id for rule in dependents}:
+        automation_engine.invalidate(channel_id)
 
 
 def get_channel_api_keys(db: Session, channel_id: int) -> List[ApiKey]:
@@ -2,9 +2,9 @@
 from __future__ import annotations
 
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, Iterable, Optional
 
-from sqlalchemy import func
+from sqlalchemy import case, func
 from sqlalchemy.orm import Session
 
 from app.models.feed import Feed
@@ -38,75 +38,86 @@ class ChannelStats:
         }
 
 
-def calculate_channel_stats(channel_id: int, db: Session) -> ChannelStats:
-    """Calculate statistics for a channel.
+def _seconds_between(later, earlier, dialect: str):
+    """SQL expression for ``later - earlier`` in seconds (millisecond precision on SQLite)"""
+    if dialect == "sqlite":
+        return (func.julianday(later) - func.julianday(earlier)) * 86400.0
+    return func.extract("epoch", later - earlier)
+
+
+def calculate_channels_stats(channel_ids: Iterable[int], db: Session) -> Dict[int, ChannelStats]:
+    """Calculate statistics for several channels with two grouped queries.
+
+    The average interval is (last - first) / (count - 1), the same as the mean
+    of the gaps between consecutive feeds; the minimum gap comes from a window
+    function, so no feed rows are loaded.
 
     Args:
-        channel_id: Channel ID
+        channel_ids: Channel IDs
         db: Database session
 
     Returns:
-        ChannelStats object with calculated statistics
+        ChannelStats per channel ID (channels without feeds get empty stats)
     """
-    # Get total count
-    total_feeds = db.query(func.count(Feed.id)).filter(Feed.channel_id == channel_id).scalar() or 0
+    channel_ids = list(channel_ids)
+    result = {channel_id: ChannelStats() for channel_id in channel_ids}
+    if not channel_ids:
+        return result
 
-    # Get last feed
-    last_feed = (
-        db.query(Feed).filter(Feed.channel_id == channel_id).order_by(Feed.created_at.desc()).first()
-    )
-    last_feed_at = last_feed.created_at if last_feed else None
-
-    # Get recent count (last 24 hours)
     yesterday = datetime.utcnow() - timedelta(days=1)
-    recent_count = (
-        db.query(func.count(Feed.id))
-        .filter(Feed.channel_id == channel_id, Feed.created_at >= yesterday)
-        .scalar()
-        or 0
-    )
-
-    # Calculate intervals between feeds
-    # Use window function to get time differences
-    if total_feeds < 2:
-        # Need at least 2 feeds to calculate intervals
-        return ChannelStats(
-            avg_interval_seconds=None,
-            min_interval_seconds=None,
-            recent_count=recent_count,
-            last_feed_at=last_feed_at,
-            total_feeds=total_feeds,
+    totals = (
+        db.query(
+            Feed.channel_id,
+            func.count(Feed.id),
+            func.min(Feed.created_at),
+            func.max(Feed.created_at),
+            func.sum(case((Feed.created_at >= yesterday, 1), else_=0)),
         )
-
-    # Calculate intervals in Python for compatibility
-    feeds = (
-        db.query(Feed.created_at)
-        .filter(Feed.channel_id == channel_id)
-        .order_by(Feed.created_at)
+        .filter(Feed.channel_id.in_(channel_ids))
+        .group_by(Feed.channel_id)
         .all()
     )
-    intervals = []
-    for i in range(1, len(feeds)):
-        delta = feeds[i].created_at - feeds[i - 1].created_at
-        intervals.append(delta.total_seconds())
-
-    if not intervals:
-        return ChannelStats(
-            avg_interval_seconds=None,
-            min_interval_seconds=None,
-            recent_count=recent_count,
-            last_feed_at=last_feed_at,
-            total_feeds=total_feeds,
+
+    many = []
+    for channel_id, total_feeds, first_at, last_at, recent_count in totals:
+        stats = result[channel_id]
+        stats.total_feeds = total_feeds
+        stats.last_feed_at = last_at
+        stats.recent_count = recent_count or 0
+        if total_feeds >= 2:
+            # Need at least 2 feeds to calculate intervals
+            stats.avg_interval_seconds = (last_at - first_at).total_seconds() / (total_feeds - 1)
+            many.append(channel_id)
+
+    if many:
+        dialect = db.get_bind().dialect.name
+        previous = func.lag(Feed.created_at).over(partition_by=Feed.channel_id, order_by=Feed.created_at)
+        gaps = (
+            db.query(Feed.channel_id.label("channel_id"), Feed.created_at.label("created_at"),
+                     previous.label("previous_at"))
+            .filter(Feed.channel_id.in_(many))
+            .subquery()
         )
+        shortest = (
+            db.query(gaps.c.channel_id, func.min(_seconds_between(gaps.c.created_at, gaps.c.previous_at, dialect)))
+            .group_by(gaps.c.channel_id)
+            .all()
+        )
+        for channel_id, min_interval in shortest:
+            if min_interval is not None:
+                result[channel_id].min_interval_seconds = round(float(min_interval), 3)
 
-    avg_interval = sum(intervals) / len(intervals)
-    min_interval = min(intervals)
+    return result
 
-    return ChannelStats(
-        avg_interval_seconds=avg_interval,
-        min_interval_seconds=min_interval,
-        recent_count=recent_count,
-        last_feed_at=last_feed_at,
-        total_feeds=total_feeds,
-    )
 
+def calculate_channel_stats(channel_id: int, db: Session) -> ChannelStats:
+    """Calculate statistics for a channel.
+
+    Args:
+        channel_id: Channel ID
+        db: Database session
+
+    Returns:
+        ChannelStats object with calculated statistics
+    """
+    return calculate_channels_stats([channel_id], db)[channel_id]
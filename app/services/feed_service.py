@@ -7,6 +7,7 @@ from sqlalchemy import desc
 from app.models.feed import Feed
 from app.models.channel import Channel
 from app.schemas.feed import FeedCreate
+from app.services.request_timing import phase
 
 
 def create_feed(db: Session, channel: Channel, feed_data: FeedCreate, auto_commit: bool = True) -> Feed:
@@ -35,11 +36,13 @@ def create_feed(db: Session, channel: Channel, feed_data: FeedCreate, auto_commi
     db.add(db_feed)
     
     if auto_commit:
-        db.commit()
-        db.refresh(db_feed)
-        db.refresh(channel)
+        with phase("commit"):
+            db.commit()
+            db.refresh(db_feed)
+            db.refresh(channel)
     else:
-        db.flush()  # Get IDs without committing
+        with phase("flush"):
+            db.flush()  # Get IDs without committing
     
     return db_feed
 
@@ -61,7 +64,8 @@ def get_feeds(
     
     query = query.order_by(desc(Feed.created_at)).limit(results)
     
-    return query.all()
+    with phase("query"):
+        return query.all()
 
 
 def get_last_feed(db: Session, channel_id: int) -> Optional[Feed]:
@@ -96,7 +100,8 @@ def get_field_data(
     
     query = query.order_by(desc(Feed.created_at)).limit(results)
     
-    return query.all()
+    with phase("query"):
+        return query.all()
 
 
 def get_feed_count(db: Session, channel_id: int) -> int:
@@ -0,0 +1,61 @@
+"""Database-backed leases for leader election between worker processes.
+
+Works the same on SQLite and PostgreSQL: a lease is taken with a conditional
+UPDATE (free, expired or already ours) and created with an INSERT that loses
+the race on the primary key.
+"""
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models.service_lease import ServiceLease
+
+# Unique per process: host, pid and a random token (pids are reused across restarts)
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def try_acquire(db: Session, name: str, ttl_seconds: float, holder: str = WORKER_ID) -> bool:
+    """Acquire or renew lease ``name``. Commits the session."""
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=ttl_seconds)
+    updated = db.query(ServiceLease).filter(
+        ServiceLease.name == name,
+        (ServiceLease.holder == holder) | (ServiceLease.expires_at < now),
+    ).update({"holder": holder, "expires_at": expires_at}, synchronize_session=False)
+    if updated:
+        db.commit()
+        return True
+
+    if db.query(ServiceLease.name).filter(ServiceLease.name == name).first():
+        db.rollback()
+        return False
+
+    db.add(ServiceLease(name=name, holder=holder, expires_at=expires_at))
+    try:
+        db.commit()
+        return True
+    except IntegrityError:
+        # Another worker created the lease first
+        db.rollback()
+        return False
+
+
+def release(db: Session, name: str, holder: str = WORKER_ID) -> None:
+    """Give the lease up so another worker can take it immediately."""
+    db.query(ServiceLease).filter(
+        ServiceLease.name == name,
+        ServiceLease.holder == holder,
+    ).delete(synchronize_session=False)
+    db.commit()
+
+
+def current_holder(db: Session, name: str):
+    """Return (holder, expires_at) of a live lease or None."""
+    lease = db.query(ServiceLease).filter(ServiceLease.name == name).first()
+    if not lease or lease.expires_at < datetime.utcnow():
+        return None
+    return lease.holder, lease.expires_at
@@ -11,6 +11,7 @@ from sqlalchemy.orm import Session
 from app.config import settings
 from app.database import SessionLocal
 from app.services import feed_service, channel_service
+from app.services.metrics import membuffer_flush_seconds, metrics
 from app.services.automation_service import automation_engine
 from app.schemas.feed import FeedCreate
 
@@ -142,6 +143,7 @@ class MemWriteBuffer:
                     # apply automation rules before commit (same as /update)
                     automation_engine.execute_rules(channel.id, feed, db)
                 db.commit()
+                await automation_engine.after_commit(db)
                 self._batches_total += 1
             except Exception:
                 db.rollback()
@@ -150,9 +152,16 @@ class MemWriteBuffer:
                 db.close()
         finally:
             self._last_flush_ms = (time.time() - start) * 1000.0
+            if batch:
+                membuffer_flush_seconds.observe(self._last_flush_ms / 1000.0)
 
 
 # Singleton buffer instance
 mem_buffer = MemWriteBuffer()
 
+metrics.gauge("icloud_membuffer_queue_size", "Feeds waiting in MemWriteBuffer",
+              callback=lambda: mem_buffer.stats()["queue_size"])
+metrics.gauge("icloud_membuffer_drops", "Feeds dropped by MemWriteBuffer since start",
+              callback=lambda: mem_buffer.stats()["drops_total"])
+
 
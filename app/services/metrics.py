@@ -0,0 +1,331 @@
+"""In-process Prometheus metrics served at /metrics (text exposition format 0.0.4).
+
+Counters, gauges and fixed-bucket histograms are plain dicts keyed by label
+values; an update is one bisect and a few additions under a lock, cheap
+enough for every request. Gauges may be callbacks evaluated only when
+metrics are collected.
+
+Each uvicorn worker counts on its own. With METRICS_MULTIPROC_DIR set, every
+worker writes its values to <dir>/<pid>.json each METRICS_WRITE_INTERVAL_MS
+(and at shutdown), and /metrics on any worker sums the files of all of them.
+run.py empties the directory before the workers start. Files of workers
+that have exited (pid no longer alive) are removed by the reader, so their
+counts leave the sum as a counter reset would; gauges are skipped once a
+file is older than three write intervals.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.config import settings
+
+# Seconds; from a cached /update (~1 ms) to a slow archive batch
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4"  # Starlette adds the charset
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def samples(self) -> Dict[Tuple[str, ...], object]:
+        with self._lock:
+            return {labels: _copy(value) for labels, value in self._values.items()}
+
+    def describe(self) -> dict:
+        return {"type": self.kind, "help": self.documentation, "labels": list(self.labelnames)}
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 callback: Optional[Callable[[], float]] = None) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = float(value)
+
+    def samples(self) -> Dict[Tuple[str, ...], object]:
+        if self.callback is not None:
+            return {(): float(self.callback())}
+        return super().samples()
+
+
+class Histogram(Metric):
+    """Per label set: counts per bucket (not cumulative, the last one is +Inf) and the sum"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                counts = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def describe(self) -> dict:
+        return {**super().describe(), "buckets": list(self.buckets)}
+
+
+def _copy(value):
+    return list(value) if isinstance(value, list) else value
+
+
+def _add(total, value):
+    if isinstance(total, list):
+        return [a + b for a, b in zip(total, value)]
+    return total + value
+
+
+def _pid_alive(pid: str) -> bool:
+    """False only if the process is known to be gone (POSIX; elsewhere assumed alive)"""
+    if os.name != "posix" or not pid.isdigit():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass  # exists but belongs to another user
+    return True
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._running = False
+
+    def _register(self, metric: Metric) -> Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+              callback: Optional[Callable[[], float]] = None) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames, callback))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def collect(self) -> dict:
+        """Values of this process: {name: {type, help, labels, [buckets], samples: [[labels, value]]}}"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        result = {}
+        for metric in metrics:
+            try:
+                samples = metric.samples()
+            except Exception:
+                continue  # a failing gauge callback must not break the scrape
+            result[metric.name] = {
+                **metric.describe(),
+                "samples": [[list(labels), value] for labels, value in samples.items()],
+            }
+        return result
+
+    # Multiprocess mode
+
+    def write_snapshot(self, directory: str) -> None:
+        """Write this worker's values to <directory>/<pid>.json (atomically)"""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{os.getpid()}.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.collect(), f)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def clear_snapshots(directory: str) -> int:
+        """Remove the snapshot files of a previous run. Returns their number."""
+        removed = 0
+        try:
+            names = os.listdir(directory)
+        except FileNotFoundError:
+            return removed
+        for name in names:
+            if name.endswith((".json", ".json.tmp")):
+                try:
+                    os.remove(os.path.join(directory, name))
+                    removed += 1
+                except OSError:
+                    pass
+        return removed
+
+    @staticmethod
+    def _read_snapshots(directory: str, now: float) -> List[Tuple[dict, bool]]:
+        """(values, fresh) of every other live worker's file"""
+        interval = max(1, settings.METRICS_WRITE_INTERVAL_MS) / 1000.0
+        own = f"{os.getpid()}.json"
+        snapshots = []
+        try:
+            names = os.listdir(directory)
+        except FileNotFoundError:
+            return snapshots
+        for name in names:
+            if not name.endswith(".json") or name == own:
+                continue
+            path = os.path.join(directory, name)
+            if not _pid_alive(name[:-len(".json")]):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            try:
+                with open(path, encoding="utf-8") as f:
+                    data = json.load(f)
+                fresh = now - os.path.getmtime(path) <= 3 * interval
+            except (OSError, ValueError):
+                continue  # removed or being replaced
+            snapshots.append((data, fresh))
+        return snapshots
+
+    def aggregate(self) -> dict:
+        """This worker's values plus, in multiprocess mode, the other workers' files"""
+        merged = self.collect()
+        directory = settings.METRICS_MULTIPROC_DIR
+        if not directory:
+            return merged
+        totals = {name: {tuple(labels): value for labels, value in m["samples"]} for name, m in merged.items()}
+        for data, fresh in self._read_snapshots(directory, time.time()):
+            for name, metric in data.items():
+                if metric["type"] == "gauge" and not fresh:
+                    continue
+                if name not in merged:
+                    merged[name] = {**metric, "samples": []}
+                    totals[name] = {}
+                elif merged[name].get("buckets") != metric.get("buckets"):
+                    continue  # bucket layout changed between versions
+                values = totals[name]
+                for labels, value in metric["samples"]:
+                    key = tuple(labels)
+                    values[key] = _add(values[key], value) if key in values else value
+        for name, values in totals.items():
+            merged[name]["samples"] = [[list(labels), value] for labels, value in values.items()]
+        return merged
+
+    def render(self) -> str:
+        lines = []
+        for name, metric in sorted(self.aggregate().items()):
+            lines.append(f"# HELP {name} {metric['help']}")
+            lines.append(f"# TYPE {name} {metric['type']}")
+            labelnames = metric["labels"]
+            for labels, value in sorted(metric["samples"]):
+                if metric["type"] != "histogram":
+                    lines.append(f"{name}{_labels(labelnames, labels)} {_number(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(list(metric["buckets"]) + [float("inf")], value[:-1]):
+                    cumulative += count
+                    le = f'le="{_number(float(bound))}"'
+                    lines.append(f"{name}_bucket{_labels(labelnames, labels, le)} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labelnames, labels)} {_number(value[-1])}")
+                lines.append(f"{name}_count{_labels(labelnames, labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+    async def start(self) -> None:
+        """Write snapshots in the background (only in multiprocess mode)"""
+        if self._running or not settings.METRICS_MULTIPROC_DIR:
+            return
+        self._running = True
+        self._task = asyncio.create_task(self._write_loop())
+
+    async def stop(self) -> None:
+        if not self._running:
+            return
+        self._running = False
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._write(settings.METRICS_MULTIPROC_DIR)
+
+    async def _write_loop(self) -> None:
+        interval = max(1, settings.METRICS_WRITE_INTERVAL_MS) / 1000.0
+        directory = settings.METRICS_MULTIPROC_DIR
+        while self._running:
+            self._write(directory)
+            await asyncio.sleep(interval)
+
+    def _write(self, directory: str) -> None:
+        try:
+            self.write_snapshot(directory)
+        except OSError as e:
+            print(f"[WARN] Metrics snapshot failed: {e}")
+
+
+metrics = MetricsRegistry()
+
+# Hot-path metrics used across the app
+http_request_seconds = metrics.histogram(
+    "icloud_http_request_duration_seconds", "HTTP request latency by route template", ("method", "route"))
+http_requests_total = metrics.counter(
+    "icloud_http_requests_total", "HTTP requests by route template and status", ("method", "route", "status"))
+update_phase_seconds = metrics.histogram(
+    "icloud_update_phase_duration_seconds", "Time spent in /update phases", ("phase",))
+db_pool_checkout_seconds = metrics.histogram(
+    "icloud_db_pool_checkout_seconds", "Wait for a connection from the database pool")
+membuffer_flush_seconds = metrics.histogram(
+    "icloud_membuffer_flush_duration_seconds", "Duration of non-empty MemWriteBuffer flushes")
+archive_batch_seconds = metrics.histogram(
+    "icloud_archive_batch_duration_seconds", "Duration of one archive batch (copy, delete, commit)")
+rate_limit_rejections_total = metrics.counter(
+    "icloud_rate_limit_rejections_total", "Requests answered 429 by the rate limiter", ("limit",))
+sql_n_plus_one_total = metrics.counter(
+    "icloud_sql_n_plus_one_total", "Statements run more than SQL_N_PLUS_ONE_THRESHOLD times in one request",
+    ("method", "route"))
@@ -0,0 +1,207 @@
+"""On-demand profiling of the current worker for admins.
+
+StackSampler is a pure-Python sampling profiler: a timer thread reads the
+stacks of all other threads (``sys._current_frames()``) every few
+milliseconds for a fixed window and counts identical stacks. The result is
+in the collapsed format (``frame;frame;frame count`` per line) read by
+flamegraph.pl, speedscope and similar tools. Nothing is installed into the
+profiled code, so it can run under real load; the cost is one stack walk
+per thread per interval while a window is open.
+
+MemoryTracer wraps tracemalloc: start tracing with a baseline snapshot,
+then list the top allocation sites, or their growth since the baseline.
+Tracing slows allocations down while it is on, so it must be stopped.
+"""
+from __future__ import annotations
+
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Dict, List, Optional
+
+# Frames of threads that are waiting, not working (file name, function)
+IDLE_FRAMES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+    ("socket.py", "accept"),
+}
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class ProfilerBusy(Exception):
+    """Another profiling window is already running in this worker"""
+
+
+def _short_path(filename: str) -> str:
+    if filename.startswith(_PROJECT_ROOT):
+        return os.path.relpath(filename, _PROJECT_ROOT)
+    marker = "site-packages" + os.sep
+    if marker in filename:
+        return filename.split(marker, 1)[1]
+    return os.path.basename(filename)
+
+
+class StackSampler:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._labels: Dict[object, str] = {}
+
+    def _frame_label(self, code) -> str:
+        # Labels are cached per code object: a window walks the same frames thousands of times
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f"{_short_path(code.co_filename)}:{code.co_name}"
+        return label
+
+    def sample(self, seconds: float, interval: float = 0.005, include_idle: bool = False) -> dict:
+        """Sample every thread but this one for ``seconds``. Raises ProfilerBusy"""
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy("A profile is already running in this worker")
+        try:
+            return self._sample(seconds, interval, include_idle)
+        finally:
+            self._lock.release()
+
+    def _sample(self, seconds: float, interval: float, include_idle: bool) -> dict:
+        own_id = threading.get_ident()
+        stacks: Counter = Counter()
+        samples = idle = 0
+        started = time.perf_counter()
+        deadline = started + seconds
+        while True:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                top = frame.f_code
+                if not include_idle and (os.path.basename(top.co_filename), top.co_name) in IDLE_FRAMES:
+                    idle += 1
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(self._frame_label(frame.f_code))
+                    frame = frame.f_back
+                labels.append(names.get(thread_id, str(thread_id)))
+                labels.reverse()
+                stacks[";".join(labels)] += 1
+                samples += 1
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            time.sleep(min(interval, deadline - now))
+        return {
+            "duration_s": round(time.perf_counter() - started, 3),
+            "interval_ms": interval * 1000,
+            "samples": samples,
+            "idle_samples": idle,
+            "stacks": stacks,
+        }
+
+    @staticmethod
+    def collapsed(result: dict) -> str:
+        """``frame;frame count`` lines, most frequent first"""
+        return "".join(f"{stack} {count}\n" for stack, count in result["stacks"].most_common())
+
+    @staticmethod
+    def top_functions(result: dict, limit: int = 20) -> List[dict]:
+        """Functions by samples on top of the stack (self) and anywhere in it (total)"""
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, count in result["stacks"].items():
+            frames = stack.split(";")[1:]  # without the thread name
+            if not frames:
+                continue
+            own[frames[-1]] += count
+            for frame in set(frames):
+                total[frame] += count
+        samples = result["samples"] or 1
+        return [
+            {
+                "function": function,
+                "self": count,
+                "self_percent": round(count * 100 / samples, 1),
+                "total": total[function],
+                "total_percent": round(total[function] * 100 / samples, 1),
+            }
+            for function, count in own.most_common(limit)
+        ]
+
+
+class MemoryTracer:
+    def __init__(self) -> None:
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._lock = threading.Lock()
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int = 10) -> dict:
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(frames)
+            self._baseline = self._snapshot()
+        return self.status()
+
+    def stop(self) -> dict:
+        with self._lock:
+            tracemalloc.stop()
+            self._baseline = None
+        return self.status()
+
+    def status(self) -> dict:
+        if not tracemalloc.is_tracing():
+            return {"tracing": False}
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            "tracing": True,
+            "frames": tracemalloc.get_traceback_limit(),
+            "traced_mb": round(current / 1024 ** 2, 2),
+            "peak_mb": round(peak / 1024 ** 2, 2),
+            "overhead_mb": round(tracemalloc.get_tracemalloc_memory() / 1024 ** 2, 2),
+            "has_baseline": self._baseline is not None,
+        }
+
+    @staticmethod
+    def _snapshot() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+
+    def top(self, limit: int = 30, group_by: str = "lineno", diff: bool = False, rebase: bool = False) -> dict:
+        """Largest allocation sites now, or (``diff``) the largest growth since the baseline"""
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                raise RuntimeError("tracemalloc is not running")
+            snapshot = self._snapshot()
+            if diff and self._baseline is not None:
+                stats = snapshot.compare_to(self._baseline, group_by)
+            else:
+                stats = snapshot.statistics(group_by)
+            if rebase:
+                self._baseline = snapshot
+        entries = []
+        for stat in stats[:limit]:
+            entry = {
+                "size_kb": round(stat.size / 1024, 1),
+                "count": stat.count,
+                "traceback": [f"{_short_path(frame.filename)}:{frame.lineno}" for frame in stat.traceback],
+            }
+            if hasattr(stat, "size_diff"):
+                entry["size_diff_kb"] = round(stat.size_diff / 1024, 1)
+                entry["count_diff"] = stat.count_diff
+            entries.append(entry)
+        return {**self.status(), "group_by": group_by, "diff": diff, "stats": entries}
+
+
+stack_sampler = StackSampler()
+memory_tracer = MemoryTracer()
@@ -0,0 +1,67 @@
+"""Database token store for rate limits shared by all worker processes.
+
+Each row is a token bucket (tokens left, time of the last refill as epoch
+seconds). Workers do not go to the database per request: ``take()`` leases a
+batch of tokens that the worker then spends locally, so the store sees one
+short transaction per batch.
+
+Works the same on SQLite and PostgreSQL: the refill UPDATE locks the row
+(SQLite: the database) until commit, so reading the refilled value and
+subtracting the grant is atomic; a missing bucket is created with an INSERT
+that loses the race on the primary key.
+"""
+import time
+from typing import Optional
+
+from sqlalchemy import case
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models.rate_limit_bucket import RateLimitBucket
+
+
+def take(
+    db: Session,
+    key: str,
+    capacity: float,
+    window: float,
+    wanted: int,
+    now: Optional[float] = None,
+) -> tuple:
+    """Take up to ``wanted`` whole tokens. Returns (granted, tokens left). Commits the session."""
+    now = time.time() if now is None else now
+    rate = capacity / window
+    # Clocks of other hosts may be slightly behind: never refill backwards
+    elapsed = case((RateLimitBucket.updated < now, now - RateLimitBucket.updated), else_=0.0)
+    refilled = RateLimitBucket.tokens + elapsed * rate
+    bucket = db.query(RateLimitBucket).filter(RateLimitBucket.key == key)
+    if bucket.update(
+        {"tokens": case((refilled > capacity, capacity), else_=refilled), "updated": now},
+        synchronize_session=False,
+    ):
+        tokens = db.query(RateLimitBucket.tokens).filter(RateLimitBucket.key == key).scalar()
+        granted = min(wanted, int(tokens))
+        if granted:
+            bucket.update({"tokens": RateLimitBucket.tokens - granted}, synchronize_session=False)
+        db.commit()
+        return granted, tokens - granted
+
+    granted = min(wanted, int(capacity))
+    db.add(RateLimitBucket(key=key, tokens=capacity - granted, updated=now))
+    try:
+        db.commit()
+        return granted, capacity - granted
+    except IntegrityError:
+        # Another worker created the bucket first
+        db.rollback()
+        return take(db, key, capacity, window, wanted, now)
+
+
+def purge(db: Session, idle_seconds: float, now: Optional[float] = None) -> int:
+    """Delete buckets not used for ``idle_seconds`` (they are full again). Commits the session."""
+    now = time.time() if now is None else now
+    deleted = db.query(RateLimitBucket).filter(
+        RateLimitBucket.updated < now - idle_seconds
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
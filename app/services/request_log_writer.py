@@ -0,0 +1,230 @@
+"""Batched, sampled writer of request_logs rows.
+
+The logging middleware only appends a plain dict to an in-memory ring buffer;
+a background task bulk-inserts the buffer every REQUEST_LOG_FLUSH_INTERVAL_MS
+(sooner once REQUEST_LOG_BATCH_SIZE rows are waiting) in the default
+executor, so no request waits on a log transaction. When the buffer is full
+the oldest rows are overwritten and counted as dropped.
+
+Successful requests are sampled per endpoint class (REQUEST_LOG_SAMPLE_*,
+e.g. 1% of /update calls); errors (status >= 400) are always logged. Each
+row keeps its sample weight (1 / rate) so roll-ups can count every request.
+
+Every request, sampled or not, is also counted per minute and route template
+(app/services/request_stats.py); finished minutes are inserted into
+request_log_minute by the same loop, and old minutes are purged hourly.
+"""
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import insert
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.request_log import RequestLog, RequestLogMinute
+from app.services import request_stats
+from app.services.archive.request_logs import normalize_endpoint
+
+ENDPOINT_CLASSES = ("update", "read", "default")
+
+MINUTE_PURGE_INTERVAL = 3600  # seconds
+
+
+def endpoint_class(method: str, path: str) -> str:
+    """Sampling class of a request: device writes, data reads or everything else."""
+    if path.endswith("/update"):
+        return "update"
+    if method == "GET" and ("/feeds" in path or "/fields/" in path):
+        return "read"
+    return "default"
+
+
+def sample_rate(endpoint_cls: str) -> float:
+    if endpoint_cls == "update":
+        return settings.REQUEST_LOG_SAMPLE_UPDATE
+    if endpoint_cls == "read":
+        return settings.REQUEST_LOG_SAMPLE_READ
+    return settings.REQUEST_LOG_SAMPLE_DEFAULT
+
+
+class RequestLogWriter:
+    def __init__(self) -> None:
+        self._buffer: deque = deque(maxlen=max(1, settings.REQUEST_LOG_BUFFER_SIZE))
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._running = False
+        # metrics
+        self.written = 0
+        self.dropped = 0
+        self.flush_errors = 0
+        self.batches = 0
+        self.seen = {name: 0 for name in ENDPOINT_CLASSES}
+        self.sampled_out = {name: 0 for name in ENDPOINT_CLASSES}
+        self.last_flush_ms = 0.0
+        self._minutes = request_stats.MinuteAggregator()
+        self._last_purge = 0.0
+        self.minute_rows = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._running,
+            "buffered": len(self._buffer),
+            "buffer_size": self._buffer.maxlen,
+            "written": self.written,
+            "dropped": self.dropped,
+            "flush_errors": self.flush_errors,
+            "batches": self.batches,
+            "seen": dict(self.seen),
+            "sampled_out": dict(self.sampled_out),
+            "last_flush_ms": self.last_flush_ms,
+            "minute_groups": len(self._minutes),
+            "minute_rows": self.minute_rows,
+        }
+
+    def record(self, method: str, endpoint: str, status_code: int, response_time: float,
+               ip_address: Optional[str] = None, user_agent: Optional[str] = None,
+               route: Optional[str] = None) -> bool:
+        """Count one request and buffer it (if sampled). Returns True if it will be written.
+
+        ``route`` is the route template the minute counts are grouped by
+        (default: the path with numeric segments collapsed).
+        """
+        self._minutes.add(int(time.time() // 60), route or normalize_endpoint(endpoint), method,
+                          status_code, response_time)
+        endpoint_cls = endpoint_class(method, endpoint)
+        self.seen[endpoint_cls] += 1
+        weight = 1.0
+        if status_code < 400:
+            rate = sample_rate(endpoint_cls)
+            if rate < 1.0:
+                if random.random() >= rate:
+                    self.sampled_out[endpoint_cls] += 1
+                    return False
+                weight = 1.0 / rate
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1  # the append below overwrites the oldest row
+        self._buffer.append({
+            "timestamp": datetime.utcnow(),  # request time, not flush time
+            "endpoint": endpoint,
+            "method": method,
+            "ip_address": ip_address,
+            "user_agent": user_agent,
+            "response_status": status_code,
+            "response_time": round(response_time, 2),
+            "sample_weight": weight,
+        })
+        if self._wakeup is not None and len(self._buffer) >= settings.REQUEST_LOG_BATCH_SIZE:
+            self._wakeup.set()
+        return True
+
+    async def start(self) -> None:
+        if self._running:
+            return
+        self._running = True
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self) -> None:
+        """Stop the loop and write what is left."""
+        if not self._running:
+            return
+        self._running = False
+        self._wakeup.set()
+        await self._task
+        self._task = None
+        self._wakeup = None
+        while self._buffer:
+            await self.flush()
+        await self.flush_minutes(final=True)
+
+    async def _flush_loop(self) -> None:
+        interval = max(1, settings.REQUEST_LOG_FLUSH_INTERVAL_MS) / 1000.0
+        while self._running:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._running:
+                await self.flush()
+                await self.flush_minutes()
+
+    async def flush(self) -> int:
+        """Insert up to one batch in the default executor. Returns the number of rows."""
+        batch = self._take_batch()
+        if not batch:
+            return 0
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        try:
+            await loop.run_in_executor(None, self._insert, batch)
+        except Exception as e:
+            self.flush_errors += 1
+            print(f"[WARN] Request log flush failed, {len(batch)} rows lost: {e}")
+            return 0
+        finally:
+            self.last_flush_ms = (time.perf_counter() - start) * 1000.0
+        self.batches += 1
+        self.written += len(batch)
+        return len(batch)
+
+    async def flush_minutes(self, final: bool = False) -> int:
+        """Insert the finished minutes (all of them if ``final``). Returns the number of rows."""
+        rows = self._minutes.take(None if final else int(time.time() // 60))
+        purge = not final and time.monotonic() - self._last_purge >= MINUTE_PURGE_INTERVAL
+        if not rows and not purge:
+            return 0
+        if purge:
+            self._last_purge = time.monotonic()
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, self._insert_minutes, rows, purge)
+        except Exception as e:
+            self.flush_errors += 1
+            print(f"[WARN] Request minute flush failed, {len(rows)} rows lost: {e}")
+            return 0
+        self.minute_rows += len(rows)
+        return len(rows)
+
+    def _take_batch(self) -> List[dict]:
+        limit = max(1, settings.REQUEST_LOG_BATCH_SIZE)
+        batch = []
+        while self._buffer and len(batch) < limit:
+            batch.append(self._buffer.popleft())
+        return batch
+
+    @staticmethod
+    def _insert(batch: List[dict]) -> None:
+        db = SessionLocal()
+        try:
+            db.execute(insert(RequestLog), batch)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    @staticmethod
+    def _insert_minutes(rows: List[dict], purge: bool) -> None:
+        db = SessionLocal()
+        try:
+            if rows:
+                db.execute(insert(RequestLogMinute), rows)
+                db.commit()
+            if purge and settings.REQUEST_LOG_MINUTE_RETENTION_DAYS:
+                request_stats.purge(db, settings.REQUEST_LOG_MINUTE_RETENTION_DAYS)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+request_log_writer = RequestLogWriter()
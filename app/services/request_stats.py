@@ -0,0 +1,206 @@
+"""Per-minute request aggregates for the admin dashboard.
+
+request_logs keeps a sample of the requests (1% of /update by default) and
+grows with traffic, so counting or averaging it for a dashboard is both
+wrong and slow. Instead the request log writer counts every request in
+memory per (minute, route template, method, status class): count, latency
+sum and max, and a fixed-bucket latency histogram (LATENCY_BUCKETS_MS).
+Finished minutes are inserted into request_log_minute; each worker writes
+its own rows, so readers always SUM over the group.
+
+Percentiles are estimated from the summed histogram, interpolating inside
+the bucket (as Prometheus histogram_quantile does), so a reader touches at
+most one row per minute and group whatever the raw log volume. The last
+minute is not there yet; rows older than REQUEST_LOG_MINUTE_RETENTION_DAYS
+are purged by the writer.
+"""
+from __future__ import annotations
+
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy import case, desc, func
+from sqlalchemy.orm import Session
+
+from app.models.request_log import LATENCY_BUCKET_COLUMNS, LATENCY_BUCKETS_MS, RequestLogMinute
+
+STATUS_CLASSES = (2, 3, 4, 5)
+
+_BUCKETS = [getattr(RequestLogMinute, name) for name in LATENCY_BUCKET_COLUMNS]
+
+
+class MinuteAggregator:
+    """Counts of the current worker per (epoch minute, endpoint, method, status class)"""
+
+    def __init__(self) -> None:
+        # key -> [count, latency sum, latency max, *histogram]
+        self._groups: Dict[tuple, list] = {}
+
+    def __len__(self) -> int:
+        return len(self._groups)
+
+    def add(self, minute: int, endpoint: str, method: str, status_code: int, latency_ms: float) -> None:
+        key = (minute, endpoint, method, status_code // 100)
+        group = self._groups.get(key)
+        if group is None:
+            group = self._groups[key] = [0, 0.0, 0.0] + [0] * len(LATENCY_BUCKET_COLUMNS)
+        group[0] += 1
+        group[1] += latency_ms
+        if latency_ms > group[2]:
+            group[2] = latency_ms
+        group[3 + bisect_left(LATENCY_BUCKETS_MS, latency_ms)] += 1
+
+    def take(self, before_minute: Optional[int] = None) -> List[dict]:
+        """Remove and return rows of the minutes before ``before_minute`` (all by default)"""
+        keys = [key for key in self._groups if before_minute is None or key[0] < before_minute]
+        rows = []
+        for key in keys:
+            count, latency_sum, latency_max, *histogram = self._groups.pop(key)
+            minute, endpoint, method, status_class = key
+            rows.append({
+                "minute": datetime.utcfromtimestamp(minute * 60),
+                "endpoint": endpoint,
+                "method": method,
+                "status_class": status_class,
+                "request_count": count,
+                "latency_sum": round(latency_sum, 3),
+                "latency_max": round(latency_max, 2),
+                **dict(zip(LATENCY_BUCKET_COLUMNS, histogram)),
+            })
+        return rows
+
+
+def histogram_percentile(counts: Sequence[int], q: float, latency_max: Optional[float] = None) -> Optional[float]:
+    """Estimate the q-th percentile (ms) from histogram bucket counts"""
+    total = sum(counts)
+    if not total:
+        return None
+    rank = q / 100.0 * total
+    cumulative = 0
+    lower = 0.0
+    for index, count in enumerate(counts):
+        upper = LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else (latency_max or lower)
+        if count and cumulative + count >= rank:
+            value = lower + (upper - lower) * (rank - cumulative) / count
+            if latency_max is not None:
+                value = min(value, latency_max)
+            return round(value, 2)
+        cumulative += count
+        lower = upper
+    return latency_max
+
+
+def _aggregate_columns() -> list:
+    return [
+        func.sum(RequestLogMinute.request_count),
+        func.sum(RequestLogMinute.latency_sum),
+        func.max(RequestLogMinute.latency_max),
+        *[func.sum(column) for column in _BUCKETS],
+    ]
+
+
+def _summary(count, latency_sum, latency_max, histogram) -> dict:
+    count = count or 0
+    histogram = [value or 0 for value in histogram]
+    return {
+        "count": count,
+        "avg_response_time": round(latency_sum / count, 2) if count else None,
+        "max_response_time": latency_max,
+        "p50": histogram_percentile(histogram, 50, latency_max),
+        "p95": histogram_percentile(histogram, 95, latency_max),
+        "p99": histogram_percentile(histogram, 99, latency_max),
+    }
+
+
+def _filtered(query, since: datetime, endpoint: Optional[str], method: Optional[str]):
+    query = query.filter(RequestLogMinute.minute >= since)
+    if endpoint:
+        query = query.filter(RequestLogMinute.endpoint == endpoint)
+    if method:
+        query = query.filter(RequestLogMinute.method == method)
+    return query
+
+
+def totals(db: Session, since: datetime, endpoint: Optional[str] = None, method: Optional[str] = None) -> dict:
+    """Requests since ``since``: count, status classes, average, max and percentiles (one query)"""
+    status_columns = [
+        func.sum(case((RequestLogMinute.status_class == status_class, RequestLogMinute.request_count), else_=0))
+        for status_class in STATUS_CLASSES
+    ]
+    row = _filtered(db.query(*_aggregate_columns(), *status_columns), since, endpoint, method).one()
+    count, latency_sum, latency_max, *rest = row
+    histogram, statuses = rest[:len(_BUCKETS)], rest[len(_BUCKETS):]
+    return {
+        **_summary(count, latency_sum, latency_max, histogram),
+        **{f"status_{status_class}xx": value or 0 for status_class, value in zip(STATUS_CLASSES, statuses)},
+    }
+
+
+def top_endpoints(db: Session, since: datetime, limit: int = 10, order: str = "count") -> List[dict]:
+    """Endpoints by request count (or ``time``: total latency), with their percentiles"""
+    errors = func.sum(case((RequestLogMinute.status_class >= 4, RequestLogMinute.request_count), else_=0))
+    query = _filtered(
+        db.query(RequestLogMinute.endpoint, RequestLogMinute.method, *_aggregate_columns(), errors),
+        since, None, None,
+    ).group_by(RequestLogMinute.endpoint, RequestLogMinute.method)
+    ordering = func.sum(RequestLogMinute.latency_sum) if order == "time" else func.sum(RequestLogMinute.request_count)
+    result = []
+    for endpoint, method, count, latency_sum, latency_max, *rest in query.order_by(desc(ordering)).limit(limit):
+        result.append({
+            "endpoint": endpoint,
+            "method": method,
+            **_summary(count, latency_sum, latency_max, rest[:-1]),
+            "total_time_ms": round(latency_sum or 0.0, 2),
+            "errors": rest[-1] or 0,
+        })
+    return result
+
+
+def timeline(db: Session, since: datetime, step_minutes: int = 5,
+             endpoint: Optional[str] = None, method: Optional[str] = None) -> List[dict]:
+    """Chart points every ``step_minutes`` up to now (empty steps included): count, errors, average and p95"""
+    errors = func.sum(case((RequestLogMinute.status_class >= 4, RequestLogMinute.request_count), else_=0))
+    rows = (
+        _filtered(db.query(RequestLogMinute.minute, *_aggregate_columns(), errors), since, endpoint, method)
+        .group_by(RequestLogMinute.minute)
+        .order_by(RequestLogMinute.minute)
+        .all()
+    )
+    step = timedelta(minutes=max(1, step_minutes))
+    points: Dict[datetime, list] = {}
+    start, now = since, datetime.utcnow()
+    while start <= now:
+        points[start] = [0, 0.0, None, 0] + [0] * len(_BUCKETS)
+        start += step
+    for minute, count, latency_sum, latency_max, *rest in rows:
+        start = since + ((minute - since) // step) * step
+        point = points.get(start)
+        if point is None:
+            point = points[start] = [0, 0.0, None, 0] + [0] * len(_BUCKETS)
+        point[0] += count or 0
+        point[1] += latency_sum or 0.0
+        point[2] = max(point[2] or 0.0, latency_max or 0.0)
+        point[3] += rest[-1] or 0
+        for index, value in enumerate(rest[:-1]):
+            point[4 + index] += value or 0
+    return [
+        {
+            "time": start,
+            "count": count,
+            "errors": error_count,
+            "avg_response_time": round(latency_sum / count, 2) if count else None,
+            "p95": histogram_percentile(histogram, 95, latency_max),
+        }
+        for start, (count, latency_sum, latency_max, error_count, *histogram) in points.items()
+    ]
+
+
+def purge(db: Session, retention_days: int, now: Optional[datetime] = None) -> int:
+    """Delete minutes older than ``retention_days``. Commits the session."""
+    cutoff = (now or datetime.utcnow()) - timedelta(days=retention_days)
+    deleted = db.query(RequestLogMinute).filter(
+        RequestLogMinute.minute < cutoff
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
@@ -0,0 +1,138 @@
+"""Per-request phase timers and the ring of slow requests.
+
+RequestLoggingMiddleware starts a RequestTiming for every request and keeps
+it in a context variable, so routers and services add phases with
+``phase("name")`` (or ``add()``) without passing anything around; sync
+routes see it too, the threadpool runs them in a copy of the context.
+Statements are timed by engine events (app/database.py), the pool wait by
+TimedQueuePool, and their fingerprints (app/services/sql_stats.py) are
+counted to spot N+1 queries. The phases go back in the ``Server-Timing``
+header.
+
+Requests slower than SLOW_REQUEST_MS are kept, with their phases and SQL
+statements, in a ring of the last SLOW_REQUEST_RING_SIZE per worker
+(``GET /api/admin/requests/slow``).
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from app.config import settings
+
+_current: ContextVar[Optional["RequestTiming"]] = ContextVar("request_timing", default=None)
+
+
+class RequestTiming:
+    __slots__ = ("start", "phases", "queries", "query_count", "db_seconds", "repeats")
+
+    def __init__(self) -> None:
+        self.start = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.queries: List[tuple] = []
+        self.query_count = 0
+        self.db_seconds = 0.0
+        self.repeats: Dict[str, int] = {}  # statement fingerprint -> executions
+
+    def add(self, name: str, seconds: float) -> None:
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def add_query(self, statement: str, seconds: float, fingerprint: str) -> None:
+        self.query_count += 1
+        self.db_seconds += seconds
+        self.repeats[fingerprint] = self.repeats.get(fingerprint, 0) + 1
+        if len(self.queries) < settings.SLOW_REQUEST_MAX_QUERIES:
+            self.queries.append((statement, seconds))
+
+    def server_timing(self, total: float) -> str:
+        """``Server-Timing`` value; phases may nest (pool and db are inside the others)"""
+        entries = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.phases.items()]
+        if self.query_count:
+            entries.append(f'db;dur={self.db_seconds * 1000:.2f};desc="{self.query_count} queries"')
+        entries.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(entries)
+
+
+def begin() -> tuple:
+    """Start timing the current request. Returns (timing, token for ``end()``)"""
+    timing = RequestTiming()
+    return timing, _current.set(timing)
+
+
+def end(token) -> None:
+    _current.reset(token)
+
+
+def current() -> Optional[RequestTiming]:
+    return _current.get()
+
+
+def add(name: str, seconds: float) -> None:
+    timing = _current.get()
+    if timing is not None:
+        timing.add(name, seconds)
+
+
+@contextmanager
+def phase(name: str):
+    """Add the time of the block to phase ``name`` of the current request"""
+    timing = _current.get()
+    if timing is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.add(name, time.perf_counter() - start)
+
+
+class SlowRequestLog:
+    def __init__(self) -> None:
+        self._ring: deque = deque(maxlen=max(1, settings.SLOW_REQUEST_RING_SIZE))
+        self._lock = threading.Lock()
+
+    def record(self, method: str, path: str, route: Optional[str], status_code: int,
+               timing: RequestTiming, total: float) -> bool:
+        """Keep the request if it is slower than SLOW_REQUEST_MS"""
+        threshold = settings.SLOW_REQUEST_MS
+        if not threshold or total * 1000 < threshold:
+            return False
+        entry = {
+            "timestamp": datetime.utcnow(),
+            "method": method,
+            "path": path,
+            "route": route,
+            "status": status_code,
+            "duration_ms": round(total * 1000, 2),
+            "phases": {name: round(seconds * 1000, 2) for name, seconds in timing.phases.items()},
+            "db_ms": round(timing.db_seconds * 1000, 2),
+            "query_count": timing.query_count,
+            "queries": [{"sql": sql, "ms": round(seconds * 1000, 3)} for sql, seconds in timing.queries],
+            "repeated": sorted(
+                ({"sql": sql, "count": count} for sql, count in timing.repeats.items() if count > 1),
+                key=lambda item: item["count"], reverse=True,
+            )[:5],
+        }
+        with self._lock:
+            self._ring.append(entry)
+        return True
+
+    def snapshot(self, limit: Optional[int] = None) -> List[dict]:
+        """Newest first"""
+        with self._lock:
+            entries = list(self._ring)
+        entries.reverse()
+        return entries[:limit] if limit else entries
+
+    def clear(self) -> None:
+        with self._lock:
+            self._ring.clear()
+
+
+slow_requests = SlowRequestLog()
@@ -0,0 +1,129 @@
+"""SQL statement fingerprints with cumulative cost, and N+1 detection.
+
+Every statement executed through the engine (app/database.py events) is
+reduced to a fingerprint: literals, bound parameters and IN lists replaced,
+whitespace collapsed, so ``... WHERE user_id = ?`` run for 100 users is one
+entry. Per fingerprint the worker keeps count, total and max time
+(``GET /api/admin/sql/stats``).
+
+Within a request the fingerprints are counted too (RequestTiming.repeats);
+a fingerprint executed more than SQL_N_PLUS_ONE_THRESHOLD times in one
+request is flagged as a likely N+1 query: logged once per route, counted in
+/metrics and listed with the stats.
+"""
+from __future__ import annotations
+
+import logging
+import re
+import threading
+from datetime import datetime
+from typing import Dict, List
+
+from app.config import settings
+from app.services.metrics import sql_n_plus_one_total
+
+logger = logging.getLogger(__name__)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PARAM = re.compile(r"%\(\w+\)s|%s|\$\d+|:\w+")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACES = re.compile(r"\s+")
+
+# Statements repeat, so their fingerprints are cached
+_FINGERPRINT_CACHE_SIZE = 2000
+_fingerprints: Dict[str, str] = {}
+
+OTHER = "(other statements)"
+
+
+def fingerprint(statement: str) -> str:
+    """Statement with literals, parameters and IN lists replaced by ``?``"""
+    result = _fingerprints.get(statement)
+    if result is None:
+        result = _STRING.sub("?", statement)
+        result = _PARAM.sub("?", result)
+        result = _NUMBER.sub("?", result)
+        result = _IN_LIST.sub("(?...)", result)
+        result = _SPACES.sub(" ", result).strip()
+        if len(_fingerprints) >= _FINGERPRINT_CACHE_SIZE:
+            _fingerprints.clear()
+        _fingerprints[statement] = result
+    return result
+
+
+class SqlStats:
+    def __init__(self) -> None:
+        self._stats: Dict[str, list] = {}  # fingerprint -> [count, total seconds, max seconds]
+        self._n_plus_one: Dict[tuple, dict] = {}  # (method, route, fingerprint) -> summary
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, seconds: float) -> str:
+        """Add one execution; returns the fingerprint"""
+        key = fingerprint(statement)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                if len(self._stats) >= settings.SQL_STATS_MAX_FINGERPRINTS:
+                    stats = self._stats.setdefault(OTHER, [0, 0.0, 0.0])
+                else:
+                    stats = self._stats[key] = [0, 0.0, 0.0]
+            stats[0] += 1
+            stats[1] += seconds
+            if seconds > stats[2]:
+                stats[2] = seconds
+        return key
+
+    def check_request(self, repeats: Dict[str, int], method: str, route: str) -> List[dict]:
+        """Flag fingerprints a request ran more than SQL_N_PLUS_ONE_THRESHOLD times"""
+        threshold = settings.SQL_N_PLUS_ONE_THRESHOLD
+        if not threshold:
+            return []
+        flagged = [{"sql": key, "count": count} for key, count in repeats.items() if count > threshold]
+        for item in flagged:
+            entry_key = (method, route, item["sql"])
+            with self._lock:
+                entry = self._n_plus_one.get(entry_key)
+                first = entry is None
+                if first:
+                    entry = self._n_plus_one[entry_key] = {
+                        "method": method, "route": route, "sql": item["sql"], "requests": 0, "max_count": 0,
+                    }
+                entry["requests"] += 1
+                entry["max_count"] = max(entry["max_count"], item["count"])
+                entry["last_seen"] = datetime.utcnow()
+            sql_n_plus_one_total.inc(method, route)
+            if first:
+                logger.warning("Possible N+1 in %s %s: %d x %s", method, route, item["count"], item["sql"])
+        return flagged
+
+    def snapshot(self, limit: int = 50, sort: str = "total") -> dict:
+        """Fingerprints by total time (or ``count``/``max``), and the N+1 findings"""
+        with self._lock:
+            rows = [(key, *values) for key, values in self._stats.items()]
+            n_plus_one = [dict(entry) for entry in self._n_plus_one.values()]
+        index = {"count": 1, "total": 2, "max": 3}.get(sort, 2)
+        rows.sort(key=lambda row: row[index], reverse=True)
+        n_plus_one.sort(key=lambda entry: entry["max_count"], reverse=True)
+        return {
+            "n_plus_one_threshold": settings.SQL_N_PLUS_ONE_THRESHOLD,
+            "fingerprints": [
+                {
+                    "sql": key,
+                    "count": count,
+                    "total_ms": round(total * 1000, 3),
+                    "avg_ms": round(total * 1000 / count, 4) if count else None,
+                    "max_ms": round(longest * 1000, 3),
+                }
+                for key, count, total, longest in rows[:limit]
+            ],
+            "n_plus_one": n_plus_one,
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+            self._n_plus_one.clear()
+
+
+sql_stats = SqlStats()
@@ -0,0 +1,62 @@
+"""Jinja2 templates with ROOT_PATH applied at compile time"""
+from typing import Any, Optional
+
+from fastapi.templating import Jinja2Templates
+from jinja2 import BaseLoader
+
+from app.config import settings
+from app.middleware.root_path_middleware import ROOT_PATH_APPLIED, rewrite_html, rewrite_location
+
+
+def _root_path() -> str:
+    return (settings.ROOT_PATH or "").rstrip("/")
+
+
+def root_url(value: Optional[str]) -> Optional[str]:
+    """Фильтр ``root_url``: ROOT_PATH для путей из данных (``{{ channel.image_url|root_url }}``)"""
+    root_path = _root_path()
+    if not value or not root_path:
+        return value
+    return rewrite_location(value, root_path)
+
+
+class RootPathLoader(BaseLoader):
+    """Источник шаблона с ROOT_PATH в абсолютных путях
+
+    Переписывается один раз при компиляции шаблона (Jinja кэширует результат),
+    а не в каждом ответе.
+    """
+
+    def __init__(self, loader: BaseLoader):
+        self.loader = loader
+
+    def get_source(self, environment, template: str):
+        source, filename, uptodate = self.loader.get_source(environment, template)
+        root_path = _root_path()
+        if root_path:
+            source = rewrite_html(source, root_path)
+
+        def is_uptodate() -> bool:
+            return _root_path() == root_path and (uptodate is None or uptodate())
+
+        return source, filename, is_uptodate
+
+    def list_templates(self):
+        return self.loader.list_templates()
+
+
+class RootPathTemplates(Jinja2Templates):
+    """Jinja2Templates for the web pages: ROOT_PATH as the ``root_path`` global
+
+    Responses are marked in the scope so RootPathMiddleware passes them through.
+    """
+
+    def __init__(self, directory: str = "app/templates", **env_options: Any):
+        super().__init__(directory=directory, **env_options)
+        self.env.loader = RootPathLoader(self.env.loader)
+        self.env.globals["root_path"] = _root_path()
+        self.env.filters["root_url"] = root_url
+
+    def TemplateResponse(self, name: str, context: dict, *args, **kwargs):
+        context["request"].scope[ROOT_PATH_APPLIED] = True
+        return super().TemplateResponse(name, context, *args, **kwargs)
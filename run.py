@@ -1,6 +1,7 @@
 """Run the application"""
 import uvicorn
 from app.config import settings
+from app.services.metrics import MetricsRegistry
 
 if __name__ == "__main__":
     print(f"Starting {settings.APP_NAME}...")
@@ -19,6 +20,10 @@ if __name__ == "__main__":
         "timeout_keep_alive": settings.WORKER_TIMEOUT,
     }
     
+    # Снимки метрик прошлого запуска не должны попадать в сумму воркеров
+    if settings.METRICS_MULTIPROC_DIR:
+        MetricsRegistry.clear_snapshots(settings.METRICS_MULTIPROC_DIR)
+    
     # Настройка root_path для работы за реверс-прокси
     if settings.ROOT_PATH:
         uvicorn_config["root_path"] = settings.ROOT_PATH
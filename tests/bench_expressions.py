@@ -0,0 +1,59 @@
+"""
+Бенчмарк вычисления math-выражений автоматизации.
+
+Сравнивает прежний путь (regex + проверка символов + eval строки на каждый
+feed) с компилированным выражением из app.services.automation.expression.
+
+Запуск: python -m tests.bench_expressions
+"""
+import math
+import re
+import time
+from types import SimpleNamespace
+
+from app.services.automation.expression import compile_expression
+
+EXPRESSIONS = [
+    "field2 = field1 * 2 + 10",
+    "field3 = sqrt(field1 ^ 2 + field2 ^ 2)",
+    "field4 = round(max(field1, field2, field3) / 3, 1)",
+]
+ITERATIONS = 50_000
+
+
+def legacy_eval(expression: str, feed) -> float:
+    """Путь до компилятора: разбор и eval на каждый вызов"""
+    match = re.match(r'(\w+)\s*=\s*(.+)', expression.strip())
+    source = match.group(2).replace('^', '**')
+    context = {}
+    for i in range(1, 9):
+        value = getattr(feed, f'field{i}', None)
+        context[f'field{i}'] = value if value is not None else 0
+    context.update({'sqrt': math.sqrt, 'abs': abs, 'pow': pow, 'min': min, 'max': max, 'round': round})
+    if not re.match(r'^[a-zA-Z0-9\s\+\-\*\/\(\)\.,_]+$', source):
+        raise ValueError("Invalid characters in expression")
+    return float(eval(source, {"__builtins__": {}}, context))
+
+
+def run(label, fn):
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        fn()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<10} {ITERATIONS / elapsed:>12,.0f} выражений/сек")
+    return elapsed
+
+
+def main():
+    feed = SimpleNamespace(**{f"field{i}": float(i) for i in range(1, 9)})
+    for expression in EXPRESSIONS:
+        compiled = compile_expression(expression)
+        assert compiled(feed) == legacy_eval(expression, feed)
+        print(expression)
+        legacy = run("eval", lambda: legacy_eval(expression, feed))
+        fast = run("compiled", lambda: compiled(feed))
+        print(f"  ускорение x{legacy / fast:.1f}")
+
+
+if __name__ == "__main__":
+    main()
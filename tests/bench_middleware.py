@@ -0,0 +1,123 @@
+"""
+Бенчмарк стека middleware.
+
+Сравнивает прежние middleware на BaseHTTPMiddleware (call_next, отдельная
+задача и поток тела на каждый запрос) с чистыми ASGI middleware из
+app.middleware на /update и /health. Запросы подаются прямо в ASGI-приложение,
+без сети и БД, поэтому измеряются только накладные расходы стека.
+
+Запуск: python -m tests.bench_middleware
+"""
+import asyncio
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.middleware.logging_middleware import RequestLoggingMiddleware
+from app.middleware.rate_limiter import RateLimitMiddleware, rate_limiter
+from app.services.request_log_writer import request_log_writer
+
+REQUESTS = 5_000
+
+
+class LegacyLoggingMiddleware(BaseHTTPMiddleware):
+    """Прежний путь: call_next и запись журнала в буфер"""
+
+    async def dispatch(self, request: Request, call_next):
+        start_time = time.time()
+        endpoint = str(request.url.path)
+        if endpoint.startswith("/static") or endpoint == "/health":
+            return await call_next(request)
+        response = await call_next(request)
+        request_log_writer.record(
+            request.method, endpoint, response.status_code, (time.time() - start_time) * 1000,
+            request.client.host if request.client else None, request.headers.get("user-agent")
+        )
+        return response
+
+
+class LegacyRateLimitMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        if request.url.path.startswith(('/health',)):
+            return await call_next(request)
+        client_id = request.client.host if request.client else "unknown"
+        rate_key = '/update' if request.url.path.startswith('/update') else 'default'
+        rate_limiter.is_allowed(f"{client_id}:{rate_key}", rate_key)
+        return await call_next(request)
+
+
+def build_app(legacy: bool) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/update")
+    def update():
+        return PlainTextResponse("1")
+
+    @app.get("/health")
+    def health():
+        return {"status": "healthy"}
+
+    if legacy:
+        app.add_middleware(LegacyLoggingMiddleware)
+        app.add_middleware(LegacyRateLimitMiddleware)
+    else:
+        app.add_middleware(RequestLoggingMiddleware)
+        app.add_middleware(RateLimitMiddleware)
+    return app
+
+
+async def call(app, path: str) -> int:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": b"", "headers": [(b"host", b"bench"), (b"user-agent", b"bench")],
+        "client": ("127.0.0.1", 5000), "server": ("bench", 80),
+    }
+    status = 0
+    received = False
+    finished = asyncio.Event()
+
+    async def receive():
+        # Как сервер: тело запроса один раз, затем disconnect после ответа
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif not message.get("more_body", False):
+            finished.set()
+
+    await app(scope, receive, send)
+    return status
+
+
+async def run(label: str, app, path: str) -> float:
+    # Прогрев (сборка стека middleware при первом запросе)
+    assert await call(app, path) == 200
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        await call(app, path)
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<16} {REQUESTS / elapsed:>10,.0f} запросов/сек")
+    return elapsed
+
+
+async def main():
+    legacy_app, asgi_app = build_app(legacy=True), build_app(legacy=False)
+    for path in ("/update", "/health"):
+        print(path)
+        legacy = await run("BaseHTTP", legacy_app, path)
+        fast = await run("ASGI", asgi_app, path)
+        print(f"  ускорение x{legacy / fast:.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
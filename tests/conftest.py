@@ -0,0 +1,52 @@
+"""Shared test fixtures"""
+import atexit
+import os
+import shutil
+import tempfile
+from types import SimpleNamespace
+
+# Point the app's default engine at a throwaway directory before anything
+# imports app.config, so tests never write ibolid.db (or its WAL/SHM) in the tree
+_TEST_DB_DIR = tempfile.mkdtemp(prefix="ibolid-tests-")
+atexit.register(shutil.rmtree, _TEST_DB_DIR, True)
+os.environ["DATABASE_TYPE"] = "sqlite"
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TEST_DB_DIR, 'ibolid.db')}"
+
+import pytest  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.database import Base  # noqa: E402
+from app.models import Channel  # noqa: E402
+
+
+@pytest.fixture
+def db_engine(tmp_path):
+    """Engine of a fresh SQLite database with all tables"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'main.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(db_engine):
+    session = sessionmaker(bind=db_engine)()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def channel(db):
+    channel = Channel(name="c")
+    db.add(channel)
+    db.flush()
+    return channel
+
+
+@pytest.fixture
+def make_feed():
+    """Feed-like object with field1..field8 (unset fields are None)"""
+    def make(**fields):
+        return SimpleNamespace(**{f"field{i}": fields.get(f"field{i}") for i in range(1, 9)})
+    return make
@@ -0,0 +1,89 @@
+"""Archive scheduling tests"""
+from datetime import datetime
+
+import pytest
+
+from app.services.archive.cron import CronSchedule, MaintenanceWindow
+from app.services.archive.service import ARCHIVE_MIN_BATCH_SIZE, ArchiveThrottle
+
+
+def test_cron_next_after():
+    assert CronSchedule("0 3 * * *").next_after(datetime(2025, 6, 1, 3, 0)) == datetime(2025, 6, 2, 3, 0)
+    assert CronSchedule("*/15 * * * *").next_after(datetime(2025, 6, 1, 10, 7)) == datetime(2025, 6, 1, 10, 15)
+    # 2025-06-01 is a Sunday
+    assert CronSchedule("30 2 * * mon").next_after(datetime(2025, 6, 1, 12, 0)) == datetime(2025, 6, 2, 2, 30)
+    assert CronSchedule("@monthly").next_after(datetime(2025, 12, 15)) == datetime(2026, 1, 1, 0, 0)
+
+
+def test_cron_rejects_invalid():
+    with pytest.raises(ValueError):
+        CronSchedule("0 25 * * *")
+    with pytest.raises(ValueError):
+        CronSchedule("0 3 * *")
+
+
+def test_maintenance_window_wraps_midnight():
+    window = MaintenanceWindow("22:00", "06:00")
+    assert window.contains(datetime(2025, 6, 1, 23, 30))
+    assert window.contains(datetime(2025, 6, 2, 5, 59))
+    assert not window.contains(datetime(2025, 6, 2, 12, 0))
+    assert window.next_start(datetime(2025, 6, 2, 12, 0)) == datetime(2025, 6, 2, 22, 0)
+    assert window.end_after(datetime(2025, 6, 1, 23, 30)) == datetime(2025, 6, 2, 6, 0)
+
+
+def test_throttle_adapts_batch_size():
+    throttle = ArchiveThrottle(max_lock_ms=1000)
+    throttle.after_batch(500, 0.0)
+    assert throttle.batch_size == 500
+    throttle.batch_size = ARCHIVE_MIN_BATCH_SIZE * 2
+    throttle.max_lock_ms = 1
+    throttle.after_batch(10, 0.002)
+    assert throttle.batch_size == ARCHIVE_MIN_BATCH_SIZE
+
+
+def test_never_matching_cron_is_rejected():
+    from pydantic import ValidationError
+    from app.schemas.archive import ArchiveConfigCore
+
+    with pytest.raises(ValueError):
+        CronSchedule("0 0 30 2 *").next_after(datetime(2025, 1, 1))
+    with pytest.raises(ValidationError):
+        ArchiveConfigCore(schedule_cron="0 0 30 2 *", sqlite_file_path="archive.db")
+    assert ArchiveConfigCore(schedule_cron="0 0 29 2 *", sqlite_file_path="archive.db").schedule_cron == "0 0 29 2 *"
+
+
+def test_scheduler_waits_for_next_window_and_sees_config_changes(tmp_path, monkeypatch):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    import app.services.archive.scheduler as scheduler_module
+    from app.database import Base
+    from app.services.archive.service import load_config
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'main.db'}")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    config = load_config(db)
+    config.enabled = True
+    config.schedule_interval_seconds = 3600
+    config.maintenance_window_start, config.maintenance_window_end = "22:00", "06:00"
+    config.last_run_at = datetime(2025, 6, 2, 4, 59, 30)
+    db.commit()
+
+    runs = []
+    monkeypatch.setattr(scheduler_module, "SessionLocal", Session)
+    monkeypatch.setattr(scheduler_module, "archive_once_with_handling",
+                        lambda session, config, throttle: runs.append(throttle) or (0, 0, 0, None))
+    scheduler = scheduler_module.ArchiveScheduler()
+    monkeypatch.setattr(scheduler, "_renew_lease", lambda: True)
+
+    assert scheduler._execute_cycle(now=datetime(2025, 6, 2, 5, 59)) == 30
+    # Woken just after the window closed: no run at peak time, wait for tonight
+    scheduler._execute_cycle(now=datetime(2025, 6, 2, 6, 0, 1))
+    assert not runs and scheduler.next_run_at == datetime(2025, 6, 2, 22, 0)
+
+    config.maintenance_window_start, config.maintenance_window_end = "05:00", "07:00"
+    db.commit()
+    scheduler._execute_cycle(now=datetime(2025, 6, 2, 6, 0, 1))
+    assert len(runs) == 1 and runs[0].deadline == datetime(2025, 6, 2, 7, 0)
+    db.close()
@@ -0,0 +1,75 @@
+"""Archive downsampling tests"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.models import ArchiveSettings, Channel, Feed
+from app.models.archive_config import ArchiveBackendType
+from app.services.archive.backends import SQLiteArchiveBackend
+from app.services.archive.downsample import aggregate_rows, merge_aggregates, with_means
+from app.services.archive.service import archive_once
+
+
+def make_rows(count, start):
+    return [
+        {"id": i + 1, "channel_id": 1, "created_at": start + timedelta(minutes=10 * i), "field1": float(i)}
+        for i in range(count)
+    ]
+
+
+def test_aggregate_and_merge():
+    rows = make_rows(12, datetime(2025, 1, 1))
+    whole = aggregate_rows(rows, 3600)
+    assert [a["row_count"] for a in whole] == [6, 6]
+    first = with_means(dict(whole[0]))
+    assert (first["field1_min"], first["field1_max"], first["field1_last"]) == (0.0, 5.0, 5.0)
+    assert first["field1_mean"] == 2.5
+
+    # A bucket split across two batches merges to the same result
+    merged = merge_aggregates(aggregate_rows(rows[:4], 3600)[0], aggregate_rows(rows[4:6], 3600)[0])
+    assert merged == whole[0]
+
+
+def test_sqlite_upsert_merges_parts(tmp_path):
+    backend = SQLiteArchiveBackend(str(tmp_path / "archive.db"))
+    backend.init_schema()
+    rows = make_rows(6, datetime(2025, 1, 1))
+    backend.archive_aggregates(aggregate_rows(rows[:2], 3600))
+    backend.archive_aggregates(aggregate_rows(rows[2:], 3600))
+
+    [agg] = backend.read_aggregates(channel_id=1, bucket_seconds=3600)
+    assert agg["row_count"] == 6
+    assert (agg["field1_min"], agg["field1_max"], agg["field1_sum"], agg["field1_last"]) == (0.0, 5.0, 15.0, 5.0)
+    assert agg["field2_min"] is None and agg["field2_count"] == 0
+
+
+def test_archive_once_keeps_only_aggregates_for_old_rows(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'main.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    channel = Channel(name="c")
+    db.add(channel)
+    db.flush()
+
+    now = datetime(2025, 6, 1)
+    for i, age in enumerate([400, 400, 40]):
+        db.add(Feed(channel_id=channel.id, entry_id=i + 1, created_at=now - timedelta(days=age), field1=float(i)))
+    db.commit()
+
+    config = ArchiveSettings(
+        backend_type=ArchiveBackendType.SQLITE,
+        sqlite_file_path=str(tmp_path / "archive.db"),
+        retention_days=30,
+        copy_then_delete=True,
+        downsample_bucket_seconds=86400,
+        aggregate_only_after_days=365,
+    )
+    processed, deleted, _ = archive_once(db, config, now=now)
+
+    assert (processed, deleted) == (3, 3)
+    backend = SQLiteArchiveBackend(config.sqlite_file_path)
+    assert backend.count_records() == 1
+    assert sum(a["row_count"] for a in backend.read_aggregates()) == 3
+    db.close()
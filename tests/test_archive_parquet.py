@@ -0,0 +1,115 @@
+"""Parquet archive backend tests"""
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from app.services.archive.backends import ParquetArchiveBackend
+
+
+def make_rows(channel_id, start_id, count, start_time):
+    return [
+        {
+            "id": start_id + i,
+            "channel_id": channel_id,
+            "entry_id": i + 1,
+            "created_at": start_time + timedelta(days=i),
+            "field1": float(i),
+            "status": "ok",
+        }
+        for i in range(count)
+    ]
+
+
+def test_archive_and_count(tmp_path):
+    backend = ParquetArchiveBackend(str(tmp_path))
+    backend.init_schema()
+
+    rows = make_rows(1, 1, 40, datetime(2025, 1, 1))
+    assert backend.archive_batch(rows) == 40
+    assert backend.count_records() == 40
+
+    # Re-archiving the same rows does not duplicate them
+    assert backend.archive_batch(rows[:10]) == 10
+    assert backend.count_records() == 40
+
+    # One file per channel/month partition
+    months = {entry["month"] for entry in backend._load_manifest()["files"]}
+    assert months == {"2025-01", "2025-02"}
+
+
+def test_read_range_prunes_files(tmp_path):
+    backend = ParquetArchiveBackend(str(tmp_path))
+    backend.init_schema()
+    backend.archive_batch(make_rows(1, 1, 60, datetime(2025, 1, 1)))
+    backend.archive_batch(make_rows(2, 1000, 60, datetime(2025, 1, 1)))
+
+    opened = []
+    original = backend._pq.read_table
+
+    def tracking_read_table(path, *args, **kwargs):
+        opened.append(path)
+        return original(path, *args, **kwargs)
+
+    backend._pq.read_table = tracking_read_table
+    batches = list(backend.read_range(
+        channel_id=2,
+        start=datetime(2025, 2, 5),
+        end=datetime(2025, 2, 10),
+        batch_size=4,
+    ))
+    rows = [row for batch in batches for row in batch]
+
+    assert [row["created_at"].day for row in rows] == [5, 6, 7, 8, 9, 10]
+    assert all(row["channel_id"] == 2 for row in rows)
+    assert len(opened) == 1
+
+
+def test_compact_and_read_all(tmp_path):
+    backend = ParquetArchiveBackend(str(tmp_path))
+    backend.init_schema()
+    for chunk in range(3):
+        backend.archive_batch(make_rows(1, 1 + chunk * 5, 5, datetime(2025, 3, 1 + chunk * 5)))
+    # Ids of another channel interleave with channel 1
+    backend.archive_batch([dict(row, id=100 + 2 * row["id"]) for row in make_rows(2, 0, 6, datetime(2025, 3, 1))])
+    backend.archive_batch([dict(row, id=101 + 2 * row["id"]) for row in make_rows(2, 0, 1, datetime(2025, 4, 1))])
+    assert len(backend._load_manifest()["files"]) == 5
+
+    def read_ids(offset=0):
+        return [row["id"] for batch in backend.read_all(batch_size=4, offset=offset) for row in batch]
+
+    before = read_ids(offset=3)
+    backend.compact()
+
+    assert len(backend._load_manifest()["files"]) == 3
+    assert read_ids() == sorted(read_ids()) and len(read_ids()) == 22
+    assert read_ids(offset=3) == before
+
+
+def test_read_range_all_channels_by_created_at(tmp_path):
+    backend = ParquetArchiveBackend(str(tmp_path))
+    backend.init_schema()
+    backend.archive_batch(make_rows(1, 1, 10, datetime(2025, 1, 1)))
+    backend.archive_batch(make_rows(2, 100, 10, datetime(2025, 1, 1, 12)))
+
+    rows = [row for batch in backend.read_range(batch_size=3) for row in batch]
+
+    assert [row["created_at"] for row in rows] == sorted(row["created_at"] for row in rows)
+    assert [row["channel_id"] for row in rows[:4]] == [1, 2, 1, 2]
+
+
+def test_aggregates_merge_on_read_and_compact(tmp_path):
+    from app.services.archive.downsample import aggregate_rows
+
+    backend = ParquetArchiveBackend(str(tmp_path))
+    backend.init_schema()
+    rows = make_rows(1, 1, 4, datetime(2025, 1, 1))
+    backend.archive_aggregates(aggregate_rows(rows[:2], 86400))
+    backend.archive_aggregates(aggregate_rows(rows[2:], 86400))
+
+    before = backend.read_aggregates(channel_id=1)
+    assert sum(a["row_count"] for a in before) == 4
+    backend.compact()
+    assert len(backend._load_manifest()["aggregates"]) == 1
+    assert backend.read_aggregates(channel_id=1) == before
@@ -0,0 +1,123 @@
+"""Request log retention tests"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+from app.models import ArchiveSettings, RequestLog, RequestLogHourly
+from app.services.archive.backends import SQLiteArchiveBackend
+from app.services.archive.request_logs import archive_request_logs, normalize_endpoint, percentile
+
+
+def test_normalize_endpoint():
+    assert normalize_endpoint("/channels/5/feeds.json") == "/channels/{id}/feeds.json"
+    assert normalize_endpoint("/api/channels/12/automation/3") == "/api/channels/{id}/automation/{id}"
+    assert normalize_endpoint("/update") == "/update"
+
+
+def test_percentile():
+    values = sorted(float(v) for v in range(1, 101))
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 99) == 99.0
+    assert percentile([], 50) is None
+
+
+def test_archive_request_logs_rolls_up_and_deletes(tmp_path, db):
+    now = datetime(2025, 6, 10, 12, 30)
+    old_hour = datetime(2025, 6, 1, 8, 0)
+    for i in range(10):
+        db.add(RequestLog(
+            timestamp=old_hour + timedelta(minutes=i),
+            endpoint=f"/channels/{i % 2 + 1}/feeds.json",
+            method="GET",
+            response_status=500 if i == 0 else 200,
+            response_time=float(i + 1),
+        ))
+    # Sampled at 1%: each row stands for 100 requests
+    for i, latency in enumerate((2.0, 30.0)):
+        db.add(RequestLog(timestamp=old_hour + timedelta(minutes=i), endpoint="/update", method="POST",
+                          response_status=200, response_time=latency, sample_weight=100.0))
+    db.add(RequestLog(timestamp=now, endpoint="/update", method="GET", response_status=200, response_time=1.0))
+    db.commit()
+
+    backend = SQLiteArchiveBackend(str(tmp_path / "archive.db"))
+    backend.init_schema()
+    config = ArchiveSettings(request_log_retention_days=7)
+
+    archived, deleted = archive_request_logs(db, config, backend, now=now)
+
+    assert (archived, deleted) == (12, 12)
+    assert db.query(RequestLog).count() == 1
+    hourly, update = db.query(RequestLogHourly).order_by(RequestLogHourly.endpoint).all()
+    assert hourly.endpoint == "/channels/{id}/feeds.json"
+    assert hourly.request_count == 10
+    assert hourly.status_5xx == 1
+    assert hourly.latency_p50 == 5.0
+    assert (update.request_count, update.status_2xx, update.latency_sum) == (200, 200, 3200.0)
+    assert (update.latency_p50, update.latency_p95) == (2.0, 30.0)
+    with backend.engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM request_logs_archive")).scalar() == 12
+
+
+def test_request_log_writer_samples_batches_and_drops(db, db_engine, monkeypatch):
+    import asyncio
+    import app.services.request_log_writer as writer_module
+    from app.config import settings
+
+    monkeypatch.setattr(writer_module, "SessionLocal", sessionmaker(bind=db_engine))
+    monkeypatch.setattr(settings, "REQUEST_LOG_BUFFER_SIZE", 5)
+    monkeypatch.setattr(settings, "REQUEST_LOG_BATCH_SIZE", 2)
+    monkeypatch.setattr(settings, "REQUEST_LOG_SAMPLE_UPDATE", 0.0)
+    writer = writer_module.RequestLogWriter()
+
+    assert not writer.record("GET", "/update", 200, 1.0)
+    assert writer.record("GET", "/update", 400, 1.0)  # errors are never sampled out
+    for i in range(6):
+        writer.record("GET", f"/channels/{i}/feeds.json", 200, 2.0)
+    stats = writer.stats()
+    assert (stats["buffered"], stats["dropped"]) == (5, 2)
+    assert stats["sampled_out"]["update"] == 1 and stats["seen"]["read"] == 6
+
+    async def scenario():
+        await writer.start()
+        await writer.stop()
+
+    asyncio.run(scenario())
+    endpoints = [row.endpoint for row in db.query(RequestLog).order_by(RequestLog.id)]
+    assert endpoints == [f"/channels/{i}/feeds.json" for i in range(1, 6)]
+    assert {row.sample_weight for row in db.query(RequestLog)} == {1.0}
+    assert (writer.stats()["written"], writer.stats()["batches"]) == (5, 3)
+
+
+def test_request_minutes_count_every_request(db, db_engine, monkeypatch):
+    import asyncio
+    import app.services.request_log_writer as writer_module
+    from app.config import settings
+    from app.services import request_stats
+
+    assert request_stats.histogram_percentile([0, 10, 0], 50) == 1.75  # inside the 1..2.5 ms bucket
+    assert request_stats.histogram_percentile([0] * 11 + [4], 99, latency_max=4000.0) <= 4000.0
+
+    monkeypatch.setattr(writer_module, "SessionLocal", sessionmaker(bind=db_engine))
+    monkeypatch.setattr(settings, "REQUEST_LOG_SAMPLE_UPDATE", 0.0)
+    writer = writer_module.RequestLogWriter()
+    for i in range(100):
+        writer.record("POST", "/update", 200, 2.0 if i < 90 else 40.0, route="/update")
+    writer.record("POST", "/update", 500, 300.0, route="/update")
+    writer.record("GET", "/channels/7/feeds.json", 200, 8.0)  # no route: numeric segments collapsed
+
+    async def scenario():
+        await writer.start()
+        await writer.stop()
+
+    asyncio.run(scenario())
+    assert db.query(RequestLog).count() == 2  # the /update error and the read: successful /update is sampled out
+    since = datetime.utcnow() - timedelta(hours=1)
+    totals = request_stats.totals(db, since)
+    assert (totals["count"], totals["status_2xx"], totals["status_5xx"]) == (102, 101, 1)
+    assert totals["max_response_time"] == 300.0 and 1.0 < totals["p50"] <= 2.5 and 25 < totals["p95"] <= 50
+    top = request_stats.top_endpoints(db, since)
+    assert [(e["endpoint"], e["count"], e["errors"]) for e in top] == [
+        ("/update", 101, 1), ("/channels/{id}/feeds.json", 1, 0)]
+    points = request_stats.timeline(db, since, step_minutes=10)
+    assert len(points) == 7 and sum(p["count"] for p in points) == 102 and sum(p["errors"] for p in points) == 1
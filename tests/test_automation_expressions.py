@@ -0,0 +1,30 @@
+"""Automation expression compiler tests"""
+import pytest
+
+from app.services.automation.expression import ExpressionError, compile_expression
+
+
+def test_expression_compiler(make_feed):
+    expr = compile_expression("field3 = sqrt(field1 ^ 2 + field2 ** 2) - -1")
+    assert expr.target_field == "field3"
+    assert expr(make_feed(field1=3.0, field2=4.0)) == 6.0
+    assert compile_expression("field2 = round(field1 / 3, 1)")(make_feed(field1=10.0)) == 3.3
+
+    for bad in [
+        "field2 = __import__('os')",
+        "field2 = field1.real",
+        "field2 = (lambda: 1)()",
+        "field2 = min(field1)",
+        "field2 = round(field1, ndigits=1)",
+        "field9 = 1",
+        "field2 = field1 > 1",
+        "field2 = " + "-" * 990 + "field1",  # RecursionError while compiling
+        "field2 = " + "(" * 100000 + "1",  # over MAX_EXPRESSION_LENGTH
+    ]:
+        with pytest.raises(ExpressionError):
+            compile_expression(bad)
+    with pytest.raises(ValueError):
+        compile_expression("field2 = 9 ** 9 ** 9")(make_feed())
+    with pytest.raises(ValueError):  # nested powers overflow at once instead of building huge ints
+        compile_expression("field1 = ((10^1000)^1000)^100")(make_feed())
+    assert compile_expression("field2 = field1 ^ 3")(make_feed(field1=2)) == 8.0
@@ -0,0 +1,37 @@
+"""Sticky automation output tests"""
+import asyncio
+
+from sqlalchemy import event
+
+from app.models.automation_rule import AutomationRule
+from app.schemas.feed import FeedCreate
+from app.services import feed_service
+from app.services.automation.compiler import plan_cache
+from app.services.automation.outputs import sticky_outputs
+from app.services.automation_service import automation_engine
+
+
+def test_sticky_outputs_skip_last_feed_query(db, db_engine, channel):
+    db.add(AutomationRule(channel_id=channel.id, name="relay", rule_type="condition", priority=0,
+                          trigger_field="field1", condition=">", threshold_value=5,
+                          target_field="field2", action_type="set_value", action_value=1))
+    db.commit()
+    plan_cache.invalidate()
+    sticky_outputs.forget()
+
+    feed = feed_service.create_feed(db, channel, FeedCreate(field1=9), auto_commit=False)
+    automation_engine.execute_rules(channel.id, feed, db)
+    db.commit()
+    asyncio.run(automation_engine.after_commit(db))
+
+    db.refresh(channel)  # as loaded by the next request
+    statements = []
+    event.listen(db_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    values = automation_engine.preserve_output_fields(db, channel, {"field1": 3.0, "field2": None})
+    assert values == {"field1": 3.0, "field2": 1.0}
+    assert statements == []
+
+    # A write by another worker: the record is stale and reloaded once
+    feed_service.create_feed(db, channel, FeedCreate(field1=1, field2=0), auto_commit=True)
+    values = automation_engine.preserve_output_fields(db, channel, {"field1": 3.0, "field2": None})
+    assert values["field2"] == 0.0
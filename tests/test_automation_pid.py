@@ -0,0 +1,32 @@
+"""Automation PID state tests"""
+from app.models.automation_rule import AutomationRule
+from app.services.automation.pid_state import PidStateStore, pid_step
+
+
+def test_pid_state_owner_checkpoints_deltas(db, channel):
+    assert pid_step(0.0, None, None, 2.0, 100.0) == (0.0, 0.0, 0.0)
+    assert pid_step(0.0, 1.0, 100.0, 2.0, 110.0) == (20.0, 0.1, 10.0)
+
+    rule = AutomationRule(channel_id=channel.id, name="pid", rule_type="pid", pid_integral=0.0, pid_last_error=0.0)
+    db.add(rule)
+    db.commit()
+
+    store = PidStateStore()
+    # Shared path writes the row in the feed transaction
+    store.update(db, rule.id, channel.id, 1.0, 100.0)
+    store.update(db, rule.id, channel.id, 1.0, 110.0)
+    db.commit()
+    db.refresh(rule)
+    assert rule.pid_integral == 10.0
+
+    # Owner keeps state in memory until the checkpoint
+    store._owned.add(channel.id)
+    assert store.update(db, rule.id, channel.id, 2.0, 120.0) == (30.0, 0.1)
+    db.query(AutomationRule).filter(AutomationRule.id == rule.id).update(
+        {AutomationRule.pid_integral: AutomationRule.pid_integral + 5.0}  # another worker
+    )
+    db.commit()
+    assert store.checkpoint(db) == 1
+    db.refresh(rule)
+    assert rule.pid_integral == 35.0
+    assert store.update(db, rule.id, channel.id, 0.0, 130.0)[0] == 35.0
@@ -0,0 +1,51 @@
+"""Automation plan cache and rule metrics tests"""
+from app.models.automation_rule import AutomationRule
+from app.services.automation.compiler import plan_cache
+from app.services.automation.metrics import automation_metrics
+from app.services.automation_service import automation_engine, get_output_fields
+
+
+def test_plan_is_cached_and_invalidated(db, channel, make_feed):
+    db.add_all([
+        AutomationRule(channel_id=channel.id, name="cond", rule_type="condition", priority=0,
+                       trigger_field="field1", condition=">", threshold_value=5,
+                       target_field="field2", action_type="set_value", action_value=1),
+        AutomationRule(channel_id=channel.id, name="math", rule_type="math", priority=1,
+                       expression="field3 = field2 * 10 + sqrt(field1)"),
+        AutomationRule(channel_id=channel.id, name="broken", rule_type="math", priority=2,
+                       expression="field4 = __import__('os')"),
+    ])
+    db.commit()
+    plan_cache.invalidate()
+
+    feed = automation_engine.execute_rules(channel.id, make_feed(field1=9.0), db)
+    assert (feed.field2, feed.field3, feed.field4) == (1, 13.0, None)
+    assert get_output_fields(channel.id, db) == {"field2", "field3"}
+
+    # Cached plan: rule changes are only seen after invalidation
+    db.query(AutomationRule).filter(AutomationRule.name == "cond").update({"action_value": 2})
+    db.commit()
+    assert automation_engine.execute_rules(channel.id, make_feed(field1=9.0), db).field2 == 1
+    automation_engine.invalidate(channel.id)
+    assert automation_engine.execute_rules(channel.id, make_feed(field1=9.0), db).field2 == 2
+
+
+def test_rule_metrics(db, channel, make_feed):
+    db.add_all([
+        AutomationRule(channel_id=channel.id, name="cond", rule_type="condition", priority=0,
+                       trigger_field="field1", condition=">", threshold_value=5,
+                       target_field="field2", action_type="set_value", action_value=1),
+        AutomationRule(channel_id=channel.id, name="div", rule_type="math", priority=1,
+                       expression="field3 = 1 / field1"),
+    ])
+    db.commit()
+    plan_cache.invalidate()
+    automation_metrics.reset()
+
+    for value in (9.0, 0.0, 1.0):
+        automation_engine.execute_rules(channel.id, make_feed(field1=value), db)
+    stats = {m["name"]: m for m in automation_metrics.snapshot(channel.id)}
+    assert (stats["cond"]["executions"], stats["cond"]["fires"], stats["cond"]["errors"]) == (3, 1, 0)
+    assert (stats["div"]["executions"], stats["div"]["fires"], stats["div"]["errors"]) == (3, 2, 1)
+    assert stats["div"]["last_error"].startswith("ZeroDivisionError")
+    assert stats["cond"]["p99_ms"] is not None
@@ -0,0 +1,71 @@
+"""Automation replay tests"""
+import time
+
+from sqlalchemy.orm import sessionmaker
+
+from app.models.automation_rule import AutomationRule
+from app.models.feed import Feed
+from app.services import lease_service
+from app.services.automation import replay
+from app.services.automation.replay import ReplayJob, run_replay
+
+
+def test_replay_dry_run_and_apply(db, channel):
+    rules = [
+        AutomationRule(channel_id=channel.id, name="cond", rule_type="condition", priority=0,
+                       trigger_field="field1", condition=">", threshold_value=5,
+                       target_field="field2", action_type="set_value", action_value=1),
+        AutomationRule(channel_id=channel.id, name="math", rule_type="math", priority=1,
+                       expression="field3 = 10 / field1"),
+        AutomationRule(channel_id=channel.id, name="pid", rule_type="pid", priority=2),
+        AutomationRule(channel_id=channel.id, name="remote", rule_type="condition", priority=3,
+                       trigger_channel_id=channel.id + 1, trigger_field="field1", condition=">",
+                       threshold_value=5, target_field="field4", action_type="set_value", action_value=1),
+    ]
+    db.add_all(rules)
+    db.add_all([Feed(channel_id=channel.id, entry_id=i, field1=v, field3=-1.0)
+                for i, v in enumerate((0.0, 4.0, 8.0, None), 1)])
+    db.commit()
+
+    def replay(dry_run, vectorized):
+        job = ReplayJob(channel.id, dry_run)
+        job.vectorized = vectorized and job.vectorized
+        return run_replay(db, job, rules, chunk_size=3)
+
+    for vectorized in (True, False):
+        job = replay(True, vectorized)
+        assert job.status == "done" and job.processed == 4
+        # field1=0 and None: 10/x fails and field3 keeps its value
+        assert job.changed_values == {"field2": 1, "field3": 2}
+        assert job.skipped_rules == ["pid", "remote"]
+
+    assert replay(False, True).changed_rows == 2
+    values = [(f.field2, f.field3) for f in db.query(Feed).order_by(Feed.id)]
+    assert values == [(None, -1.0), (None, 2.5), (1.0, 1.25), (None, -1.0)]
+    assert replay(True, True).changed_rows == 0
+
+
+def test_replay_jobs_are_shared_through_the_database(db, db_engine, channel, monkeypatch):
+    monkeypatch.setattr(replay, "SessionLocal", sessionmaker(bind=db_engine))
+    db.add(AutomationRule(channel_id=channel.id, name="math", rule_type="math", priority=0,
+                          expression="field2 = field1 * 2"))
+    db.add_all([Feed(channel_id=channel.id, entry_id=i, field1=float(i)) for i in range(1, 4)])
+    db.commit()
+
+    job = replay.start_replay(db, channel.id)
+    for _ in range(100):
+        db.expire_all()
+        polled = replay.get_job(db, job.id)
+        if polled.status != "running":
+            break
+        time.sleep(0.02)
+    assert polled.status == "done" and polled.processed == 3 and polled.changed_values == {"field2": 3}
+
+    # Another worker holds the channel lease: the start is refused
+    lease_service.try_acquire(db, f"automation-replay:{channel.id}", 60, holder="other:1:abc")
+    assert replay.start_replay(db, channel.id) is None
+
+    # A running job whose worker died (no lease of its own) is reported as failed
+    stale = replay.ReplayJob(channel.id, True)
+    stale.save(db)
+    assert replay.get_job(db, stale.id).status == "error"
@@ -0,0 +1,52 @@
+"""Automation simulation tests"""
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from app.models.automation_rule import AutomationRule
+from app.models.feed import Feed
+from app.services.automation import simulation
+from app.services.automation.pid_state import pid_step
+
+
+def test_simulation_matches_live_pid_without_writes(db, channel, monkeypatch):
+    pid = AutomationRule(channel_id=channel.id, name="pid", rule_type="pid", priority=0,
+                         trigger_field="field1", target_field="field2", pid_setpoint=20,
+                         pid_kp=2, pid_ki=0.1, pid_kd=0.5, pid_output_min=0, pid_output_max=100)
+    db.add(pid)
+    db.commit()
+
+    draft = SimpleNamespace(name="alarm", rule_type="condition", priority=1, trigger_field="field2",
+                            condition=">", threshold_value=50, target_field="field3",
+                            action_type="set_value", action_value=1)
+    rules = [simulation.rule_snapshot(pid, channel.id), simulation.rule_snapshot(draft, channel.id)]
+    start = datetime(2026, 1, 1)
+    timestamps = [start + timedelta(seconds=s) for s in (0, 5, 5, 12, 30, 31, 4000)]
+    temps = [15.0, 16.5, None, 18.0, 30.0, 19.0, 10.0]
+    data = simulation.input_from_samples(timestamps, {"field1": temps})
+
+    expected, integral, last_error, last_ts = [], 0.0, None, None
+    for t, temp in zip(timestamps, temps):
+        if temp is None:
+            expected.append(None)
+            continue
+        error = 20 - temp
+        increment, derivative, _ = pid_step(integral, last_error, last_ts, error, t.timestamp())
+        integral += increment
+        last_error, last_ts = error, t.timestamp()
+        expected.append(round(max(0, min(100, 2 * error + 0.1 * integral + 0.5 * derivative)), 2))
+
+    vectorized = simulation.simulate(rules, data)
+    assert vectorized["vectorized"]
+    assert vectorized["fields"]["field2"] == pytest.approx(expected)
+    assert vectorized["fields"]["field3"] == [1.0 if v is not None and v > 50 else None for v in expected]
+    assert vectorized["outputs"] == ["field2", "field3"]
+    monkeypatch.setattr(simulation, "np", None)
+    rows = simulation.simulate(rules, data)
+    assert rows["fields"] == vectorized["fields"]
+
+    with pytest.raises(simulation.SimulationError):
+        simulation.input_from_samples(None, {"field1": [1.0], "field2": [1.0, 2.0]})
+    db.refresh(pid)
+    assert pid.pid_integral == 0 and db.query(Feed).count() == 0
@@ -0,0 +1,150 @@
+"""Cross-channel triggers and post-commit queue tests"""
+import asyncio
+import threading
+
+import pytest
+
+import app.services.automation.post_commit as post_commit
+from app.config import settings
+from app.models import Channel
+from app.models.automation_rule import AutomationRule
+from app.models.feed import Feed
+from app.schemas.feed import FeedCreate
+from app.services import feed_service
+from app.services.automation.compiler import plan_cache
+from app.services.automation.triggers import dependency_graph, find_cycle, last_values, propagation_order
+from app.services.automation_service import automation_engine
+
+
+def test_cross_channel_trigger_fires_dependents(db):
+    edges = {1: {2, 3}, 2: {4}, 3: {4}}
+    assert propagation_order(edges, 1) == [2, 3, 4]
+    assert find_cycle(edges, 4, 1) in ([4, 1, 2, 4], [4, 1, 3, 4])
+    assert find_cycle(edges, 1, 4) is None
+
+    room, boiler, alarm = Channel(name="room"), Channel(name="boiler"), Channel(name="alarm")
+    db.add_all([room, boiler, alarm])
+    db.flush()
+    db.add_all([
+        AutomationRule(channel_id=boiler.id, name="heat", rule_type="condition", trigger_channel_id=room.id,
+                       trigger_field="field1", condition="<", threshold_value=20,
+                       target_field="field2", action_type="set_value", action_value=1),
+        AutomationRule(channel_id=alarm.id, name="alarm", rule_type="condition", trigger_channel_id=boiler.id,
+                       trigger_field="field2", condition="==", threshold_value=1,
+                       target_field="field1", action_type="set_value", action_value=5),
+    ])
+    db.commit()
+    plan_cache.invalidate()
+    dependency_graph.invalidate()
+    last_values.forget()
+
+    for value in (18.0, 17.0):
+        feed = feed_service.create_feed(db, room, FeedCreate(field1=value), auto_commit=False)
+        automation_engine.execute_rules(room.id, feed, db)
+        db.commit()
+        # No queue workers in tests: the post-commit phase runs inline
+        asyncio.run(automation_engine.after_commit(db))
+    # Second write does not change the boiler output, so no new feeds
+    assert [f.field2 for f in db.query(Feed).filter(Feed.channel_id == boiler.id)] == [1.0]
+    assert [f.field1 for f in db.query(Feed).filter(Feed.channel_id == alarm.id)] == [5.0]
+    assert last_values.get(db, boiler.id, "field2") == 1.0
+
+
+def test_post_commit_queue_retries_and_coalesces(monkeypatch):
+    class FakeSession:
+        def commit(self): pass
+        def rollback(self): pass
+        def close(self): pass
+
+    monkeypatch.setattr(post_commit, "SessionLocal", FakeSession)
+    monkeypatch.setattr(post_commit, "RETRY_BASE_DELAY_SECONDS", 0)
+    monkeypatch.setattr(settings, "AUTOMATION_POST_COMMIT_WORKERS", 1)
+    calls = []
+    release = threading.Event()
+
+    def flaky(db):
+        release.wait(5)  # keeps the only worker busy while the keyed tasks queue up
+        calls.append("flaky")
+        if len(calls) == 1:
+            raise RuntimeError("database is locked")
+
+    async def scenario():
+        queue = post_commit.PostCommitQueue()
+        await queue.start()
+        await queue.submit(post_commit.PostCommitTask("flaky", flaky))
+        await asyncio.sleep(0.05)
+        await queue.submit(post_commit.PostCommitTask("a", lambda db: calls.append("a"), key="k"))
+        await queue.submit(post_commit.PostCommitTask("b", lambda db: calls.append("b"), key="k"))
+        release.set()
+        await queue.stop()
+        return queue.stats()
+
+    stats = asyncio.run(scenario())
+    assert calls == ["flaky", "flaky", "a"]
+    assert (stats["completed"], stats["retried"], stats["coalesced"], stats["failed"]) == (2, 1, 1, 0)
+
+
+def test_post_commit_queue_backpressure_keeps_fan_out(monkeypatch):
+    class FakeSession:
+        rolled_back = False
+        def commit(self): pass
+        def rollback(self): self.rolled_back = True
+        def close(self): pass
+
+    def broken(db):
+        raise RuntimeError("database is locked")
+
+    # Without workers the task runs inline: a failure is counted, not raised to the request
+    queue = post_commit.PostCommitQueue()
+    db = FakeSession()
+    asyncio.run(queue.submit(post_commit.PostCommitTask("broken", broken), db))
+    assert db.rolled_back and queue.stats()["failed"] == 1
+
+    monkeypatch.setattr(post_commit, "SessionLocal", FakeSession)
+    monkeypatch.setattr(post_commit, "PUT_TIMEOUT_SECONDS", 0.1)
+    monkeypatch.setattr(settings, "AUTOMATION_POST_COMMIT_QUEUE_SIZE", 1)
+    monkeypatch.setattr(settings, "AUTOMATION_POST_COMMIT_WORKERS", 1)
+    release = threading.Event()
+    calls = []
+
+    async def scenario():
+        await queue.start()
+        await queue.submit(post_commit.PostCommitTask("busy", lambda db: release.wait(5)))
+        await asyncio.sleep(0.05)
+        await queue.submit(post_commit.PostCommitTask("queued", lambda db: calls.append("queued")))
+        # Full queue: the producer waits, then an unkeyed task is dropped and a keyed one parked
+        await queue.submit(post_commit.PostCommitTask("extra", lambda db: calls.append("extra")))
+        await queue.submit(post_commit.PostCommitTask("fire", lambda db: calls.append("fire"), key="k"))
+        await queue.submit(post_commit.PostCommitTask("fire again", lambda db: calls.append("again"), key="k"))
+        parked = queue.stats()["parked"]
+        release.set()
+        await queue.stop()
+        return parked
+
+    assert asyncio.run(scenario()) == 1
+    assert calls == ["queued", "fire"]
+    stats = queue.stats()
+    assert (stats["dropped"], stats["coalesced"], stats["parked"]) == (1, 1, 0)
+
+
+def test_deleted_trigger_channel_deactivates_dependent_rules(db):
+    from fastapi import HTTPException
+    from app.routers.automation import _validate_trigger_channel
+    from app.services import channel_service
+
+    source, other = Channel(name="source"), Channel(name="other")
+    db.add_all([source, other])
+    db.flush()
+    rule = AutomationRule(channel_id=other.id, name="heat", rule_type="condition", trigger_channel_id=source.id,
+                          trigger_field="field1", condition="<", threshold_value=20,
+                          target_field="field2", action_type="set_value", action_value=1)
+    db.add(rule)
+    db.commit()
+
+    with pytest.raises(HTTPException) as error:
+        _validate_trigger_channel(db, other.id, source.id, None, "math")
+    assert error.value.status_code == 400
+
+    channel_service.delete_channel(db, source)
+    db.refresh(rule)
+    assert (rule.is_active, rule.trigger_channel_id) == (False, None)
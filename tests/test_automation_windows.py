@@ -0,0 +1,87 @@
+"""Windowed automation rule tests"""
+from datetime import datetime, timedelta
+
+from app.models.automation_rule import AutomationRule
+from app.models.feed import Feed
+from app.services.automation.compiler import plan_cache
+from app.services.automation.windows import RingBuffer, window_state_store
+from app.services.automation_service import automation_engine
+
+
+def test_window_rules_keep_state_and_rebuild(db, channel, monkeypatch):
+    ring = RingBuffer(3)
+    for i in range(5):
+        ring.append(float(i), float(i))
+    assert list(ring.values()) == [2.0, 3.0, 4.0] and ring.total == 9.0
+
+    rules = [
+        AutomationRule(channel_id=channel.id, name="avg", rule_type="moving_average", priority=0,
+                       trigger_field="field1", target_field="field2", window_seconds=600),
+        AutomationRule(channel_id=channel.id, name="hyst", rule_type="hysteresis", priority=1,
+                       trigger_field="field1", target_field="field3", threshold_value=25, threshold_low=20),
+        AutomationRule(channel_id=channel.id, name="rate", rule_type="derivative", priority=2,
+                       trigger_field="field1", target_field="field4"),
+    ]
+    db.add_all(rules)
+    start = datetime.utcnow() - timedelta(seconds=300)
+    # History older than the window is ignored by the rebuild
+    db.add(Feed(channel_id=channel.id, entry_id=1, created_at=start - timedelta(hours=1), field1=100.0))
+    db.add(Feed(channel_id=channel.id, entry_id=2, created_at=start, field1=10.0))
+    db.commit()
+    plan_cache.invalidate()
+    for rule in rules:
+        window_state_store.forget(rule.id)
+
+    outputs = []
+    for entry_id, value in [(3, 26.0), (4, 22.0), (5, 19.0)]:
+        feed = Feed(channel_id=channel.id, entry_id=entry_id, field1=value,
+                    created_at=start + timedelta(seconds=10 * (entry_id - 2)))
+        db.add(feed)
+        db.flush()
+        automation_engine.execute_rules(channel.id, feed, db)
+        outputs.append((feed.field2, feed.field3, feed.field4))
+    assert outputs == [(18.0, 1.0, 1.6), (19.33, 1.0, -0.4), (19.25, 0.0, -0.3)]
+
+    # A gap in entry_id (written by another worker) appends only the missed rows
+    rebuilds = []
+    monkeypatch.setattr(window_state_store, "rebuild", lambda *args, **kwargs: rebuilds.append(args))
+    db.add(Feed(channel_id=channel.id, entry_id=6, created_at=start + timedelta(seconds=40), field1=13.0))
+    feed = Feed(channel_id=channel.id, entry_id=7, created_at=start + timedelta(seconds=50), field1=10.0)
+    db.add(feed)
+    db.flush()
+    automation_engine.execute_rules(channel.id, feed, db)
+    assert feed.field2 == 16.67 and feed.field3 == 0.0 and not rebuilds
+
+
+def test_cross_channel_window_samples_source_feeds(db, channel):
+    from app.models import Channel
+
+    source = Channel(name="source")
+    db.add(source)
+    db.flush()
+    rule = AutomationRule(channel_id=channel.id, name="avg", rule_type="moving_average", trigger_channel_id=source.id,
+                          trigger_field="field1", target_field="field2", window_seconds=600)
+    db.add(rule)
+    start = datetime.utcnow() - timedelta(seconds=100)
+    db.add(Feed(channel_id=source.id, entry_id=1, created_at=start, field1=10.0))
+    db.commit()
+    plan_cache.invalidate()
+    window_state_store.forget(rule.id)
+
+    def own_write(entry_id):
+        feed = Feed(channel_id=channel.id, entry_id=entry_id, created_at=datetime.utcnow(), field1=1.0)
+        db.add(feed)
+        db.flush()
+        automation_engine.execute_rules(channel.id, feed, db)
+        return feed.field2
+
+    assert own_write(1) == 10.0
+    # Writes of the dependent channel itself add no samples
+    assert own_write(2) is None
+    db.add(Feed(channel_id=source.id, entry_id=2, created_at=start + timedelta(seconds=10), field1=20.0))
+    db.flush()
+    assert own_write(3) == 15.0
+
+    live = window_state_store._states[rule.id]
+    rebuilt = window_state_store.rebuild(db, live.spec)
+    assert (rebuilt.output, rebuilt.last_entry_id) == (live.output, live.last_entry_id)
@@ -0,0 +1,85 @@
+"""Prometheus metrics tests"""
+import os
+import subprocess
+import sys
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.middleware.logging_middleware import RequestLoggingMiddleware
+from app.services.metrics import MetricsRegistry, http_request_seconds
+
+
+def test_render_and_sum_worker_snapshots(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_MULTIPROC_DIR", str(tmp_path))
+    worker = MetricsRegistry()
+    worker.counter("jobs_total", "Jobs", ("kind",)).inc("a", amount=2)
+    worker.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0)).observe(0.5)
+    worker.gauge("queue_size", "Queue", callback=lambda: 4)
+    worker.write_snapshot(str(tmp_path))
+    os.replace(tmp_path / f"{os.getpid()}.json", tmp_path / "1.json")  # as if written by another worker
+    os.utime(tmp_path / "1.json", (0, 0))  # exited long ago: its gauge is dropped
+
+    registry = MetricsRegistry()
+    registry.counter("jobs_total", "Jobs", ("kind",)).inc("a")
+    registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0)).observe(0.05)
+    text = registry.render()
+
+    assert '# TYPE jobs_total counter\njobs_total{kind="a"} 3.0' in text
+    assert 'latency_seconds_bucket{le="0.1"} 1\nlatency_seconds_bucket{le="1.0"} 2\nlatency_seconds_bucket{le="+Inf"} 2' in text
+    assert "latency_seconds_sum 0.55" in text and "latency_seconds_count 2" in text
+    assert "queue_size" not in text
+
+
+def test_exited_worker_snapshots_are_dropped(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_MULTIPROC_DIR", str(tmp_path))
+    worker = MetricsRegistry()
+    worker.counter("jobs_total", "Jobs").inc(amount=5)
+    worker.write_snapshot(str(tmp_path))
+    exited = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"],
+                            capture_output=True, text=True).stdout.strip()
+    os.replace(tmp_path / f"{os.getpid()}.json", tmp_path / f"{exited}.json")
+
+    registry = MetricsRegistry()
+    registry.counter("jobs_total", "Jobs").inc()
+    assert "jobs_total 1.0" in registry.render()
+    assert not (tmp_path / f"{exited}.json").exists()
+
+    worker.write_snapshot(str(tmp_path))
+    assert MetricsRegistry.clear_snapshots(str(tmp_path)) == 1 and not os.listdir(tmp_path)
+
+
+def test_request_latency_by_route_template():
+    app = FastAPI()
+
+    @app.get("/channels/{channel_id}/feeds.json")
+    def feeds(channel_id: int):
+        return PlainTextResponse("[]")
+
+    app.add_middleware(RequestLoggingMiddleware)
+    client = TestClient(app)
+    before = http_request_seconds.samples().get(("GET", "/channels/{channel_id}/feeds.json"))
+    client.get("/channels/1/feeds.json")
+    client.get("/channels/2/feeds.json")
+    counts = http_request_seconds.samples()[("GET", "/channels/{channel_id}/feeds.json")]
+    assert sum(counts[:-1]) - (sum(before[:-1]) if before else 0) == 2
+
+
+def test_metrics_endpoint_is_off_by_default_and_token_protected(monkeypatch):
+    import pytest
+    from fastapi import HTTPException
+    from app.main import metrics_endpoint
+
+    with pytest.raises(HTTPException) as error:
+        metrics_endpoint(authorization=None)
+    assert error.value.status_code == 404
+
+    monkeypatch.setattr(settings, "METRICS_ENABLED", True)
+    monkeypatch.setattr(settings, "METRICS_TOKEN", "secret")
+    for header in (None, "Bearer wrong"):
+        with pytest.raises(HTTPException) as error:
+            metrics_endpoint(authorization=header)
+        assert error.value.status_code == 401
+    assert metrics_endpoint(authorization="Bearer secret").status_code == 200
@@ -0,0 +1,168 @@
+"""ASGI middleware tests"""
+from fastapi import FastAPI
+from fastapi.responses import HTMLResponse, PlainTextResponse, RedirectResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.middleware import rate_limiter as rate_limiter_module
+from app.middleware.logging_middleware import RequestLoggingMiddleware
+from app.middleware.rate_limiter import InMemoryRateLimiter, RateLimitMiddleware
+from app.middleware.root_path_middleware import RootPathMiddleware
+from app.services.request_log_writer import RequestLogWriter
+
+
+def build_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/update")
+    def update():
+        return PlainTextResponse("1")
+
+    @app.get("/page")
+    def page():
+        return HTMLResponse('<!doctype html><html><a href="/channels">x</a><script src="/static/a.js"></script></html>')
+
+    @app.get("/go")
+    def go():
+        return RedirectResponse("/login")
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse(iter([b"a", b"b", b"c"]), media_type="text/plain")
+
+    app.add_middleware(RootPathMiddleware)
+    app.add_middleware(RequestLoggingMiddleware)
+    app.add_middleware(RateLimitMiddleware)
+    return app
+
+
+def test_asgi_middleware_stack(monkeypatch):
+    import app.middleware.logging_middleware as logging_module
+
+    writer = RequestLogWriter()
+    limiter = InMemoryRateLimiter()
+    limiter.limits["/update"] = (2, 60)
+    monkeypatch.setattr(logging_module, "request_log_writer", writer)
+    monkeypatch.setattr(rate_limiter_module, "rate_limiter", limiter)
+    monkeypatch.setattr(settings, "ROOT_PATH", "/cloud2")
+    monkeypatch.setattr(settings, "REQUEST_LOG_SAMPLE_UPDATE", 1.0)
+    client = TestClient(build_app())
+
+    assert [client.get("/update").status_code for _ in range(3)] == [200, 200, 429]
+    assert client.get("/update").headers["retry-after"] == "30"  # one of 2 tokens per 60 s
+    logged = [(row["endpoint"], row["response_status"]) for row in writer._buffer]
+    assert logged == [("/update", 200), ("/update", 200)]  # 429 answered before logging
+
+    response = client.get("/page")
+    assert 'href="/cloud2/channels"' in response.text and 'src="/cloud2/static/a.js"' in response.text
+    assert int(response.headers["content-length"]) == len(response.content)
+    assert client.get("/go", follow_redirects=False).headers["location"] == "/cloud2/login"
+    assert client.get("/stream").text == "abc"
+
+
+def test_token_bucket_limiter(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(settings, "RATE_LIMIT_API_KEY_REQUESTS", 3)
+    limiter = InMemoryRateLimiter(max_keys=2)
+    limiter.clock = lambda: clock[0]
+    limiter.limits["/update"] = (2, 10)
+
+    assert [limiter.is_allowed("ip1:/update", "/update") for _ in range(3)] == [True, True, False]
+    clock[0] += 5  # one token back
+    assert limiter.check("ip1:/update", "/update") == 0
+    assert limiter.check("ip1:/update", "/update") == 5.0
+    assert [limiter.is_allowed("k:api_key", "api_key") for _ in range(4)] == [True, True, True, False]
+
+    limiter.check("ip2:/update", "/update")  # third key evicts the least recently used one
+    assert list(limiter.buckets) == ["k:api_key", "ip2:/update"] and limiter.evicted == 1
+    clock[0] += 60
+    limiter.cleanup()
+    assert not limiter.buckets
+
+
+def test_shared_limiter_counts_all_workers(tmp_path, monkeypatch):
+    import asyncio
+    import app.middleware.rate_limiter as module
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from app.database import Base
+    from app.models import RateLimitBucket
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'main.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    monkeypatch.setattr(module, "SessionLocal", sessionmaker(bind=engine))
+    monkeypatch.setattr(settings, "RATE_LIMIT_LEASE_FRACTION", 0.2)
+    workers = [module.SharedRateLimiter(), module.SharedRateLimiter()]
+    for worker in workers:
+        worker.limits["/update"] = (10, 3600)
+
+    allowed = [worker.is_allowed("ip:/update", "/update") for _ in range(8) for worker in workers]
+    assert allowed.count(True) == 10
+    # Leases of 2 tokens: one store round trip per 2 requests, refusals are cached locally
+    assert sum(worker.round_trips for worker in workers) == 7
+    assert asyncio.run(workers[0].acquire("ip:/update", "/update")) > 0
+
+    db = sessionmaker(bind=engine)()
+    assert db.query(RateLimitBucket).one().tokens < 1
+    db.close()
+
+
+def test_templates_apply_root_path_once(tmp_path, monkeypatch):
+    from fastapi import Request
+    from app.templating import RootPathTemplates
+
+    (tmp_path / "page.html").write_text(
+        '<!doctype html><a href="/channels/{{ id }}">x</a><img src="{{ image|root_url }}">'
+        '<a href="{{ link }}">y</a><script>fetch(\'/api/channels/{{ id }}\')</script>'
+    )
+    monkeypatch.setattr(settings, "ROOT_PATH", "/cloud2")
+    templates = RootPathTemplates(directory=str(tmp_path))
+    app = FastAPI()
+
+    @app.get("/page")
+    def page(request: Request):
+        context = {"request": request, "id": 7, "image": "/static/uploads/a.png", "link": "/raw"}
+        return templates.TemplateResponse("page.html", context)
+
+    app.add_middleware(RootPathMiddleware)
+    html = TestClient(app).get("/page").text
+    assert 'href="/cloud2/channels/7"' in html and "fetch('/cloud2/api/channels/7')" in html
+    assert 'src="/cloud2/static/uploads/a.png"' in html
+    assert 'href="/raw"' in html  # rendered values are not rewritten by the middleware
+    monkeypatch.setattr(settings, "ROOT_PATH", "/other")  # source is compiled again
+    assert 'href="/other/channels/7"' in TestClient(app).get("/page").text
+
+
+def test_phase_timing_and_slow_requests(monkeypatch):
+    import time
+    import app.middleware.logging_middleware as logging_module
+    from sqlalchemy import text
+    from app.database import engine
+    from app.services.request_timing import SlowRequestLog, phase
+
+    slow = SlowRequestLog()
+    monkeypatch.setattr(logging_module, "slow_requests", slow)
+    monkeypatch.setattr(logging_module, "request_log_writer", RequestLogWriter())
+    monkeypatch.setattr(settings, "SLOW_REQUEST_MS", 20)
+    monkeypatch.setattr(settings, "SERVER_TIMING_ENABLED", True)
+    app = FastAPI()
+
+    @app.get("/work/{delay_ms}")
+    def work(delay_ms: int):  # sync route: runs in the threadpool
+        with phase("work"):
+            time.sleep(delay_ms / 1000)
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        return PlainTextResponse("ok")
+
+    app.add_middleware(RequestLoggingMiddleware)
+    client = TestClient(app)
+
+    header = client.get("/work/0").headers["server-timing"]
+    assert header.startswith("work;dur=") and 'db;dur=' in header and "total;dur=" in header
+    assert not slow.snapshot()
+
+    client.get("/work/30")
+    [entry] = slow.snapshot()
+    assert entry["route"] == "/work/{delay_ms}" and entry["phases"]["work"] >= 30
+    assert entry["query_count"] == 1 and entry["queries"][0]["sql"] == "SELECT 1"
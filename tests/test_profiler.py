@@ -0,0 +1,48 @@
+"""Admin profiler tests"""
+import threading
+import time
+
+import pytest
+
+from app.services.profiler import MemoryTracer, ProfilerBusy, StackSampler
+
+
+def busy_loop(stop: threading.Event):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_stack_sampler_collapsed_output():
+    sampler = StackSampler()
+    stop = threading.Event()
+    worker = threading.Thread(target=busy_loop, args=(stop,), name="busy")
+    worker.start()
+    try:
+        result = sampler.sample(0.2, interval=0.002)
+    finally:
+        stop.set()
+        worker.join()
+
+    lines = StackSampler.collapsed(result).splitlines()
+    busy = [line for line in lines if line.startswith("busy;")]
+    assert busy and all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert "tests/test_profiler.py:busy_loop" in busy[0]
+    assert any(top["function"] == "tests/test_profiler.py:busy_loop" for top in StackSampler.top_functions(result))
+
+    sampler._lock.acquire()
+    with pytest.raises(ProfilerBusy):
+        sampler.sample(0.01)
+    sampler._lock.release()
+
+
+def test_memory_tracer_diff():
+    tracer = MemoryTracer()
+    tracer.start(frames=5)
+    try:
+        kept = [bytearray(1024) for _ in range(2000)]  # ~2 MB allocated on this line
+        top = tracer.top(limit=5, diff=True)
+        assert top["diff"] and top["stats"][0]["size_diff_kb"] > 1500
+        assert top["stats"][0]["traceback"][0].startswith("tests/test_profiler.py:")
+    finally:
+        tracer.stop()
+    assert not tracer.status()["tracing"] and kept
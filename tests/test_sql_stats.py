@@ -0,0 +1,87 @@
+"""SQL statement statistics and N+1 detection tests"""
+from datetime import datetime, timedelta
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker
+
+from app.config import settings
+from app.database import Base, engine
+from app.middleware.logging_middleware import RequestLoggingMiddleware
+from app.models import Channel, Feed, User
+from app.models.user_profile import UserProfile
+from app.routers.admin import list_all_channels, list_all_users
+from app.services.channel_stats import calculate_channels_stats
+from app.services.sql_stats import fingerprint, sql_stats
+
+
+def test_fingerprint_replaces_literals_and_in_lists():
+    assert fingerprint("SELECT * FROM feeds WHERE channel_id = 5 AND name = 'it''s'") == \
+        "SELECT * FROM feeds WHERE channel_id = ? AND name = ?"
+    assert fingerprint("SELECT field1\n  FROM feeds WHERE id IN (?, ?, ?)") == \
+        "SELECT field1 FROM feeds WHERE id IN (?...)"
+    assert fingerprint("SELECT * FROM users WHERE id = %(id_1)s") == "SELECT * FROM users WHERE id = ?"
+
+
+def test_repeated_statement_is_flagged(monkeypatch):
+    monkeypatch.setattr(settings, "SQL_N_PLUS_ONE_THRESHOLD", 5)
+    sql_stats.reset()
+    app = FastAPI()
+
+    @app.get("/loop/{count}")
+    def loop(count: int):
+        with engine.connect() as conn:
+            for i in range(count):
+                conn.execute(text(f"SELECT {i}"))
+        return PlainTextResponse("ok")
+
+    app.add_middleware(RequestLoggingMiddleware)
+    client = TestClient(app)
+    client.get("/loop/5")
+    assert not sql_stats.snapshot()["n_plus_one"]
+
+    client.get("/loop/8")
+    stats = sql_stats.snapshot()
+    [entry] = stats["n_plus_one"]
+    assert entry["route"] == "/loop/{count}" and entry["sql"] == "SELECT ?" and entry["max_count"] == 8
+    assert next(item for item in stats["fingerprints"] if item["sql"] == "SELECT ?")["count"] == 13
+
+
+def test_admin_lists_use_a_fixed_number_of_queries(tmp_path):
+    test_engine = create_engine(f"sqlite:///{tmp_path / 'admin.db'}")
+    Base.metadata.create_all(bind=test_engine)
+    statements = []
+    event.listen(test_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    db = sessionmaker(bind=test_engine)()
+
+    start = datetime.utcnow() - timedelta(hours=2)
+    for n in range(5):
+        user = User(email=f"user{n}@example.com", hashed_password="x")
+        db.add(user)
+        db.flush()
+        db.add(UserProfile(user_id=user.id, display_name=f"User {n}"))
+        for c in range(n):
+            channel = Channel(name=f"c{n}-{c}", user_id=user.id)
+            db.add(channel)
+            db.flush()
+            for entry, offset in enumerate((0, 10, 15, 45)[:c + 1]):
+                db.add(Feed(channel_id=channel.id, entry_id=entry + 1, created_at=start + timedelta(seconds=offset)))
+    db.commit()
+
+    statements.clear()
+    users = list_all_users(db=db, admin=None)
+    assert len(statements) == 3
+    assert {u["display_name"]: u["channel_count"] for u in users}["User 4"] == 4
+
+    statements.clear()
+    channels = list_all_channels(include_stats=True, db=db, admin=None)
+    assert len(statements) == 3 and len(channels) == 10
+    widest = next(c for c in channels if c["name"] == "c4-3")
+    assert widest["owner_email"] == "user4@example.com" and widest["recent_count"] == 4
+    assert widest["avg_interval_seconds"] == 15.0 and widest["min_interval_seconds"] == 5.0
+
+    stats = calculate_channels_stats([1, 999], db)
+    assert stats[1].total_feeds == 1 and stats[1].avg_interval_seconds is None
+    assert stats[999].total_feeds == 0